@@ -2,8 +2,8 @@
 公众号管理API端点
 """
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, or_, select
 from typing import List, Optional
 from app.core.database import get_db
 from app.models.wechat_account import WechatAccount
@@ -13,6 +13,8 @@ from app.schemas.wechat_account import (
     WechatAccountResponse,
     WechatAccountList
 )
+from app.schemas.article import ArticleList, ArticleDetail
+from app.services.article_service import article_service
 import logging
 
 logger = logging.getLogger(__name__)
@@ -26,25 +28,26 @@ async def get_wechat_accounts(
     nickname: Optional[str] = Query(None, description="公众号名称"),
     biz: Optional[str] = Query(None, description="公众号biz"),
     is_active: Optional[bool] = Query(None, description="是否激活"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """获取公众号列表"""
     try:
-        query = db.query(WechatAccount)
+        query = select(WechatAccount)
         
         # 添加过滤条件
         if nickname:
-            query = query.filter(WechatAccount.nickname.ilike(f"%{nickname}%"))
+            query = query.where(WechatAccount.nickname.ilike(f"%{nickname}%"))
         if biz:
-            query = query.filter(WechatAccount.biz == biz)
+            query = query.where(WechatAccount.biz == biz)
         if is_active is not None:
-            query = query.filter(WechatAccount.is_active == is_active)
+            query = query.where(WechatAccount.is_active == is_active)
         
         # 获取总数
-        total = query.count()
+        total = await db.scalar(select(func.count()).select_from(query.subquery()))
         
         # 分页
-        accounts = query.offset(skip).limit(limit).all()
+        result = await db.execute(query.order_by(WechatAccount.id).offset(skip).limit(limit))
+        accounts = result.scalars().all()
         
         return WechatAccountList(
             accounts=[WechatAccountResponse.from_orm(account) for account in accounts],
@@ -61,11 +64,11 @@ async def get_wechat_accounts(
 @router.get("/{account_id}", response_model=WechatAccountResponse)
 async def get_wechat_account(
     account_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """获取单个公众号信息"""
     try:
-        account = db.query(WechatAccount).filter(WechatAccount.id == account_id).first()
+        account = await db.get(WechatAccount, account_id)
         if not account:
             raise HTTPException(status_code=404, detail="公众号不存在")
         
@@ -78,16 +81,44 @@ async def get_wechat_account(
         raise HTTPException(status_code=500, detail="获取公众号信息失败")
 
 
+@router.get("/{account_id}/articles", response_model=ArticleList)
+async def get_account_articles(
+    account_id: int,
+    skip: int = Query(0, ge=0, description="跳过记录数"),
+    limit: int = Query(20, ge=1, le=100, description="返回记录数"),
+    db: AsyncSession = Depends(get_db)
+):
+    """获取公众号文章列表，不返回正文"""
+    result = await article_service.get_article_list(db, account_id, skip, limit)
+    if 'error' in result:
+        raise HTTPException(status_code=500, detail="获取文章列表失败")
+    return ArticleList(**result)
+
+
+@router.get("/{account_id}/articles/{article_id}", response_model=ArticleDetail)
+async def get_account_article(
+    account_id: int,
+    article_id: int,
+    db: AsyncSession = Depends(get_db)
+):
+    """获取文章详情"""
+    article = await article_service.get_article(db, account_id, article_id)
+    if not article:
+        raise HTTPException(status_code=404, detail="文章不存在")
+    return ArticleDetail(**article)
+
+
 @router.get("/by-nickname/{nickname}", response_model=WechatAccountResponse)
 async def get_wechat_account_by_nickname(
     nickname: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """根据公众号名称获取信息"""
     try:
-        account = db.query(WechatAccount).filter(
-            WechatAccount.nickname == nickname
-        ).first()
+        result = await db.execute(
+            select(WechatAccount).where(WechatAccount.nickname == nickname)
+        )
+        account = result.scalars().first()
         
         if not account:
             raise HTTPException(status_code=404, detail="公众号不存在")
@@ -104,11 +135,14 @@ async def get_wechat_account_by_nickname(
 @router.get("/by-biz/{biz}", response_model=WechatAccountResponse)
 async def get_wechat_account_by_biz(
     biz: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """根据公众号biz获取信息"""
     try:
-        account = db.query(WechatAccount).filter(WechatAccount.biz == biz).first()
+        result = await db.execute(
+            select(WechatAccount).where(WechatAccount.biz == biz)
+        )
+        account = result.scalar_one_or_none()
         
         if not account:
             raise HTTPException(status_code=404, detail="公众号不存在")
@@ -125,17 +159,20 @@ async def get_wechat_account_by_biz(
 @router.post("/", response_model=WechatAccountResponse)
 async def create_wechat_account(
     account: WechatAccountCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """创建公众号"""
     try:
         # 检查是否已存在
-        existing = db.query(WechatAccount).filter(
-            or_(
-                WechatAccount.biz == account.biz,
-                WechatAccount.nickname == account.nickname
-            )
-        ).first()
+        result = await db.execute(
+            select(WechatAccount.id).where(
+                or_(
+                    WechatAccount.biz == account.biz,
+                    WechatAccount.nickname == account.nickname
+                )
+            ).limit(1)
+        )
+        existing = result.first()
         
         if existing:
             raise HTTPException(status_code=400, detail="公众号已存在")
@@ -143,8 +180,8 @@ async def create_wechat_account(
         # 创建新公众号
         db_account = WechatAccount(**account.dict())
         db.add(db_account)
-        db.commit()
-        db.refresh(db_account)
+        await db.commit()
+        await db.refresh(db_account)
         
         return WechatAccountResponse.from_orm(db_account)
         
@@ -152,7 +189,7 @@ async def create_wechat_account(
         raise
     except Exception as e:
         logger.error(f"创建公众号失败: {e}")
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail="创建公众号失败")
 
 
@@ -160,11 +197,11 @@ async def create_wechat_account(
 async def update_wechat_account(
     account_id: int,
     account_update: WechatAccountUpdate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """更新公众号信息"""
     try:
-        db_account = db.query(WechatAccount).filter(WechatAccount.id == account_id).first()
+        db_account = await db.get(WechatAccount, account_id)
         if not db_account:
             raise HTTPException(status_code=404, detail="公众号不存在")
         
@@ -173,8 +210,8 @@ async def update_wechat_account(
         for field, value in update_data.items():
             setattr(db_account, field, value)
         
-        db.commit()
-        db.refresh(db_account)
+        await db.commit()
+        await db.refresh(db_account)
         
         return WechatAccountResponse.from_orm(db_account)
         
@@ -182,23 +219,23 @@ async def update_wechat_account(
         raise
     except Exception as e:
         logger.error(f"更新公众号失败: {e}")
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail="更新公众号失败")
 
 
 @router.delete("/{account_id}")
 async def delete_wechat_account(
     account_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """删除公众号"""
     try:
-        db_account = db.query(WechatAccount).filter(WechatAccount.id == account_id).first()
+        db_account = await db.get(WechatAccount, account_id)
         if not db_account:
             raise HTTPException(status_code=404, detail="公众号不存在")
         
-        db.delete(db_account)
-        db.commit()
+        await db.delete(db_account)
+        await db.commit()
         
         return {"message": "公众号删除成功"}
         
@@ -206,20 +243,24 @@ async def delete_wechat_account(
         raise
     except Exception as e:
         logger.error(f"删除公众号失败: {e}")
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail="删除公众号失败")
 
 
 @router.get("/stats/overview")
-async def get_accounts_stats(db: Session = Depends(get_db)):
+async def get_accounts_stats(db: AsyncSession = Depends(get_db)):
     """获取公众号统计概览"""
     try:
-        total_accounts = db.query(WechatAccount).count()
-        active_accounts = db.query(WechatAccount).filter(WechatAccount.is_active == True).count()
-        verified_accounts = db.query(WechatAccount).filter(WechatAccount.is_verified == True).count()
-        
-        # 获取文章总数
-        total_articles = db.query(WechatAccount.article_count).scalar() or 0
+        result = await db.execute(
+            select(
+                func.count(WechatAccount.id),
+                func.count(WechatAccount.id).filter(WechatAccount.is_active == True),
+                func.count(WechatAccount.id).filter(WechatAccount.is_verified == True),
+                # 获取文章总数
+                func.coalesce(func.sum(WechatAccount.article_count), 0),
+            )
+        )
+        total_accounts, active_accounts, verified_accounts, total_articles = result.one()
         
         return {
             "total_accounts": total_accounts,
@@ -3,54 +3,78 @@
 """
 from fastapi import APIRouter, Depends, HTTPException, Query
 from fastapi.responses import FileResponse
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from app.core.database import get_db
-from app.services.export_service import export_service
+from app.services.export_service import export_service, EXPORT_FORMATS
+from app.services.export_task_service import export_task_service
 import logging
 import os
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# 导出文件下载类型
+MEDIA_TYPES = {
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+async def _submit_export(db: AsyncSession, target: str, fmt: str, nickname: Optional[str] = None):
+    """创建后台导出任务"""
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"不支持的导出格式: {fmt}")
+    try:
+        task = await export_task_service.submit(db, target, fmt, nickname)
+        return {
+            "message": "导出任务已创建",
+            "task_id": task.id
+        }
+    except Exception as e:
+        logger.error(f"创建导出任务失败: {e}")
+        raise HTTPException(status_code=500, detail=f"导出失败: {str(e)}")
+
 
 @router.post("/articles/excel")
 async def export_articles_to_excel(
     nickname: Optional[str] = Query(None, description="公众号名称，不提供则导出所有文章"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """导出文章到Excel"""
-    try:
-        filepath = export_service.export_articles_to_excel(db, nickname)
-        if filepath:
-            return {
-                "message": "导出成功",
-                "filepath": filepath,
-                "filename": os.path.basename(filepath)
-            }
-        else:
-            raise HTTPException(status_code=400, detail="没有数据可导出")
-    except Exception as e:
-        logger.error(f"导出文章失败: {e}")
-        raise HTTPException(status_code=500, detail=f"导出失败: {str(e)}")
+    return await _submit_export(db, 'articles', 'xlsx', nickname)
+
+
+@router.post("/articles/{fmt}")
+async def export_articles(
+    fmt: str,
+    nickname: Optional[str] = Query(None, description="公众号名称，不提供则导出所有文章"),
+    db: AsyncSession = Depends(get_db)
+):
+    """导出文章，支持xlsx、csv、parquet格式"""
+    return await _submit_export(db, 'articles', fmt, nickname)
 
 
 @router.post("/likes/excel")
-async def export_likes_to_excel(db: Session = Depends(get_db)):
+async def export_likes_to_excel(db: AsyncSession = Depends(get_db)):
     """导出收藏到Excel"""
-    try:
-        filepath = export_service.export_likes_to_excel(db)
-        if filepath:
-            return {
-                "message": "导出成功",
-                "filepath": filepath,
-                "filename": os.path.basename(filepath)
-            }
-        else:
-            raise HTTPException(status_code=400, detail="没有收藏数据可导出")
-    except Exception as e:
-        logger.error(f"导出收藏失败: {e}")
-        raise HTTPException(status_code=500, detail=f"导出失败: {str(e)}")
+    return await _submit_export(db, 'likes', 'xlsx')
+
+
+@router.post("/likes/{fmt}")
+async def export_likes(fmt: str, db: AsyncSession = Depends(get_db)):
+    """导出收藏，支持xlsx、csv、parquet格式"""
+    return await _submit_export(db, 'likes', fmt)
+
+
+@router.get("/tasks/{task_id}")
+async def get_export_task(task_id: int, db: AsyncSession = Depends(get_db)):
+    """获取导出任务状态"""
+    task = await export_task_service.get_task(db, task_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="导出任务不存在")
+    return task
 
 
 @router.post("/search-results/excel")
@@ -94,7 +118,7 @@ async def download_export_file(filename: str):
             return FileResponse(
                 filepath,
                 filename=filename,
-                media_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+                media_type=MEDIA_TYPES.get(filename.rsplit('.', 1)[-1], 'application/octet-stream')
             )
         else:
             raise HTTPException(status_code=404, detail="文件不存在")
@@ -2,11 +2,13 @@
 搜索API端点
 """
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from app.core.database import get_db
+from app.services.aggregation_service import aggregation_service
 from app.services.search_service import search_service
-from app.schemas.search import SearchRequest, SearchResponse, IndexInfo
+from app.services.search_task_service import search_task_service
+from app.schemas.search import SearchRequest, SearchResponse, IndexInfo, AggregationRequest
 import logging
 
 logger = logging.getLogger(__name__)
@@ -17,17 +19,30 @@ router = APIRouter()
 async def get_index_info():
     """获取搜索索引信息"""
     try:
-        index_info = search_service.get_index_info()
+        index_info = await search_service.get_index_info()
         return index_info
     except Exception as e:
         logger.error(f"获取索引信息失败: {e}")
         raise HTTPException(status_code=500, detail="获取索引信息失败")
 
 
+@router.get("/cache-stats")
+async def get_cache_stats():
+    """获取搜索缓存命中统计"""
+    return search_service.cache.get_stats()
+
+
+@router.delete("/cache")
+async def clear_cache():
+    """清空所有API进程的搜索缓存"""
+    await search_service.invalidate_cache()
+    return {"message": "搜索缓存已清空"}
+
+
 @router.post("/articles", response_model=SearchResponse)
 async def search_articles(
     request: SearchRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """搜索文章"""
     try:
@@ -37,26 +52,48 @@ async def search_articles(
         # 处理搜索字段
         fields = request.fields if request.fields and '全部' not in request.fields else None
         
-        result = search_service.search_articles(
+        result = await search_service.search_articles(
             search_data=request.search_data,
             gzhs=gzhs,
             fields=fields,
-            _from=request._from,
-            _size=request._size
+            _from=request.from_,
+            _size=request.size,
+            cursor=request.cursor,
+            use_cursor=request.use_cursor,
+            source_includes=request.source_includes,
+            source_excludes=request.source_excludes,
+            summary=request.summary
         )
         
         return SearchResponse(**result)
         
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"搜索失败: {e}")
         raise HTTPException(status_code=500, detail=f"搜索失败: {str(e)}")
 
 
+@router.post("/aggregations")
+async def aggregate_articles(
+    request: AggregationRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    """聚合统计文章：发布时间直方图、分组计数、阅读数据统计和百分位"""
+    try:
+        return await aggregation_service.aggregate(db, **request.model_dump())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"聚合统计失败: {e}")
+        raise HTTPException(status_code=500, detail=f"聚合统计失败: {str(e)}")
+
+
 @router.post("/create-index/{nickname}")
 async def create_index(nickname: str):
     """为公众号创建搜索索引"""
     try:
-        success = search_service.create_index(nickname)
+        success = await search_service.create_index(nickname)
         if success:
             return {"message": f"为公众号 {nickname} 创建索引成功"}
         else:
@@ -70,7 +107,7 @@ async def create_index(nickname: str):
 async def delete_index(nickname: str):
     """删除公众号的搜索索引"""
     try:
-        success = search_service.delete_index(nickname)
+        success = await search_service.delete_index(nickname)
         if success:
             return {"message": f"删除公众号 {nickname} 的索引成功"}
         else:
@@ -80,19 +117,63 @@ async def delete_index(nickname: str):
         raise HTTPException(status_code=500, detail=f"删除索引失败: {str(e)}")
 
 
+async def _submit_search_task(db: AsyncSession, action: str, **params):
+    """创建后台索引任务"""
+    try:
+        task = await search_task_service.submit(db, action, **params)
+        return {
+            "message": "索引任务已创建",
+            "task_id": task.id
+        }
+    except Exception as e:
+        logger.error(f"创建索引任务失败: {e}")
+        raise HTTPException(status_code=500, detail=f"创建索引任务失败: {str(e)}")
+
+
+@router.post("/migrate-legacy-indices")
+async def migrate_legacy_indices(
+    delete_source: bool = Query(False, description="迁移成功后删除旧索引"),
+    db: AsyncSession = Depends(get_db)
+):
+    """将旧版按公众号建立的索引迁移到共享索引，后台执行并返回任务ID"""
+    return await _submit_search_task(db, 'migrate', delete_source=delete_source)
+
+
 @router.post("/bulk-index/{nickname}")
 async def bulk_index_articles(
     nickname: str,
     articles: List[dict],
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """批量索引文章"""
     try:
-        success = search_service.bulk_index_articles(nickname, articles)
-        if success:
-            return {"message": f"批量索引 {len(articles)} 篇文章成功"}
-        else:
-            raise HTTPException(status_code=500, detail="批量索引失败")
+        report = await search_service.bulk_index_articles(nickname, articles)
+        if report.get('error'):
+            raise HTTPException(status_code=500, detail=f"批量索引失败: {report['error']}")
+        return {
+            "message": f"批量索引 {report['indexed']} 篇文章成功，失败 {report['failed']} 篇",
+            **report
+        }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"批量索引失败: {e}")
-        raise HTTPException(status_code=500, detail=f"批量索引失败: {str(e)}") 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"批量索引失败: {str(e)}")
+
+
+@router.post("/reindex")
+async def reindex_articles(
+    nickname: Optional[str] = Query(None, description="公众号名称，不提供则重建所有文章索引"),
+    db: AsyncSession = Depends(get_db)
+):
+    """从数据库重建文章索引，后台执行并返回任务ID"""
+    return await _submit_search_task(db, 'reindex', nickname=nickname)
+
+
+@router.get("/tasks/{task_id}")
+async def get_search_task(task_id: int, db: AsyncSession = Depends(get_db)):
+    """获取索引任务状态"""
+    task = await search_task_service.get_task(db, task_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="索引任务不存在")
+    return task
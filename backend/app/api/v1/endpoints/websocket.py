@@ -2,7 +2,7 @@
 WebSocket API端点
 """
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from app.services.websocket_service import WebSocketService
+from app.services.websocket_service import WebSocketService, manager
 import logging
 
 logger = logging.getLogger(__name__)
@@ -18,4 +18,10 @@ async def websocket_endpoint(websocket: WebSocket, client_id: str):
 @router.websocket("/ws")
 async def websocket_endpoint_no_id(websocket: WebSocket):
     """WebSocket连接端点（无客户端ID）"""
-    await WebSocketService.handle_websocket(websocket) 
\ No newline at end of file
+    await WebSocketService.handle_websocket(websocket) 
+
+
+@router.get("/ws/stats")
+async def get_websocket_stats():
+    """获取WebSocket连接和发送队列统计"""
+    return manager.get_stats()
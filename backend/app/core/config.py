@@ -54,17 +54,56 @@ class Settings(BaseSettings):
     CRAWLER_DELAY: float = Field(default=1.0, env="CRAWLER_DELAY")
     CRAWLER_TIMEOUT: int = Field(default=30, env="CRAWLER_TIMEOUT")
     CRAWLER_RETRY_TIMES: int = Field(default=3, env="CRAWLER_RETRY_TIMES")
+    CRAWLER_CONCURRENCY: int = Field(default=5, env="CRAWLER_CONCURRENCY")
+    CRAWLER_STATS_REFRESH_DAYS: int = Field(default=7, env="CRAWLER_STATS_REFRESH_DAYS")  # 增量爬取时刷新阅读数据的时间窗口
+    
+    # 爬虫限速配置（基础速率为 1 / CRAWLER_DELAY）
+    CRAWLER_RATE_BURST: float = Field(default=3.0, env="CRAWLER_RATE_BURST")
+    CRAWLER_MIN_RATE: float = Field(default=0.05, env="CRAWLER_MIN_RATE")
+    CRAWLER_RATE_DECREASE: float = Field(default=0.5, env="CRAWLER_RATE_DECREASE")
+    CRAWLER_RATE_RECOVERY: float = Field(default=0.02, env="CRAWLER_RATE_RECOVERY")
+    CRAWLER_THROTTLE_COOLDOWN: float = Field(default=60.0, env="CRAWLER_THROTTLE_COOLDOWN")
+    
+    # 文章批量写入配置
+    ARTICLE_WRITER_BATCH_SIZE: int = Field(default=1000, env="ARTICLE_WRITER_BATCH_SIZE")
+    ARTICLE_WRITER_FLUSH_INTERVAL: float = Field(default=2.0, env="ARTICLE_WRITER_FLUSH_INTERVAL")
+    
+    # 爬虫HTTP连接池配置
+    CRAWLER_POOL_SIZE: int = Field(default=100, env="CRAWLER_POOL_SIZE")
+    CRAWLER_POOL_SIZE_PER_HOST: int = Field(default=10, env="CRAWLER_POOL_SIZE_PER_HOST")
+    CRAWLER_KEEPALIVE_TIMEOUT: float = Field(default=30.0, env="CRAWLER_KEEPALIVE_TIMEOUT")
+    CRAWLER_DNS_CACHE_TTL: int = Field(default=300, env="CRAWLER_DNS_CACHE_TTL")
     
     # 代理配置
     PROXY_ENABLED: bool = Field(default=False, env="PROXY_ENABLED")
     PROXY_URL: Optional[str] = Field(default=None, env="PROXY_URL")
     PROXY_USERNAME: Optional[str] = Field(default=None, env="PROXY_USERNAME")
     PROXY_PASSWORD: Optional[str] = Field(default=None, env="PROXY_PASSWORD")
+    PROXY_MAX_FAILURES: int = Field(default=3, env="PROXY_MAX_FAILURES")  # 连续失败多少次后隔离代理
+    PROXY_QUARANTINE_SECONDS: float = Field(default=60.0, env="PROXY_QUARANTINE_SECONDS")  # 首次隔离时间，验证失败后翻倍
+    PROXY_MAX_VERIFY_FAILURES: int = Field(default=5, env="PROXY_MAX_VERIFY_FAILURES")  # 验证失败多少次后停用代理
+    PROXY_VERIFY_URL: str = Field(default="https://mp.weixin.qq.com/", env="PROXY_VERIFY_URL")
+    PROXY_VERIFY_TIMEOUT: float = Field(default=10.0, env="PROXY_VERIFY_TIMEOUT")
+    PROXY_FLUSH_INTERVAL: float = Field(default=10.0, env="PROXY_FLUSH_INTERVAL")  # 统计写回和隔离代理验证的间隔（秒）
+    PROXY_RELOAD_INTERVAL: float = Field(default=300.0, env="PROXY_RELOAD_INTERVAL")  # 从数据库重新加载代理的间隔（秒）
     
     # 文件存储配置
     UPLOAD_DIR: str = Field(default="./uploads", env="UPLOAD_DIR")
     MAX_FILE_SIZE: int = Field(default=10 * 1024 * 1024, env="MAX_FILE_SIZE")  # 10MB
     
+    # 导出配置
+    EXPORT_BATCH_SIZE: int = Field(default=2000, env="EXPORT_BATCH_SIZE")  # 服务端游标每批读取行数
+    EXPORT_WORKERS: int = Field(default=2, env="EXPORT_WORKERS")  # 导出文件写入线程数
+    
+    # WebSocket配置
+    WEBSOCKET_SEND_QUEUE_SIZE: int = Field(default=100, env="WEBSOCKET_SEND_QUEUE_SIZE")  # 每个连接的待发送消息上限
+    WEBSOCKET_SEND_TIMEOUT: float = Field(default=10.0, env="WEBSOCKET_SEND_TIMEOUT")  # 单条消息发送超时（秒），超时断开连接
+    WEBSOCKET_STALL_TIMEOUT: float = Field(default=30.0, env="WEBSOCKET_STALL_TIMEOUT")  # 发送队列持续满载超过该时间（秒）断开连接
+    WEBSOCKET_MAX_SUBSCRIPTIONS: int = Field(default=100, env="WEBSOCKET_MAX_SUBSCRIPTIONS")  # 每个连接最多订阅的主题数
+    WEBSOCKET_EVENT_BUS: str = Field(default="redis", env="WEBSOCKET_EVENT_BUS")  # redis, memory
+    WEBSOCKET_EVENT_CHANNEL: str = Field(default="ws:events", env="WEBSOCKET_EVENT_CHANNEL")  # Redis事件频道前缀
+    PROGRESS_WINDOW_MS: int = Field(default=250, env="PROGRESS_WINDOW_MS")  # 同一任务进度推送的最小间隔（毫秒）
+    
     # 日志配置
     LOG_LEVEL: str = Field(default="INFO", env="LOG_LEVEL")
     LOG_FILE: str = Field(default="./logs/app.log", env="LOG_FILE")
@@ -74,12 +113,29 @@ class Settings(BaseSettings):
         default="http://localhost:9200",
         env="ELASTICSEARCH_URL"
     )
+    SEARCH_BACKEND: str = Field(default="elasticsearch", env="SEARCH_BACKEND")  # elasticsearch 或 memory
+    ELASTICSEARCH_INDEX: str = Field(default="wechat_articles", env="ELASTICSEARCH_INDEX")  # 所有公众号共用的文章索引
+    ELASTICSEARCH_SHARDS: int = Field(default=3, env="ELASTICSEARCH_SHARDS")
+    ELASTICSEARCH_REPLICAS: int = Field(default=1, env="ELASTICSEARCH_REPLICAS")
+    ELASTICSEARCH_POOL_SIZE: int = Field(default=20, env="ELASTICSEARCH_POOL_SIZE")  # 每个节点的连接数
+    ELASTICSEARCH_TIMEOUT: float = Field(default=30.0, env="ELASTICSEARCH_TIMEOUT")
+    ELASTICSEARCH_BULK_CHUNK_SIZE: int = Field(default=500, env="ELASTICSEARCH_BULK_CHUNK_SIZE")  # 每个bulk请求的文档数
+    ELASTICSEARCH_BULK_MAX_BYTES: int = Field(default=10 * 1024 * 1024, env="ELASTICSEARCH_BULK_MAX_BYTES")  # 每个bulk请求的最大字节数
+    ELASTICSEARCH_BULK_WORKERS: int = Field(default=4, env="ELASTICSEARCH_BULK_WORKERS")  # 并行提交的协程数
+    ELASTICSEARCH_BULK_MAX_RETRIES: int = Field(default=5, env="ELASTICSEARCH_BULK_MAX_RETRIES")  # 429重试次数
+    ELASTICSEARCH_BULK_INITIAL_BACKOFF: float = Field(default=2.0, env="ELASTICSEARCH_BULK_INITIAL_BACKOFF")
+    ELASTICSEARCH_BULK_MAX_BACKOFF: float = Field(default=60.0, env="ELASTICSEARCH_BULK_MAX_BACKOFF")
+    SEARCH_CACHE_SIZE: int = Field(default=1000, env="SEARCH_CACHE_SIZE")  # 搜索结果缓存条数，0表示关闭
+    SEARCH_CACHE_TTL: float = Field(default=300.0, env="SEARCH_CACHE_TTL")  # 搜索结果缓存有效期(秒)，写入经事件总线通知各进程失效；使用memory事件总线的多进程部署中，其他进程最多延迟该时间
+    SEARCH_PIT_KEEP_ALIVE: str = Field(default="5m", env="SEARCH_PIT_KEEP_ALIVE")  # 游标分页的PIT保持时间
     
     # 微信相关配置
     WECHAT_COOKIE_FILE: str = Field(
         default="./data/wechat_cookies.json",
         env="WECHAT_COOKIE_FILE"
     )
+    WECHAT_KEY_TTL: int = Field(default=1800, env="WECHAT_KEY_TTL")  # 抓包参数有效期(秒)，与微信key过期时间一致
+    CREDENTIAL_STORE_BACKEND: str = Field(default="redis", env="CREDENTIAL_STORE_BACKEND")  # redis, memory
     
     class Config:
         env_file = ".env"
@@ -3,7 +3,7 @@
 """
 
 from datetime import datetime
-from sqlalchemy import String, Integer, DateTime, Text, Boolean, ForeignKey, Float
+from sqlalchemy import String, Integer, DateTime, Text, Boolean, ForeignKey, Float, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.core.database import Base
@@ -13,6 +13,10 @@ class Article(Base):
     """文章模型"""
     
     __tablename__ = "articles"
+    # 文章以 (__biz, mid, idx) 唯一标识，批量写入按该键upsert
+    __table_args__ = (
+        Index("uq_articles_biz_mid_idx", "biz", "mid", "idx", unique=True),
+    )
     
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     
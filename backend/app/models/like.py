@@ -1,7 +1,7 @@
 """
 收藏模型
 """
-from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, Index
 from sqlalchemy.sql import func
 from app.core.database import Base
 
@@ -25,5 +25,13 @@ class Like(Base):
     digest = Column(Text, comment="摘要")
     content = Column(Text, comment="文章内容")
     
+    __table_args__ = (
+        # pg_trgm三元组索引，支持 ILIKE '%关键词%' 走索引
+        Index("idx_likes_title_trgm", "title", postgresql_using="gin", postgresql_ops={"title": "gin_trgm_ops"}),
+        Index("idx_likes_digest_trgm", "digest", postgresql_using="gin", postgresql_ops={"digest": "gin_trgm_ops"}),
+        Index("idx_likes_content_trgm", "content", postgresql_using="gin", postgresql_ops={"content": "gin_trgm_ops"}),
+        Index("idx_likes_like_time", "like_time"),
+    )
+    
     def __repr__(self):
         return f"<Like(id={self.id}, title='{self.title}', nickname='{self.nickname}')>" 
\ No newline at end of file
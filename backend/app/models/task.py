@@ -25,6 +25,7 @@ class TaskType(str, Enum):
     CRAWL_ARTICLES = "crawl_articles"
     CRAWL_READING_DATA = "crawl_reading_data"
     EXPORT_DATA = "export_data"
+    SEARCH_INDEX = "search_index"
 
 
 class Task(Base):
@@ -59,7 +60,7 @@ class Task(Base):
     completed_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
     
     # 外键关联
-    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True, nullable=True)  # 系统任务可为空
     user: Mapped["User"] = relationship("User")
     
     def __repr__(self) -> str:
@@ -4,7 +4,8 @@ Pydantic模型包
 
 from .auth import Token, UserCreate, UserLogin
 from .user import User, UserUpdate
-from .like import LikeInfo, LikeCreate, LikeDelete, LikeList
+from .like import LikeInfo, LikeCreate, LikeDelete, LikeList, LikeSummary
+from .article import ArticleSummary, ArticleDetail, ArticleList
 from .search import SearchRequest, SearchResponse, IndexInfo
 from .wechat_account import (
     WechatAccountBase,
@@ -25,6 +26,10 @@ __all__ = [
     "LikeCreate",
     "LikeDelete",
     "LikeList",
+    "LikeSummary",
+    "ArticleSummary",
+    "ArticleDetail",
+    "ArticleList",
     "SearchRequest",
     "SearchResponse",
     "IndexInfo",
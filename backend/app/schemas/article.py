@@ -0,0 +1,39 @@
+"""
+文章相关的Pydantic模型
+"""
+
+from datetime import datetime
+from typing import List, Optional
+from pydantic import BaseModel, Field
+
+
+class ArticleSummary(BaseModel):
+    """文章列表项模型，不含正文"""
+    id: int = Field(..., description="文章ID")
+    title: str = Field(..., description="文章标题")
+    author: Optional[str] = Field(None, description="作者")
+    digest: Optional[str] = Field(None, description="摘要")
+    url: str = Field(..., description="文章链接")
+    cover_url: Optional[str] = Field(None, description="封面链接")
+    publish_time: Optional[datetime] = Field(None, description="发布时间")
+    read_num: Optional[int] = Field(0, description="阅读数")
+    like_num: Optional[int] = Field(0, description="点赞数")
+    reward_num: Optional[int] = Field(0, description="赞赏数")
+    comment_num: Optional[int] = Field(0, description="评论数")
+    position: Optional[int] = Field(0, description="文章位置")
+    is_original: Optional[bool] = Field(False, description="是否原创")
+    account_id: int = Field(..., description="公众号ID")
+
+
+class ArticleDetail(ArticleSummary):
+    """文章详情模型"""
+    content: Optional[str] = Field(None, description="文章内容")
+    content_html: Optional[str] = Field(None, description="文章HTML")
+
+
+class ArticleList(BaseModel):
+    """文章列表响应模型"""
+    articles: List[ArticleSummary] = Field(..., description="文章列表")
+    total: int = Field(..., description="总数")
+    skip: int = Field(..., description="跳过数量")
+    limit: int = Field(..., description="限制数量")
@@ -28,9 +28,24 @@ class LikeDelete(BaseModel):
     article_id: str
 
 
+class LikeSummary(BaseModel):
+    """收藏列表项模型，不含文章正文"""
+    id: int
+    nickname: str
+    title: str
+    author: Optional[str] = None
+    content_url: str
+    source_url: Optional[str] = None
+    p_date: Optional[datetime] = None
+    like_time: Optional[datetime] = None
+    read_num: Optional[int] = 0
+    like_num: Optional[int] = 0
+    comment_num: Optional[int] = 0
+    reward_num: Optional[int] = 0
+    digest: Optional[str] = None
+
+
 class LikeList(BaseModel):
-    """点赞列表模型"""
-    likes: List[LikeInfo]
+    """收藏列表模型"""
     total: int
-    page: int
-    size: int 
\ No newline at end of file
+    articles: List[LikeSummary]
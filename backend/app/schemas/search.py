@@ -2,30 +2,54 @@
 搜索相关的Pydantic模型
 """
 
+from datetime import datetime
 from typing import List, Optional, Any
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class SearchRequest(BaseModel):
     """搜索请求模型"""
-    query: str
-    page: int = 1
-    size: int = 10
-    filters: Optional[dict] = None
+    search_data: str
+    gzhs: Optional[List[str]] = None
+    fields: Optional[List[str]] = None
+    from_: int = Field(default=0, ge=0, alias="_from")
+    size: int = Field(default=10, ge=1, le=100, alias="_size")
+    cursor: Optional[str] = None  # 上一页返回的 next_cursor
+    use_cursor: bool = False  # 第一页开启游标分页
+    source_includes: Optional[List[str]] = None  # 只返回这些字段
+    source_excludes: Optional[List[str]] = None  # 不返回这些字段，如 content
+    summary: bool = False  # 只返回标题、摘要和正文高亮片段
+    
+    class Config:
+        populate_by_name = True
 
 
 class SearchResponse(BaseModel):
     """搜索响应模型"""
     results: List[Any]
     total: int
-    page: int
-    size: int
-    query: str
+    took: int = 0
+    next_cursor: Optional[str] = None
+    error: Optional[str] = None
+
+
+class AggregationRequest(BaseModel):
+    """聚合统计请求模型"""
+    search_data: Optional[str] = None  # 为空时统计全部文章
+    gzhs: Optional[List[str]] = None
+    fields: Optional[List[str]] = None
+    date_from: Optional[datetime] = None
+    date_to: Optional[datetime] = None
+    group_by: Optional[str] = None  # nickname、author、position
+    interval: Optional[str] = None  # day、week、month、quarter、year
+    metrics: List[str] = []  # read_num、like_num、comment_num、reward_num
+    percents: List[float] = [50, 90, 99]
+    size: int = Field(default=10, ge=1, le=1000)  # 分组数量
+    backend: str = Field(default="auto", pattern="^(auto|elasticsearch|postgresql)$")
 
 
 class IndexInfo(BaseModel):
     """索引信息模型"""
-    name: str
-    document_count: int
-    size: str
-    status: str 
\ No newline at end of file
+    nickname: str
+    doc_count: int
+    index_name: str 
\ No newline at end of file
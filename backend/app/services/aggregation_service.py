@@ -0,0 +1,362 @@
+"""
+聚合统计服务
+在Elasticsearch中按公众号、作者、位置分组，统计发布时间分布和阅读数据，
+Elasticsearch不可用时使用PostgreSQL聚合
+"""
+import logging
+from typing import Dict, List, Any, Optional
+from datetime import datetime
+from sqlalchemy import func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.article import Article
+from app.models.wechat_account import WechatAccount
+from app.services.like_service import escape_like
+from app.services.search_backend import SearchBackend
+from app.services.search_service import search_service
+
+logger = logging.getLogger(__name__)
+
+# 支持分组的字段
+GROUP_FIELDS = ('nickname', 'author', 'position')
+
+# 支持统计的数值字段
+METRIC_FIELDS = ('read_num', 'like_num', 'comment_num', 'reward_num')
+
+# 发布时间直方图的间隔
+INTERVALS = ('day', 'week', 'month', 'quarter', 'year')
+
+# 搜索字段对应的文章表列
+TEXT_COLUMNS = {
+    'title': Article.title,
+    'digest': Article.digest,
+    'content': Article.content,
+}
+
+# 分组字段对应的文章表列
+GROUP_COLUMNS = {
+    'nickname': WechatAccount.nickname,
+    'author': Article.author,
+    'position': Article.position,
+}
+
+
+def _percent_key(percent: float) -> str:
+    """百分位键名，与Elasticsearch返回的格式一致"""
+    return str(float(percent))
+
+
+class AggregationService:
+    """聚合统计服务类"""
+
+    def __init__(self, search: SearchBackend = search_service):
+        self.search = search
+
+    def validate(self,
+                 group_by: Optional[str],
+                 interval: Optional[str],
+                 metrics: List[str],
+                 percents: List[float]):
+        """校验聚合参数，不合法时抛出ValueError"""
+        if group_by and group_by not in GROUP_FIELDS:
+            raise ValueError(f"不支持的分组字段: {group_by}")
+        if interval and interval not in INTERVALS:
+            raise ValueError(f"不支持的时间间隔: {interval}")
+        for metric in metrics:
+            if metric not in METRIC_FIELDS:
+                raise ValueError(f"不支持的统计字段: {metric}")
+        for percent in percents:
+            if not 0 <= percent <= 100:
+                raise ValueError(f"百分位必须在0到100之间: {percent}")
+
+    async def aggregate(self,
+                        db: AsyncSession,
+                        search_data: Optional[str] = None,
+                        gzhs: Optional[List[str]] = None,
+                        fields: Optional[List[str]] = None,
+                        date_from: Optional[datetime] = None,
+                        date_to: Optional[datetime] = None,
+                        group_by: Optional[str] = None,
+                        interval: Optional[str] = None,
+                        metrics: Optional[List[str]] = None,
+                        percents: Optional[List[float]] = None,
+                        size: int = 10,
+                        backend: str = 'auto') -> Dict[str, Any]:
+        """聚合统计文章
+
+        返回整体的文章数、发布时间直方图、数值统计和百分位，
+        指定 group_by 时在 groups 中按分组返回同样的结构。
+        backend 为 auto 时优先使用Elasticsearch，失败或使用内存搜索后端时使用PostgreSQL。
+        """
+        gzhs = gzhs if gzhs and gzhs != ['全部'] else []
+        fields = [f for f in (fields or []) if f in TEXT_COLUMNS] or list(TEXT_COLUMNS)
+        metrics = metrics or []
+        percents = percents or [50, 90, 99]
+        self.validate(group_by, interval, metrics, percents)
+        params = {
+            'search_data': (search_data or '').strip(),
+            'gzhs': gzhs,
+            'fields': fields,
+            'date_from': date_from,
+            'date_to': date_to,
+            'group_by': group_by,
+            'interval': interval,
+            'metrics': metrics,
+            'percents': percents,
+            'size': size,
+        }
+
+        if backend == 'elasticsearch' and not self.search.supports_aggregations:
+            raise ValueError("当前搜索后端不支持聚合，请使用postgresql")
+        if backend in ('auto', 'elasticsearch') and self.search.supports_aggregations:
+            try:
+                return await self._aggregate_es(**params)
+            except Exception as e:
+                if backend == 'elasticsearch':
+                    raise
+                logger.warning(f"Elasticsearch聚合失败，使用PostgreSQL聚合: {e}")
+        return await self._aggregate_sql(db, **params)
+
+    # ---------- Elasticsearch ----------
+
+    def _es_metric_aggs(self, interval: Optional[str], metrics: List[str], percents: List[float]) -> Dict[str, Any]:
+        """构建直方图和数值统计聚合"""
+        aggs = {}
+        if interval:
+            aggs['histogram'] = {
+                "date_histogram": {
+                    "field": "p_date",
+                    "calendar_interval": interval,
+                    "format": "yyyy-MM-dd",
+                    "min_doc_count": 1
+                }
+            }
+        for metric in metrics:
+            aggs[f"{metric}_stats"] = {"stats": {"field": metric}}
+            aggs[f"{metric}_percentiles"] = {"percentiles": {"field": metric, "percents": percents}}
+        return aggs
+
+    def _es_parse_metrics(self, data: Dict[str, Any], metrics: List[str]) -> Dict[str, Any]:
+        """解析直方图和数值统计聚合结果"""
+        result = {}
+        if 'histogram' in data:
+            result['histogram'] = [
+                {'key': bucket['key_as_string'], 'doc_count': bucket['doc_count']}
+                for bucket in data['histogram']['buckets']
+            ]
+        if metrics:
+            result['stats'] = {}
+            result['percentiles'] = {}
+            for metric in metrics:
+                stats = data[f"{metric}_stats"]
+                result['stats'][metric] = {k: stats[k] for k in ('count', 'min', 'max', 'avg', 'sum')}
+                result['percentiles'][metric] = data[f"{metric}_percentiles"]['values']
+        return result
+
+    async def _aggregate_es(self,
+                            search_data: str,
+                            gzhs: List[str],
+                            fields: List[str],
+                            date_from: Optional[datetime],
+                            date_to: Optional[datetime],
+                            group_by: Optional[str],
+                            interval: Optional[str],
+                            metrics: List[str],
+                            percents: List[float],
+                            size: int) -> Dict[str, Any]:
+        """在Elasticsearch中聚合"""
+        filters = []
+        if gzhs:
+            filters.append({"terms": {"nickname": gzhs}})
+        if date_from or date_to:
+            date_range = {}
+            if date_from:
+                date_range['gte'] = date_from
+            if date_to:
+                date_range['lte'] = date_to
+            filters.append({"range": {"p_date": date_range}})
+        query: Dict[str, Any] = {"bool": {"filter": filters}}
+        if search_data:
+            query["bool"]["must"] = [{
+                "multi_match": {"query": search_data, "fields": fields}
+            }]
+
+        aggs = self._es_metric_aggs(interval, metrics, percents)
+        if group_by:
+            aggs['groups'] = {
+                "terms": {"field": group_by, "size": size},
+                "aggs": self._es_metric_aggs(interval, metrics, percents)
+            }
+
+        response = await self.search.aggregate(query, gzhs, aggs)
+        data = response['aggregations']
+        result = {
+            'source': 'elasticsearch',
+            'total': response['total'],
+            'took': response['took'],
+            **self._es_parse_metrics(data, metrics)
+        }
+        if group_by:
+            result['groups'] = [
+                {
+                    'key': bucket['key'],
+                    'doc_count': bucket['doc_count'],
+                    **self._es_parse_metrics(bucket, metrics)
+                }
+                for bucket in data['groups']['buckets']
+            ]
+        return result
+
+    # ---------- PostgreSQL ----------
+
+    def _sql_filters(self,
+                     search_data: str,
+                     gzhs: List[str],
+                     fields: List[str],
+                     date_from: Optional[datetime],
+                     date_to: Optional[datetime]) -> List[Any]:
+        """构建文章表过滤条件"""
+        conditions = [Article.is_deleted.is_(False)]
+        if gzhs:
+            conditions.append(WechatAccount.nickname.in_(gzhs))
+        if date_from:
+            conditions.append(Article.publish_time >= date_from)
+        if date_to:
+            conditions.append(Article.publish_time <= date_to)
+        if search_data:
+            pattern = f"%{escape_like(search_data)}%"
+            conditions.append(or_(*(TEXT_COLUMNS[f].ilike(pattern, escape='\\') for f in fields)))
+        return conditions
+
+    def _sql_metric_columns(self, metrics: List[str], percents: List[float]) -> List[Any]:
+        """构建数值统计和百分位列"""
+        columns = []
+        for metric in metrics:
+            column = getattr(Article, metric)
+            columns += [
+                func.count(column).label(f"{metric}__count"),
+                func.min(column).label(f"{metric}__min"),
+                func.max(column).label(f"{metric}__max"),
+                func.avg(column).label(f"{metric}__avg"),
+                func.sum(column).label(f"{metric}__sum"),
+            ]
+            for i, percent in enumerate(percents):
+                columns.append(
+                    func.percentile_cont(percent / 100).within_group(column).label(f"{metric}__p{i}")
+                )
+        return columns
+
+    def _sql_parse_metrics(self, row: Any, metrics: List[str], percents: List[float]) -> Dict[str, Any]:
+        """解析数值统计和百分位列"""
+        if not metrics:
+            return {}
+        mapping = row._mapping
+        stats, percentiles = {}, {}
+        for metric in metrics:
+            stats[metric] = {
+                'count': mapping[f"{metric}__count"],
+                'min': mapping[f"{metric}__min"],
+                'max': mapping[f"{metric}__max"],
+                'avg': float(mapping[f"{metric}__avg"]) if mapping[f"{metric}__avg"] is not None else None,
+                'sum': mapping[f"{metric}__sum"] or 0,
+            }
+            percentiles[metric] = {
+                _percent_key(percent): mapping[f"{metric}__p{i}"]
+                for i, percent in enumerate(percents)
+            }
+        return {'stats': stats, 'percentiles': percentiles}
+
+    async def _sql_histogram(self,
+                             db: AsyncSession,
+                             conditions: List[Any],
+                             interval: str,
+                             group_column: Any = None,
+                             keys: Optional[List[Any]] = None) -> Dict[Any, List[Dict[str, Any]]]:
+        """按发布时间分桶统计文章数，返回 分组键 -> 直方图"""
+        bucket = func.date_trunc(interval, Article.publish_time).label('bucket')
+        columns = [bucket, func.count(Article.id).label('doc_count')]
+        if group_column is not None:
+            columns.insert(0, group_column.label('group_key'))
+        query = (
+            select(*columns)
+            .join(WechatAccount, Article.account_id == WechatAccount.id)
+            .where(*conditions, Article.publish_time.isnot(None))
+        )
+        if group_column is not None:
+            query = query.where(group_column.in_(keys)).group_by(group_column, bucket)
+        else:
+            query = query.group_by(bucket)
+        query = query.order_by(bucket)
+
+        histograms: Dict[Any, List[Dict[str, Any]]] = {}
+        for row in await db.execute(query):
+            key = row.group_key if group_column is not None else None
+            histograms.setdefault(key, []).append({
+                'key': row.bucket.strftime('%Y-%m-%d'),
+                'doc_count': row.doc_count
+            })
+        return histograms
+
+    async def _aggregate_sql(self,
+                             db: AsyncSession,
+                             search_data: str,
+                             gzhs: List[str],
+                             fields: List[str],
+                             date_from: Optional[datetime],
+                             date_to: Optional[datetime],
+                             group_by: Optional[str],
+                             interval: Optional[str],
+                             metrics: List[str],
+                             percents: List[float],
+                             size: int) -> Dict[str, Any]:
+        """在PostgreSQL中聚合"""
+        started = datetime.now()
+        conditions = self._sql_filters(search_data, gzhs, fields, date_from, date_to)
+        metric_columns = self._sql_metric_columns(metrics, percents)
+
+        overall = (await db.execute(
+            select(func.count(Article.id).label('doc_count'), *metric_columns)
+            .join(WechatAccount, Article.account_id == WechatAccount.id)
+            .where(*conditions)
+        )).one()
+        result = {
+            'source': 'postgresql',
+            'total': overall.doc_count,
+            **self._sql_parse_metrics(overall, metrics, percents)
+        }
+        if interval:
+            histograms = await self._sql_histogram(db, conditions, interval)
+            result['histogram'] = histograms.get(None, [])
+
+        if group_by:
+            group_column = GROUP_COLUMNS[group_by]
+            doc_count = func.count(Article.id).label('doc_count')
+            rows = (await db.execute(
+                select(group_column.label('group_key'), doc_count, *metric_columns)
+                .join(WechatAccount, Article.account_id == WechatAccount.id)
+                .where(*conditions, group_column.isnot(None))
+                .group_by(group_column)
+                .order_by(doc_count.desc())
+                .limit(size)
+            )).all()
+            histograms = {}
+            if interval and rows:
+                histograms = await self._sql_histogram(
+                    db, conditions, interval, group_column, [row.group_key for row in rows]
+                )
+            result['groups'] = []
+            for row in rows:
+                group = {
+                    'key': row.group_key,
+                    'doc_count': row.doc_count,
+                    **self._sql_parse_metrics(row, metrics, percents)
+                }
+                if interval:
+                    group['histogram'] = histograms.get(row.group_key, [])
+                result['groups'].append(group)
+
+        result['took'] = int((datetime.now() - started).total_seconds() * 1000)
+        return result
+
+
+# 全局聚合统计服务实例
+aggregation_service = AggregationService()
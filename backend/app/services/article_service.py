@@ -0,0 +1,89 @@
+"""
+文章服务
+文章列表按列投影查询，正文只在获取单篇文章时加载
+"""
+import logging
+from typing import Dict, Any, Optional
+from sqlalchemy import func, select
+from sqlalchemy.orm import defer
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.article import Article
+
+logger = logging.getLogger(__name__)
+
+# 列表页返回的文章字段，不含 content 和 content_html
+ARTICLE_LIST_COLUMNS = (
+    Article.id,
+    Article.title,
+    Article.author,
+    Article.digest,
+    Article.url,
+    Article.cover_url,
+    Article.publish_time,
+    Article.read_num,
+    Article.like_num,
+    Article.reward_num,
+    Article.comment_num,
+    Article.position,
+    Article.is_original,
+    Article.account_id,
+)
+
+
+def article_list_options(raiseload: bool = True):
+    """加载Article实体时延迟加载正文的选项
+
+    raiseload 为真时访问未加载的正文直接报错，避免在异步会话中隐式触发查询。
+    """
+    return (
+        defer(Article.content, raiseload=raiseload),
+        defer(Article.content_html, raiseload=raiseload),
+    )
+
+
+class ArticleService:
+    """文章服务类"""
+
+    async def get_article_list(self,
+                               db: AsyncSession,
+                               account_id: int,
+                               skip: int = 0,
+                               limit: int = 20) -> Dict[str, Any]:
+        """获取公众号文章列表，按发布时间倒序"""
+        try:
+            condition = (Article.account_id == account_id, Article.is_deleted.is_(False))
+            total = await db.scalar(select(func.count(Article.id)).where(*condition))
+            result = await db.execute(
+                select(*ARTICLE_LIST_COLUMNS)
+                .where(*condition)
+                .order_by(Article.publish_time.desc().nulls_last(), Article.id.desc())
+                .offset(skip)
+                .limit(limit)
+            )
+            return {
+                'articles': [dict(row._mapping) for row in result],
+                'total': total or 0,
+                'skip': skip,
+                'limit': limit,
+            }
+        except Exception as e:
+            logger.error(f"获取文章列表失败: {e}")
+            return {'articles': [], 'total': 0, 'skip': skip, 'limit': limit, 'error': str(e)}
+
+    async def get_article(self, db: AsyncSession, account_id: int, article_id: int) -> Optional[Dict[str, Any]]:
+        """获取文章详情，包含正文"""
+        try:
+            article = await db.get(Article, article_id)
+            if not article or article.account_id != account_id:
+                return None
+            data = {column.key: getattr(article, column.key) for column in ARTICLE_LIST_COLUMNS}
+            data['content'] = article.content
+            data['content_html'] = article.content_html
+            return data
+        except Exception as e:
+            logger.error(f"获取文章详情失败: {e}")
+            return None
+
+
+# 全局文章服务实例
+article_service = ArticleService()
@@ -0,0 +1,186 @@
+"""
+文章批量写入服务
+将爬取结果按批次以 INSERT ... ON CONFLICT (biz, mid, idx) DO UPDATE 写入PostgreSQL
+
+文章链接中的 chksm、scene 等参数会变化，文章以 (__biz, mid, idx) 唯一标识，
+与增量爬取识别已知文章的方式一致，链接写入前规范化为只含 __biz/mid/idx/sn 的形式。
+"""
+import asyncio
+import logging
+from typing import Dict, List, Any, Optional
+from datetime import datetime
+from sqlalchemy import func, literal_column, update
+from sqlalchemy.dialects.postgresql import insert
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.article import Article
+from app.models.wechat_account import WechatAccount
+
+logger = logging.getLogger(__name__)
+
+# asyncpg单条语句最多32767个绑定参数
+MAX_BIND_PARAMS = 32767
+
+# 冲突时更新的统计字段
+STATS_FIELDS = ('read_num', 'like_num', 'reward_num', 'comment_num')
+
+# 写入失败后重试的等待时间（秒）
+RETRY_DELAYS = (1, 2, 4)
+
+
+def canonical_url(article: Dict[str, Any]) -> str:
+    """规范化文章链接，去掉会变化的参数"""
+    url = (f"https://mp.weixin.qq.com/s?__biz={article['biz']}"
+           f"&mid={article['mid']}&idx={article.get('idx') or 0}")
+    if article.get('sn'):
+        url += f"&sn={article['sn']}"
+    return url
+
+
+class ArticleWriter:
+    """文章批量写入器
+
+    add() 只把文章放入缓冲区，缓冲区达到 batch_size 或距上次写入超过
+    flush_interval 秒时，以一条多行upsert写入，并在同一事务中更新公众号的
+    article_count 和 last_crawled_at。
+    写入失败时按 RETRY_DELAYS 重试，仍失败的批次放回缓冲区等待下次刷新，
+    只有 close() 最后一次刷新仍失败时才计入 failed。
+    """
+
+    def __init__(self,
+                 account_id: int,
+                 batch_size: Optional[int] = None,
+                 flush_interval: Optional[float] = None):
+        self.account_id = account_id
+        columns = len(self._to_row({}, datetime.utcnow()))
+        self.batch_size = min(batch_size or settings.ARTICLE_WRITER_BATCH_SIZE, MAX_BIND_PARAMS // columns)
+        self.flush_interval = flush_interval or settings.ARTICLE_WRITER_FLUSH_INTERVAL
+        self.buffer: List[Dict[str, Any]] = []
+        self.written = 0
+        self.inserted = 0
+        self.failed = 0
+        self._lock = asyncio.Lock()
+        self._flusher: Optional[asyncio.Task] = None
+
+    async def __aenter__(self) -> "ArticleWriter":
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def start(self):
+        """启动定时刷新协程"""
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_periodically())
+
+    async def close(self):
+        """停止定时刷新并写入剩余数据"""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        await self.flush(final=True)
+
+    async def add(self, article: Dict[str, Any]):
+        """添加一篇文章，缓冲区满时立即写入"""
+        if not article.get('content_url') or not article.get('biz') or not article.get('mid'):
+            logger.warning(f"文章缺少链接、__biz或mid，跳过写入: {article.get('title')}")
+            return
+        self.buffer.append(article)
+        if len(self.buffer) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self, final: bool = False):
+        """写入缓冲区中的全部文章，失败的批次放回缓冲区；final为真时丢弃并计入失败"""
+        async with self._lock:
+            while self.buffer:
+                articles = self.buffer[:self.batch_size]
+                del self.buffer[:self.batch_size]
+                if await self._write(articles):
+                    continue
+                if final:
+                    self.failed += len(articles)
+                    logger.error(f"多次重试后仍写入失败，丢弃文章 {len(articles)} 篇")
+                    continue
+                self.buffer[:0] = articles
+                break
+
+    async def _flush_periodically(self):
+        """按时间间隔刷新缓冲区"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"定时写入文章失败: {e}")
+
+    async def _write(self, articles: List[Dict[str, Any]]) -> bool:
+        """以一条多行upsert写入一批文章，失败时重试，返回是否成功"""
+        now = datetime.utcnow()
+        # 同一批次内文章重复会导致 ON CONFLICT 更新同一行两次，保留最后一条
+        rows = list({
+            (row['biz'], row['mid'], row['idx']): row
+            for row in (self._to_row(a, now) for a in articles)
+        }.values())
+
+        stmt = insert(Article).values(rows)
+        excluded = stmt.excluded
+        set_ = {field: excluded[field] for field in STATS_FIELDS}
+        # 仅刷新阅读数据的文章不带内容，保留已有内容
+        set_['content'] = func.coalesce(excluded.content, Article.content)
+        set_['url'] = excluded.url
+        set_['updated_at'] = excluded.updated_at
+        stmt = stmt.on_conflict_do_update(index_elements=[Article.biz, Article.mid, Article.idx], set_=set_)
+        stmt = stmt.returning(literal_column("(xmax = 0)").label("inserted"))
+
+        for attempt, delay in enumerate((0,) + RETRY_DELAYS):
+            if delay:
+                await asyncio.sleep(delay)
+            try:
+                async with AsyncSessionLocal() as session:
+                    async with session.begin():
+                        result = await session.execute(stmt)
+                        inserted = sum(1 for row in result if row.inserted)
+                        await session.execute(
+                            update(WechatAccount)
+                            .where(WechatAccount.id == self.account_id)
+                            .values(
+                                article_count=WechatAccount.article_count + inserted,
+                                last_crawled_at=now,
+                            )
+                        )
+                self.written += len(rows)
+                self.inserted += inserted
+                logger.info(f"批量写入文章 {len(rows)} 篇，新增 {inserted} 篇")
+                return True
+            except Exception as e:
+                logger.error(f"批量写入文章失败（第 {attempt + 1} 次）: {e}")
+        return False
+
+    def _to_row(self, article: Dict[str, Any], now: datetime) -> Dict[str, Any]:
+        """爬取结果转换为articles表的行"""
+        return {
+            'title': (article.get('title') or '')[:500],
+            'author': article.get('author'),
+            'digest': article.get('digest'),
+            'content': article.get('content'),
+            'url': canonical_url(article),
+            'cover_url': article.get('cover'),
+            'biz': article.get('biz'),
+            'mid': article.get('mid'),
+            'idx': article.get('idx') or 0,
+            'sn': article.get('sn'),
+            'publish_time': article.get('p_date'),
+            'read_num': article.get('read_num', 0),
+            'like_num': article.get('like_num', 0),
+            'reward_num': article.get('reward_num', 0),
+            'comment_num': article.get('comment_num', 0),
+            'position': article.get('mov', 0),
+            'account_id': self.account_id,
+            'created_at': now,
+            'updated_at': now,
+        }
@@ -0,0 +1,290 @@
+"""
+爬虫引擎服务
+按 next_offset 翻页遍历公众号历史文章，并发抓取文章内容和阅读数据
+"""
+import asyncio
+import logging
+from typing import Dict, Any, Optional, Callable, Awaitable, Tuple
+from datetime import datetime, timedelta
+from sqlalchemy import select
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.article import Article
+from app.models.wechat_account import WechatAccount
+from app.services.article_writer import ArticleWriter
+from app.services.progress_aggregator import progress_aggregator
+from app.services.wechat_service import WeChatService, wechat_service
+from app.services.websocket_service import WebSocketService
+
+logger = logging.getLogger(__name__)
+
+ArticleHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+# 文章抓取模式
+MODE_FULL = 'full'    # 抓取内容和阅读数据
+MODE_STATS = 'stats'  # 仅刷新阅读数据
+
+
+class CrawlerService:
+    """爬虫引擎类"""
+
+    def __init__(self, service: WeChatService = wechat_service, concurrency: Optional[int] = None):
+        self.service = service
+        self.concurrency = concurrency or settings.CRAWLER_CONCURRENCY
+
+    async def crawl_account(self,
+                            nickname: str,
+                            on_article: Optional[ArticleHandler] = None,
+                            start_offset: int = 0,
+                            max_pages: Optional[int] = None,
+                            incremental: bool = False,
+                            refresh_days: Optional[int] = None,
+                            account_id: Optional[int] = None) -> Dict[str, Any]:
+        """爬取公众号全部历史文章
+
+        翻页与文章抓取流水线执行：列表页产出的文章进入有界队列，
+        由固定数量的工作协程并发抓取内容和阅读数据，队列满时翻页自动等待。
+        请求速率由 rate_limiter 按公众号和微信账号统一控制。
+
+        增量模式下，已入库的文章不再抓取内容，仅在发布时间处于 refresh_days
+        窗口内时刷新阅读数据；当一页文章全部已知且都超出窗口时停止翻页。
+        已知文章按 account_id 加载，未提供时由 _resolve_account 解析。
+        """
+        stats = {
+            'nickname': nickname,
+            'incremental': incremental,
+            'pages': 0,
+            'articles': 0,
+            'skipped': 0,
+            'succeeded': 0,
+            'failed': 0,
+            'started_at': datetime.now(),
+            'finished_at': None,
+        }
+
+        known: Dict[Tuple[str, int], Optional[datetime]] = {}
+        refresh_after = None
+        if incremental:
+            if account_id is None:
+                account_id = await self._resolve_account(nickname)
+            if account_id is None:
+                logger.warning(f"无法确定公众号 {nickname} 对应的账号，按全量爬取")
+            else:
+                known = await self._load_known_articles(account_id)
+            days = settings.CRAWLER_STATS_REFRESH_DAYS if refresh_days is None else refresh_days
+            refresh_after = datetime.now() - timedelta(days=days)
+            logger.info(f"增量爬取 {nickname}: 已知文章 {len(known)} 篇")
+
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        workers = [
+            asyncio.create_task(self._article_worker(queue, nickname, on_article, stats))
+            for _ in range(self.concurrency)
+        ]
+
+        await WebSocketService.send_crawler_status({
+            'nickname': nickname,
+            'status': 'running',
+            'incremental': incremental,
+        })
+        progress_aggregator.start(nickname, type='crawl', nickname=nickname, incremental=incremental)
+
+        try:
+            offset = start_offset
+            while True:
+                page = await self._with_retry(self.service.crawl_article_list, nickname, offset)
+                if page is None:
+                    logger.error(f"获取文章列表失败，停止翻页: {nickname} offset={offset}")
+                    break
+
+                stats['pages'] += 1
+                reached_known = incremental
+                for article in page['articles']:
+                    stats['articles'] += 1
+                    mode = self._incremental_mode(article, known, refresh_after) if incremental else MODE_FULL
+                    if mode is None:
+                        stats['skipped'] += 1
+                        continue
+                    reached_known = False
+                    await queue.put((article, mode))
+                progress_aggregator.update(nickname, total=stats['articles'] - stats['skipped'])
+
+                if reached_known:
+                    logger.info(f"已到达已知文章，停止翻页: {nickname} offset={offset}")
+                    break
+                if not page['can_continue'] or (max_pages and stats['pages'] >= max_pages):
+                    break
+
+                next_offset = page['next_offset']
+                if next_offset <= offset:
+                    logger.warning(f"next_offset 未前进，停止翻页: {nickname} offset={offset}")
+                    break
+                offset = next_offset
+
+            await queue.join()
+        except asyncio.CancelledError:
+            await progress_aggregator.finish(nickname, 'cancelled')
+            raise
+        except Exception:
+            await progress_aggregator.finish(nickname, 'failed')
+            raise
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+        stats['finished_at'] = datetime.now()
+        logger.info(f"公众号 {nickname} 爬取完成: {stats}")
+        await progress_aggregator.finish(nickname, 'completed')
+        await WebSocketService.send_crawler_status({
+            'nickname': nickname,
+            'status': 'completed',
+            'pages': stats['pages'],
+            'articles': stats['articles'],
+            'skipped': stats['skipped'],
+            'failed': stats['failed'],
+        })
+        return stats
+
+    async def crawl_and_store(self, nickname: str, incremental: bool = False, **kwargs) -> Dict[str, Any]:
+        """爬取公众号并批量写入数据库"""
+        account_id = await self._resolve_account(nickname)
+        if account_id is None:
+            raise ValueError(f"公众号不存在: {nickname}")
+
+        async with ArticleWriter(account_id) as writer:
+            stats = await self.crawl_account(
+                nickname, on_article=writer.add, incremental=incremental, account_id=account_id, **kwargs
+            )
+        stats['written'] = writer.written
+        stats['inserted'] = writer.inserted
+        stats['write_failed'] = writer.failed
+        return stats
+
+    def _incremental_mode(self,
+                          article: Dict[str, Any],
+                          known: Dict[Tuple[str, int], Optional[datetime]],
+                          refresh_after: datetime) -> Optional[str]:
+        """增量模式下判断文章的抓取方式，返回None表示跳过"""
+        key = (article.get('mid'), article.get('idx', 0))
+        if key not in known:
+            return MODE_FULL
+        p_date = article.get('p_date') or known[key]
+        if p_date and p_date >= refresh_after:
+            return MODE_STATS
+        return None
+
+    async def _resolve_account(self, nickname: str) -> Optional[int]:
+        """解析公众号账号ID
+
+        公众号名称不唯一且可能改名，优先按抓包参数中的 __biz 查找；
+        没有参数时按名称查找，名称对应多个账号时返回None。
+        """
+        biz = None
+        try:
+            records = await self.service.store.get_by_nickname(nickname)
+            biz = next((record.get('biz') for record in records.values() if record.get('biz')), None)
+        except Exception as e:
+            logger.error(f"获取公众号 {nickname} 的 __biz 失败: {e}")
+
+        async with AsyncSessionLocal() as session:
+            if biz:
+                account_id = await session.scalar(select(WechatAccount.id).where(WechatAccount.biz == biz))
+                if account_id is not None:
+                    return account_id
+            account_ids = (await session.scalars(
+                select(WechatAccount.id).where(WechatAccount.nickname == nickname).limit(2)
+            )).all()
+        if len(account_ids) > 1:
+            logger.warning(f"公众号名称 {nickname} 对应多个账号，请先抓取请求参数以确定 __biz")
+            return None
+        return account_ids[0] if account_ids else None
+
+    async def _load_known_articles(self, account_id: int) -> Dict[Tuple[str, int], Optional[datetime]]:
+        """加载公众号已入库文章的 (mid, idx) -> 发布时间"""
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(Article.mid, Article.idx, Article.publish_time)
+                .where(Article.account_id == account_id)
+            )
+            return {(mid, idx or 0): publish_time for mid, idx, publish_time in result}
+
+    async def _article_worker(self,
+                              queue: asyncio.Queue,
+                              nickname: str,
+                              on_article: Optional[ArticleHandler],
+                              stats: Dict[str, Any]):
+        """文章抓取工作协程"""
+        while True:
+            article, mode = await queue.get()
+            try:
+                if mode == MODE_STATS:
+                    result = await self._crawl_reading(article, nickname)
+                else:
+                    result = await self._crawl_article(article, nickname)
+                if result is None:
+                    stats['failed'] += 1
+                    progress_aggregator.update(nickname, {'processed': 1, 'failed': 1})
+                else:
+                    if on_article:
+                        await on_article(result)
+                    stats['succeeded'] += 1
+                    progress_aggregator.update(nickname, {'processed': 1, 'succeeded': 1})
+            except Exception as e:
+                stats['failed'] += 1
+                progress_aggregator.update(nickname, {'processed': 1, 'failed': 1})
+                logger.error(f"处理文章失败: {article.get('content_url')}: {e}")
+            finally:
+                queue.task_done()
+
+    async def _crawl_article(self, article: Dict[str, Any], nickname: str) -> Optional[Dict[str, Any]]:
+        """并发抓取单篇文章的内容和阅读数据，合并到列表信息中"""
+        url = article.get('content_url')
+        if not url:
+            return None
+
+        content, reading = await asyncio.gather(
+            self._with_retry(self.service.crawl_article_content, url, nickname),
+            self._with_retry(self.service.crawl_reading_data, url, nickname),
+        )
+        if content is None:
+            return None
+
+        result = dict(article)
+        result['content'] = content.get('content')
+        result['parsed_at'] = content.get('parsed_at')
+        if reading:
+            result.update(reading)
+        return result
+
+    async def _crawl_reading(self, article: Dict[str, Any], nickname: str) -> Optional[Dict[str, Any]]:
+        """仅刷新已知文章的阅读数据"""
+        url = article.get('content_url')
+        if not url:
+            return None
+
+        reading = await self._with_retry(self.service.crawl_reading_data, url, nickname)
+        if reading is None:
+            return None
+
+        result = dict(article)
+        result.update(reading)
+        result['stats_only'] = True
+        return result
+
+    async def _with_retry(self, func: Callable[..., Awaitable[Optional[Any]]], *args) -> Optional[Any]:
+        """带超时和指数退避的重试调用，失败返回None"""
+        attempts = max(1, settings.CRAWLER_RETRY_TIMES)
+        for attempt in range(attempts):
+            try:
+                result = await asyncio.wait_for(func(*args), timeout=settings.CRAWLER_TIMEOUT)
+                if result is not None:
+                    return result
+            except asyncio.TimeoutError:
+                logger.warning(f"{func.__name__} 超时: {args}")
+            if attempt < attempts - 1:
+                await asyncio.sleep(settings.CRAWLER_DELAY * (2 ** attempt))
+        return None
+
+
+# 全局爬虫引擎实例
+crawler_service = CrawlerService()
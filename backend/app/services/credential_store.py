@@ -0,0 +1,265 @@
+"""
+微信请求参数存储服务
+按 wxuin、__biz 和公众号名称索引抓包得到的请求参数，支持Redis和内存两种后端
+"""
+import json
+import logging
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, List, Any, Optional, Set, Tuple
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 不同类型请求参数的名称
+REQUEST_TYPES = ('load_more', 'content', 'getappmsgext')
+
+
+class CredentialStore(ABC):
+    """请求参数存储基类"""
+
+    def __init__(self, ttl: Optional[int] = None):
+        self.ttl = ttl or settings.WECHAT_KEY_TTL
+
+    def _build_record(self, wxuin: str, key: str, data: Dict[str, Any],
+                      biz: Optional[str], nickname: Optional[str]) -> Dict[str, Any]:
+        """构建存储记录"""
+        return {
+            'data': data,
+            'timestamp': time.time(),
+            'wxuin': wxuin,
+            'key': key,
+            'biz': biz,
+            'nickname': nickname,
+        }
+
+    @abstractmethod
+    async def save(self, wxuin: str, key: str, data: Dict[str, Any],
+                   biz: Optional[str] = None, nickname: Optional[str] = None) -> Dict[str, Any]:
+        """保存请求参数"""
+
+    @abstractmethod
+    async def get(self, wxuin: str, key: str) -> Optional[Dict[str, Any]]:
+        """获取指定微信账号的请求参数"""
+
+    @abstractmethod
+    async def get_by_biz(self, biz: str) -> Dict[str, Dict[str, Any]]:
+        """获取公众号可用的全部类型请求参数"""
+
+    @abstractmethod
+    async def get_by_nickname(self, nickname: str) -> Dict[str, Dict[str, Any]]:
+        """根据公众号名称获取全部类型请求参数"""
+
+    @abstractmethod
+    async def bind_nickname(self, nickname: str, biz: str):
+        """记录公众号名称与 __biz 的对应关系"""
+
+    @abstractmethod
+    async def list_all(self) -> List[Dict[str, Any]]:
+        """获取所有未过期的请求参数"""
+
+    @abstractmethod
+    async def delete(self, wxuin: Optional[str] = None, key: Optional[str] = None):
+        """删除请求参数，未指定wxuin时删除全部"""
+
+    async def close(self):
+        """关闭存储连接"""
+        pass
+
+
+class MemoryCredentialStore(CredentialStore):
+    """进程内存储，用于测试和单进程部署"""
+
+    def __init__(self, ttl: Optional[int] = None):
+        super().__init__(ttl)
+        self.records: Dict[Tuple[str, str], Tuple[Dict[str, Any], float]] = {}
+        self.by_wxuin: Dict[str, Set[str]] = {}
+        self.by_biz: Dict[str, Dict[str, str]] = {}
+        self.nicknames: Dict[str, str] = {}
+
+    def _get_record(self, wxuin: str, key: str) -> Optional[Dict[str, Any]]:
+        """读取记录，过期则顺带清理"""
+        item = self.records.get((wxuin, key))
+        if item is None:
+            return None
+        record, expires_at = item
+        if expires_at <= time.time():
+            self._remove(wxuin, key)
+            return None
+        return record
+
+    def _remove(self, wxuin: str, key: str):
+        """删除单条记录及其索引"""
+        record, _ = self.records.pop((wxuin, key), (None, 0))
+        keys = self.by_wxuin.get(wxuin)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.by_wxuin[wxuin]
+        if record and record.get('biz'):
+            index = self.by_biz.get(record['biz'], {})
+            if index.get(key) == wxuin:
+                del index[key]
+
+    async def save(self, wxuin: str, key: str, data: Dict[str, Any],
+                   biz: Optional[str] = None, nickname: Optional[str] = None) -> Dict[str, Any]:
+        record = self._build_record(wxuin, key, data, biz, nickname)
+        self.records[(wxuin, key)] = (record, time.time() + self.ttl)
+        self.by_wxuin.setdefault(wxuin, set()).add(key)
+        if biz:
+            self.by_biz.setdefault(biz, {})[key] = wxuin
+            if nickname:
+                self.nicknames[nickname] = biz
+        return record
+
+    async def get(self, wxuin: str, key: str) -> Optional[Dict[str, Any]]:
+        return self._get_record(wxuin, key)
+
+    async def get_by_biz(self, biz: str) -> Dict[str, Dict[str, Any]]:
+        result = {}
+        for key, wxuin in list(self.by_biz.get(biz, {}).items()):
+            record = self._get_record(wxuin, key)
+            if record:
+                result[key] = record
+        # 文章内容和阅读数据参数可跨公众号复用，缺失时使用同一微信账号的参数
+        if 'load_more' in result:
+            wxuin = result['load_more']['wxuin']
+            for key in REQUEST_TYPES:
+                if key not in result:
+                    record = self._get_record(wxuin, key)
+                    if record:
+                        result[key] = record
+        return result
+
+    async def get_by_nickname(self, nickname: str) -> Dict[str, Dict[str, Any]]:
+        biz = self.nicknames.get(nickname)
+        if not biz:
+            return {}
+        return await self.get_by_biz(biz)
+
+    async def bind_nickname(self, nickname: str, biz: str):
+        self.nicknames[nickname] = biz
+
+    async def list_all(self) -> List[Dict[str, Any]]:
+        result = []
+        for wxuin, key in list(self.records.keys()):
+            record = self._get_record(wxuin, key)
+            if record:
+                result.append(record)
+        return result
+
+    async def delete(self, wxuin: Optional[str] = None, key: Optional[str] = None):
+        if wxuin and key:
+            self._remove(wxuin, key)
+        elif wxuin:
+            for key in list(self.by_wxuin.get(wxuin, ())):
+                self._remove(wxuin, key)
+        else:
+            self.records.clear()
+            self.by_wxuin.clear()
+            self.by_biz.clear()
+
+
+class RedisCredentialStore(CredentialStore):
+    """Redis存储，多个API进程和爬虫进程共享抓包参数
+
+    键结构:
+        wx:req:{wxuin}:{key}  请求参数JSON，带过期时间
+        wx:uin:{wxuin}        该微信账号已保存的参数类型集合
+        wx:biz:{biz}          参数类型 -> wxuin 的哈希
+        wx:nick:{nickname}    公众号名称 -> __biz
+        wx:uins               所有wxuin集合
+    """
+
+    def __init__(self, redis_url: Optional[str] = None, ttl: Optional[int] = None):
+        super().__init__(ttl)
+        import redis.asyncio as redis
+        self.redis = redis.from_url(redis_url or settings.REDIS_URL, decode_responses=True)
+
+    @staticmethod
+    def _record_key(wxuin: str, key: str) -> str:
+        return f"wx:req:{wxuin}:{key}"
+
+    async def save(self, wxuin: str, key: str, data: Dict[str, Any],
+                   biz: Optional[str] = None, nickname: Optional[str] = None) -> Dict[str, Any]:
+        record = self._build_record(wxuin, key, data, biz, nickname)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.set(self._record_key(wxuin, key), json.dumps(record, ensure_ascii=False), ex=self.ttl)
+            pipe.sadd(f"wx:uin:{wxuin}", key)
+            pipe.expire(f"wx:uin:{wxuin}", self.ttl)
+            pipe.sadd("wx:uins", wxuin)
+            if biz:
+                pipe.hset(f"wx:biz:{biz}", key, wxuin)
+                pipe.expire(f"wx:biz:{biz}", self.ttl)
+                if nickname:
+                    pipe.set(f"wx:nick:{nickname}", biz)
+            await pipe.execute()
+        return record
+
+    async def _mget(self, pairs: List[Tuple[str, str]]) -> List[Optional[Dict[str, Any]]]:
+        """批量读取记录"""
+        if not pairs:
+            return []
+        values = await self.redis.mget([self._record_key(wxuin, key) for wxuin, key in pairs])
+        return [json.loads(value) if value else None for value in values]
+
+    async def get(self, wxuin: str, key: str) -> Optional[Dict[str, Any]]:
+        value = await self.redis.get(self._record_key(wxuin, key))
+        return json.loads(value) if value else None
+
+    async def get_by_biz(self, biz: str) -> Dict[str, Dict[str, Any]]:
+        index = await self.redis.hgetall(f"wx:biz:{biz}")
+        pairs = [(wxuin, key) for key, wxuin in index.items()]
+        result = {record['key']: record for record in await self._mget(pairs) if record}
+        # 文章内容和阅读数据参数可跨公众号复用，缺失时使用同一微信账号的参数
+        if 'load_more' in result:
+            wxuin = result['load_more']['wxuin']
+            missing = [(wxuin, key) for key in REQUEST_TYPES if key not in result]
+            for record in await self._mget(missing):
+                if record:
+                    result[record['key']] = record
+        return result
+
+    async def get_by_nickname(self, nickname: str) -> Dict[str, Dict[str, Any]]:
+        biz = await self.redis.get(f"wx:nick:{nickname}")
+        if not biz:
+            return {}
+        return await self.get_by_biz(biz)
+
+    async def bind_nickname(self, nickname: str, biz: str):
+        await self.redis.set(f"wx:nick:{nickname}", biz)
+
+    async def list_all(self) -> List[Dict[str, Any]]:
+        pairs = []
+        for wxuin in await self.redis.smembers("wx:uins"):
+            keys = await self.redis.smembers(f"wx:uin:{wxuin}")
+            if not keys:
+                await self.redis.srem("wx:uins", wxuin)
+                continue
+            pairs.extend((wxuin, key) for key in keys)
+        return [record for record in await self._mget(pairs) if record]
+
+    async def delete(self, wxuin: Optional[str] = None, key: Optional[str] = None):
+        if wxuin and key:
+            await self.redis.delete(self._record_key(wxuin, key))
+            await self.redis.srem(f"wx:uin:{wxuin}", key)
+        elif wxuin:
+            keys = await self.redis.smembers(f"wx:uin:{wxuin}")
+            names = [self._record_key(wxuin, k) for k in keys]
+            await self.redis.delete(*names, f"wx:uin:{wxuin}")
+            await self.redis.srem("wx:uins", wxuin)
+        else:
+            names = [name async for name in self.redis.scan_iter(match="wx:*")
+                     if not name.startswith("wx:nick:")]
+            if names:
+                await self.redis.delete(*names)
+
+    async def close(self):
+        await self.redis.close()
+
+
+def create_credential_store() -> CredentialStore:
+    """根据配置创建请求参数存储"""
+    if settings.CREDENTIAL_STORE_BACKEND == "memory":
+        return MemoryCredentialStore()
+    return RedisCredentialStore()
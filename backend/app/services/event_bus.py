@@ -0,0 +1,176 @@
+"""
+WebSocket事件总线
+WebSocketService 发出的事件经事件总线分发给每个API进程，再由各进程投递给本地订阅的连接，
+支持Redis发布订阅和内存两种后端
+"""
+import asyncio
+import json
+import logging
+from abc import ABC, abstractmethod
+from typing import Dict, List, Any, Optional, Hashable, Iterable, Callable, Awaitable
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 本地投递函数 (事件类型, 数据, 范围, 合并键)，即 ConnectionManager.publish
+EventHandler = Callable[[str, Dict[str, Any], Iterable[Any], Hashable], Awaitable[Any]]
+
+# 进程内部事件的监听函数，只接收事件数据
+EventListener = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+# Redis订阅断开后重连的最大等待时间（秒）
+MAX_RECONNECT_DELAY = 30
+
+
+def _hashable(value: Any) -> Hashable:
+    """JSON中的列表还原为元组，用作合并键"""
+    if isinstance(value, list):
+        return tuple(_hashable(item) for item in value)
+    return value
+
+
+class EventBus(ABC):
+    """事件总线基类"""
+
+    def __init__(self):
+        self.handler: Optional[EventHandler] = None
+        self.listeners: Dict[str, List[EventListener]] = {}
+
+    def add_listener(self, event: str, listener: EventListener):
+        """注册进程内部事件的监听函数，如各进程的搜索缓存失效"""
+        self.listeners.setdefault(event, []).append(listener)
+
+    async def start(self, handler: EventHandler):
+        """开始接收事件并交给本地投递函数"""
+        self.handler = handler
+
+    @abstractmethod
+    async def publish(self,
+                      event: str,
+                      data: Dict[str, Any],
+                      scopes: Iterable[Any] = (),
+                      key: Hashable = None):
+        """发布事件"""
+
+    async def _deliver(self, event: str, data: Dict[str, Any], scopes: Iterable[Any], key: Hashable):
+        for listener in self.listeners.get(event, ()):
+            try:
+                await listener(data)
+            except Exception as e:
+                logger.error(f"处理事件 {event} 失败: {e}")
+        if self.handler is None:
+            return
+        try:
+            await self.handler(event, data, scopes, key)
+        except Exception as e:
+            logger.error(f"投递WebSocket事件失败: {e}")
+
+    async def close(self):
+        """停止接收事件"""
+        self.handler = None
+
+
+class MemoryEventBus(EventBus):
+    """内存事件总线，只在当前进程内投递，用于单进程部署和测试"""
+
+    async def publish(self,
+                      event: str,
+                      data: Dict[str, Any],
+                      scopes: Iterable[Any] = (),
+                      key: Hashable = None):
+        await self._deliver(event, data, list(scopes), key)
+
+
+class RedisEventBus(EventBus):
+    """Redis发布订阅事件总线
+
+    事件发布到 {channel}:{事件类型} 频道，每个API进程按模式订阅全部事件频道并转发给本地连接。
+    爬虫、导出等独立进程只需调用 publish，无需 start。
+    """
+
+    def __init__(self, redis_url: Optional[str] = None, channel: Optional[str] = None):
+        super().__init__()
+        import redis.asyncio as redis
+        self.redis = redis.from_url(redis_url or settings.REDIS_URL, decode_responses=True)
+        self.channel = channel or settings.WEBSOCKET_EVENT_CHANNEL
+        self.relay_task: Optional[asyncio.Task] = None
+
+    async def start(self, handler: EventHandler):
+        await super().start(handler)
+        if self.relay_task is None:
+            self.relay_task = asyncio.create_task(self._relay())
+
+    async def publish(self,
+                      event: str,
+                      data: Dict[str, Any],
+                      scopes: Iterable[Any] = (),
+                      key: Hashable = None):
+        scopes = [scope for scope in scopes if scope is not None]
+        try:
+            payload = json.dumps({
+                'event': event,
+                'data': data,
+                'scopes': scopes,
+                'key': key,
+            }, ensure_ascii=False, default=str)
+            await self.redis.publish(f"{self.channel}:{event}", payload)
+        except Exception as e:
+            # Redis不可用时至少投递给本进程的连接
+            logger.error(f"发布WebSocket事件失败，改为本地投递: {e}")
+            await self._deliver(event, data, scopes, key)
+
+    async def _relay(self):
+        """订阅事件频道并转发给本地投递函数，断线后自动重连"""
+        delay = 1
+        while True:
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.psubscribe(f"{self.channel}:*")
+                logger.info(f"已订阅WebSocket事件频道: {self.channel}:*")
+                delay = 1
+                async for message in pubsub.listen():
+                    if message.get('type') != 'pmessage':
+                        continue
+                    try:
+                        event = json.loads(message['data'])
+                    except (TypeError, ValueError):
+                        event = None
+                    if not isinstance(event, dict) or 'event' not in event:
+                        logger.warning(f"无效的WebSocket事件: {message.get('data')}")
+                        continue
+                    await self._deliver(
+                        event['event'],
+                        event.get('data') or {},
+                        event.get('scopes') or (),
+                        _hashable(event.get('key'))
+                    )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"WebSocket事件订阅中断，{delay}秒后重连: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, MAX_RECONNECT_DELAY)
+            finally:
+                try:
+                    await pubsub.reset()
+                except Exception:
+                    pass
+
+    async def close(self):
+        await super().close()
+        if self.relay_task is not None:
+            self.relay_task.cancel()
+            await asyncio.gather(self.relay_task, return_exceptions=True)
+            self.relay_task = None
+        await self.redis.close()
+
+
+def create_event_bus() -> EventBus:
+    """根据配置创建事件总线"""
+    if settings.WEBSOCKET_EVENT_BUS == "memory":
+        return MemoryEventBus()
+    return RedisEventBus()
+
+
+# 全局事件总线实例
+event_bus = create_event_bus()
@@ -1,24 +1,191 @@
 """
 导出服务
-支持Excel等格式的数据导出
+支持Excel、CSV、Parquet格式的数据导出
 """
+import asyncio
+import csv
 import logging
 import os
-import pandas as pd
-from typing import Dict, List, Any, Optional
+from concurrent.futures import Executor
+from typing import Dict, List, Any, Optional, Tuple, Sequence, Callable, Awaitable
 from datetime import datetime
-from sqlalchemy.orm import Session
+from openpyxl import Workbook
+from openpyxl.utils import get_column_letter
+from sqlalchemy import case, func, select, Select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
 from app.models.article import Article
-from app.services.like_service import like_service
+from app.models.like import Like
+from app.models.wechat_account import WechatAccount
 
 logger = logging.getLogger(__name__)
 
+# 支持的导出格式
+EXPORT_FORMATS = ('xlsx', 'csv', 'parquet')
+
+# 单个工作表最多行数（Excel上限1048576，减去表头）
+XLSX_MAX_ROWS = 1048575
+
+# 导出进度回调，参数为已写入行数
+ProgressCallback = Callable[[int], Awaitable[None]]
+
+# 导出列定义: (表头, 列宽, 类型)
+Column = Tuple[str, int, str]
+
+ARTICLE_COLUMNS: List[Column] = [
+    ("编号", 8, 'int'),
+    ("阅读", 10, 'int'),
+    ("点赞", 10, 'int'),
+    ("赞赏", 10, 'int'),
+    ("评论", 10, 'int'),
+    ("位置", 8, 'int'),
+    ("发文时间", 20, 'datetime'),
+    ("作者", 15, 'str'),
+    ("标题", 50, 'str'),
+    ("链接", 50, 'str'),
+    ("摘要", 50, 'str'),
+    ("收藏", 6, 'str'),
+]
+
+LIKE_COLUMNS: List[Column] = [
+    ("编号", 8, 'int'),
+    ("公众号", 20, 'str'),
+    ("标题", 50, 'str'),
+    ("作者", 15, 'str'),
+    ("发布时间", 20, 'datetime'),
+    ("收藏时间", 20, 'datetime'),
+    ("阅读数", 10, 'int'),
+    ("点赞数", 10, 'int'),
+    ("评论数", 10, 'int'),
+    ("赞赏数", 10, 'int'),
+    ("文章链接", 50, 'str'),
+    ("原文链接", 50, 'str'),
+    ("摘要", 50, 'str'),
+]
+
+SEARCH_RESULT_COLUMNS: List[Column] = [
+    ("编号", 8, 'int'),
+    ("公众号", 20, 'str'),
+    ("标题", 50, 'str'),
+    ("作者", 15, 'str'),
+    ("发布时间", 20, 'str'),
+    ("阅读数", 10, 'int'),
+    ("点赞数", 10, 'int'),
+    ("评论数", 10, 'int'),
+    ("赞赏数", 10, 'int'),
+    ("文章链接", 50, 'str'),
+    ("原文链接", 50, 'str'),
+    ("摘要", 50, 'str'),
+    ("相关度", 10, 'str'),
+]
+
+
+def _format_cell(value: Any) -> Any:
+    """文本格式中的单元格值，空值显示为 '-'"""
+    if value is None or value == '':
+        return '-'
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    return value
+
+
+class XlsxRowWriter:
+    """Excel流式写入器，使用openpyxl只写模式，超过行数上限自动新建工作表"""
+    
+    def __init__(self, filepath: str, columns: Sequence[Column], sheet_name: str):
+        self.filepath = filepath
+        self.columns = columns
+        self.sheet_name = sheet_name[:28]
+        self.workbook = Workbook(write_only=True)
+        self.sheet = None
+        self.sheet_rows = 0
+        self.sheet_count = 0
+        self._new_sheet()
+    
+    def _new_sheet(self):
+        """新建工作表并写入表头"""
+        self.sheet_count += 1
+        title = self.sheet_name if self.sheet_count == 1 else f"{self.sheet_name}_{self.sheet_count}"
+        self.sheet = self.workbook.create_sheet(title=title)
+        for i, (_, width, _) in enumerate(self.columns, start=1):
+            self.sheet.column_dimensions[get_column_letter(i)].width = width
+        self.sheet.append([header for header, _, _ in self.columns])
+        self.sheet_rows = 0
+    
+    def write_rows(self, rows: List[List[Any]]):
+        for row in rows:
+            if self.sheet_rows >= XLSX_MAX_ROWS:
+                self._new_sheet()
+            self.sheet.append([_format_cell(value) for value in row])
+            self.sheet_rows += 1
+    
+    def close(self):
+        self.workbook.save(self.filepath)
+
+
+class CsvRowWriter:
+    """CSV流式写入器，带BOM以便Excel正确识别中文"""
+    
+    def __init__(self, filepath: str, columns: Sequence[Column], sheet_name: str = None):
+        self.file = open(filepath, 'w', newline='', encoding='utf-8-sig')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow([header for header, _, _ in columns])
+    
+    def write_rows(self, rows: List[List[Any]]):
+        self.writer.writerows([_format_cell(value) for value in row] for row in rows)
+    
+    def close(self):
+        self.file.close()
+
+
+class ParquetRowWriter:
+    """Parquet流式写入器，每批数据写为一个row group"""
+    
+    def __init__(self, filepath: str, columns: Sequence[Column], sheet_name: str = None):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("导出Parquet需要安装pyarrow")
+        self.pa = pa
+        types = {'int': pa.int64(), 'str': pa.string(), 'datetime': pa.timestamp('s')}
+        self.kinds = [kind for _, _, kind in columns]
+        self.schema = pa.schema([(header, types[kind]) for header, _, kind in columns])
+        self.writer = pq.ParquetWriter(filepath, self.schema)
+    
+    def _convert(self, value: Any, kind: str) -> Any:
+        if value is None or kind == 'datetime':
+            return value
+        if kind == 'int':
+            return int(value) if isinstance(value, (int, float)) else None
+        return str(value)
+    
+    def write_rows(self, rows: List[List[Any]]):
+        if not rows:
+            return
+        arrays = [
+            self.pa.array([self._convert(row[i], kind) for row in rows], type=self.schema.field(i).type)
+            for i, kind in enumerate(self.kinds)
+        ]
+        self.writer.write_table(self.pa.Table.from_arrays(arrays, schema=self.schema))
+    
+    def close(self):
+        self.writer.close()
+
+
+ROW_WRITERS = {
+    'xlsx': XlsxRowWriter,
+    'csv': CsvRowWriter,
+    'parquet': ParquetRowWriter,
+}
+
 
 class ExportService:
     """导出服务类"""
     
-    def __init__(self, output_folder: str = "exports"):
+    def __init__(self, output_folder: str = "exports", batch_size: Optional[int] = None):
         self.output_folder = output_folder
+        self.batch_size = batch_size or settings.EXPORT_BATCH_SIZE
         self._ensure_output_folder()
     
     def _ensure_output_folder(self):
@@ -27,141 +194,183 @@ class ExportService:
             os.makedirs(self.output_folder)
             logger.info(f"创建输出文件夹: {self.output_folder}")
     
-    def export_articles_to_excel(self, db: Session, nickname: str = None) -> Optional[str]:
-        """导出文章到Excel"""
+    def _build_filepath(self, name: str, fmt: str) -> str:
+        """生成带时间戳的导出文件路径"""
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        return os.path.join(self.output_folder, f"{name}_{timestamp}.{fmt}")
+    
+    async def _stream_to_file(self,
+                              db: AsyncSession,
+                              query: Select,
+                              columns: Sequence[Column],
+                              filepath: str,
+                              fmt: str,
+                              sheet_name: str,
+                              progress_callback: Optional[ProgressCallback] = None,
+                              executor: Optional[Executor] = None) -> int:
+        """通过服务端游标分批读取查询结果并流式写入文件，返回写入行数
+        
+        指定executor时文件写入在线程池中执行，读取下一批数据与写入上一批数据并行；
+        写入过程中使用 .part 临时文件，完成后才重命名为正式文件名，避免下载到不完整的文件。
+        """
+        if fmt not in ROW_WRITERS:
+            raise ValueError(f"不支持的导出格式: {fmt}")
+        
+        loop = asyncio.get_running_loop()
+        
+        def run(func, *args):
+            if executor is None:
+                future = loop.create_future()
+                future.set_result(func(*args))
+                return future
+            return loop.run_in_executor(executor, func, *args)
+        
+        partial_path = f"{filepath}.part"
+        writer = await run(ROW_WRITERS[fmt], partial_path, columns, sheet_name)
+        count = 0
+        pending = None
         try:
-            # 查询文章数据
-            query = db.query(Article)
-            if nickname:
-                query = query.filter(Article.nickname == nickname)
-            
-            articles = query.order_by(Article.p_date.desc()).all()
+            try:
+                result = await db.stream(query.execution_options(yield_per=self.batch_size))
+                async for partition in result.partitions(self.batch_size):
+                    rows = []
+                    for row in partition:
+                        count += 1
+                        rows.append([count, *row])
+                    if pending is not None:
+                        await pending
+                    pending = run(writer.write_rows, rows)
+                    if progress_callback:
+                        await progress_callback(count)
+                if pending is not None:
+                    await pending
+            finally:
+                # 出错或取消时等线程池中的写入结束后再关闭文件
+                if pending is not None and not pending.done():
+                    await asyncio.wait([pending])
+                await run(writer.close)
+        except BaseException:
+            # 查询、写入失败或任务取消时删除未完成的文件
+            try:
+                os.remove(partial_path)
+            except OSError:
+                pass
+            raise
+        
+        if count == 0:
+            os.remove(partial_path)
+        else:
+            os.replace(partial_path, filepath)
+        return count
+    
+    async def count_articles(self, db: AsyncSession, nickname: str = None) -> int:
+        """统计待导出的文章数"""
+        query = select(func.count(Article.id))
+        if nickname:
+            query = query.join(WechatAccount, Article.account_id == WechatAccount.id).where(
+                WechatAccount.nickname == nickname
+            )
+        return await db.scalar(query) or 0
+    
+    async def count_likes(self, db: AsyncSession) -> int:
+        """统计待导出的收藏数"""
+        return await db.scalar(select(func.count(Like.id))) or 0
+    
+    def _articles_query(self, nickname: str = None) -> Select:
+        """文章导出查询，只选择导出需要的列"""
+        query = (
+            select(
+                Article.read_num,
+                Article.like_num,
+                Article.reward_num,
+                Article.comment_num,
+                Article.position,
+                Article.publish_time,
+                Article.author,
+                Article.title,
+                Article.url,
+                Article.digest,
+                # 收藏状态通过收藏表关联得到
+                case((Like.id.isnot(None), "是"), else_="否"),
+            )
+            .outerjoin(Like, Like.content_url == Article.url)
+        )
+        if nickname:
+            query = query.join(WechatAccount, Article.account_id == WechatAccount.id).where(
+                WechatAccount.nickname == nickname
+            )
+        return query.order_by(Article.publish_time.desc())
+    
+    async def export_articles(self,
+                              db: AsyncSession,
+                              nickname: str = None,
+                              fmt: str = 'xlsx',
+                              progress_callback: Optional[ProgressCallback] = None,
+                              executor: Optional[Executor] = None) -> Optional[str]:
+        """导出文章"""
+        try:
+            filepath = self._build_filepath(nickname or "all_articles", fmt)
+            count = await self._stream_to_file(
+                db, self._articles_query(nickname), ARTICLE_COLUMNS, filepath, fmt, nickname or "全部文章",
+                progress_callback, executor
+            )
             
-            if not articles:
+            if not count:
                 logger.warning(f"没有找到文章数据: {nickname}")
                 return None
             
-            # 准备数据
-            data = []
-            for article in articles:
-                row = {
-                    "编号": len(data) + 1,
-                    "阅读": article.read_num if article.read_num is not None else '-',
-                    "点赞": article.like_num if article.like_num is not None else '-',
-                    "赞赏": article.reward_num if article.reward_num is not None else '-',
-                    "评论": article.comment_num if article.comment_num is not None else '-',
-                    "位置": article.mov if article.mov is not None else '-',
-                    "发文时间": article.p_date.strftime('%Y-%m-%d %H:%M:%S') if article.p_date else '-',
-                    "作者": article.author or '-',
-                    "标题": article.title or '-',
-                    "链接": article.content_url or '-',
-                    "原文链接": article.source_url or '-',
-                    "摘要": article.digest or '-',
-                    "收藏": "是" if article.like_folder else "否"
-                }
-                data.append(row)
-            
-            # 创建DataFrame
-            df = pd.DataFrame(data)
-            
-            # 生成文件名
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            if nickname:
-                filename = f"{nickname}_{timestamp}.xlsx"
-            else:
-                filename = f"all_articles_{timestamp}.xlsx"
-            
-            filepath = os.path.join(self.output_folder, filename)
-            
-            # 写入Excel
-            with pd.ExcelWriter(filepath, engine='openpyxl') as writer:
-                sheet_name = nickname or "全部文章"
-                df.to_excel(writer, sheet_name=sheet_name, index=False)
-                
-                # 调整列宽
-                worksheet = writer.sheets[sheet_name]
-                for column in worksheet.columns:
-                    max_length = 0
-                    column_letter = column[0].column_letter
-                    for cell in column:
-                        try:
-                            if len(str(cell.value)) > max_length:
-                                max_length = len(str(cell.value))
-                        except:
-                            pass
-                    adjusted_width = min(max_length + 2, 50)
-                    worksheet.column_dimensions[column_letter].width = adjusted_width
-            
-            logger.info(f"Excel导出成功: {filepath}")
+            logger.info(f"文章导出成功: {filepath} ({count} 行)")
             return filepath
-            
+        
         except Exception as e:
-            logger.error(f"Excel导出失败: {e}")
+            logger.error(f"文章导出失败: {e}")
             return None
     
-    def export_likes_to_excel(self, db: Session) -> Optional[str]:
-        """导出收藏到Excel"""
+    async def export_articles_to_excel(self, db: AsyncSession, nickname: str = None) -> Optional[str]:
+        """导出文章到Excel"""
+        return await self.export_articles(db, nickname, 'xlsx')
+    
+    async def export_likes(self,
+                           db: AsyncSession,
+                           fmt: str = 'xlsx',
+                           progress_callback: Optional[ProgressCallback] = None,
+                           executor: Optional[Executor] = None) -> Optional[str]:
+        """导出收藏"""
         try:
-            # 获取收藏数据
-            likes_data = like_service.bulk_export_likes(db)
+            filepath = self._build_filepath("likes", fmt)
+            query = select(
+                Like.nickname,
+                Like.title,
+                Like.author,
+                Like.p_date,
+                Like.like_time,
+                Like.read_num,
+                Like.like_num,
+                Like.comment_num,
+                Like.reward_num,
+                Like.content_url,
+                Like.source_url,
+                Like.digest,
+            ).order_by(Like.like_time.desc())
             
-            if not likes_data:
+            count = await self._stream_to_file(
+                db, query, LIKE_COLUMNS, filepath, fmt, "收藏文章", progress_callback, executor
+            )
+            if not count:
                 logger.warning("没有找到收藏数据")
                 return None
             
-            # 准备数据
-            data = []
-            for like in likes_data:
-                row = {
-                    "编号": len(data) + 1,
-                    "公众号": like['nickname'] or '-',
-                    "标题": like['title'] or '-',
-                    "作者": like['author'] or '-',
-                    "发布时间": like['p_date'] or '-',
-                    "收藏时间": like['like_time'] or '-',
-                    "阅读数": like['read_num'] if like['read_num'] is not None else '-',
-                    "点赞数": like['like_num'] if like['like_num'] is not None else '-',
-                    "评论数": like['comment_num'] if like['comment_num'] is not None else '-',
-                    "赞赏数": like['reward_num'] if like['reward_num'] is not None else '-',
-                    "文章链接": like['content_url'] or '-',
-                    "原文链接": like['source_url'] or '-',
-                    "摘要": like['digest'] or '-'
-                }
-                data.append(row)
-            
-            # 创建DataFrame
-            df = pd.DataFrame(data)
-            
-            # 生成文件名
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f"likes_{timestamp}.xlsx"
-            filepath = os.path.join(self.output_folder, filename)
-            
-            # 写入Excel
-            with pd.ExcelWriter(filepath, engine='openpyxl') as writer:
-                df.to_excel(writer, sheet_name="收藏文章", index=False)
-                
-                # 调整列宽
-                worksheet = writer.sheets["收藏文章"]
-                for column in worksheet.columns:
-                    max_length = 0
-                    column_letter = column[0].column_letter
-                    for cell in column:
-                        try:
-                            if len(str(cell.value)) > max_length:
-                                max_length = len(str(cell.value))
-                        except:
-                            pass
-                    adjusted_width = min(max_length + 2, 50)
-                    worksheet.column_dimensions[column_letter].width = adjusted_width
-            
-            logger.info(f"收藏Excel导出成功: {filepath}")
+            logger.info(f"收藏导出成功: {filepath} ({count} 行)")
             return filepath
-            
+        
         except Exception as e:
-            logger.error(f"收藏Excel导出失败: {e}")
+            logger.error(f"收藏导出失败: {e}")
             return None
     
+    async def export_likes_to_excel(self, db: AsyncSession) -> Optional[str]:
+        """导出收藏到Excel"""
+        return await self.export_likes(db, 'xlsx')
+    
     def export_search_results_to_excel(self, search_results: List[Dict[str, Any]], search_keyword: str) -> Optional[str]:
         """导出搜索结果到Excel"""
         try:
@@ -169,56 +378,35 @@ class ExportService:
                 logger.warning("没有搜索结果数据")
                 return None
             
-            # 准备数据
-            data = []
-            for result in search_results:
-                row = {
-                    "编号": len(data) + 1,
-                    "公众号": result.get('nickname', '-'),
-                    "标题": result.get('title', '-'),
-                    "作者": result.get('author', '-'),
-                    "发布时间": result.get('p_date', '-'),
-                    "阅读数": result.get('read_num', '-'),
-                    "点赞数": result.get('like_num', '-'),
-                    "评论数": result.get('comment_num', '-'),
-                    "赞赏数": result.get('reward_num', '-'),
-                    "文章链接": result.get('content_url', '-'),
-                    "原文链接": result.get('source_url', '-'),
-                    "摘要": result.get('digest', '-'),
-                    "相关度": f"{result.get('score', 0):.2f}"
-                }
-                data.append(row)
-            
-            # 创建DataFrame
-            df = pd.DataFrame(data)
-            
-            # 生成文件名
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
             safe_keyword = "".join(c for c in search_keyword if c.isalnum() or c in (' ', '-', '_')).rstrip()
-            filename = f"search_{safe_keyword}_{timestamp}.xlsx"
-            filepath = os.path.join(self.output_folder, filename)
+            filepath = self._build_filepath(f"search_{safe_keyword}", 'xlsx')
             
-            # 写入Excel
-            with pd.ExcelWriter(filepath, engine='openpyxl') as writer:
-                df.to_excel(writer, sheet_name="搜索结果", index=False)
-                
-                # 调整列宽
-                worksheet = writer.sheets["搜索结果"]
-                for column in worksheet.columns:
-                    max_length = 0
-                    column_letter = column[0].column_letter
-                    for cell in column:
-                        try:
-                            if len(str(cell.value)) > max_length:
-                                max_length = len(str(cell.value))
-                        except:
-                            pass
-                    adjusted_width = min(max_length + 2, 50)
-                    worksheet.column_dimensions[column_letter].width = adjusted_width
+            writer = XlsxRowWriter(filepath, SEARCH_RESULT_COLUMNS, "搜索结果")
+            try:
+                writer.write_rows([
+                    [
+                        i,
+                        result.get('nickname'),
+                        result.get('title'),
+                        result.get('author'),
+                        result.get('p_date'),
+                        result.get('read_num'),
+                        result.get('like_num'),
+                        result.get('comment_num'),
+                        result.get('reward_num'),
+                        result.get('content_url'),
+                        result.get('source_url'),
+                        result.get('digest'),
+                        f"{result.get('score') or 0:.2f}",
+                    ]
+                    for i, result in enumerate(search_results, start=1)
+                ])
+            finally:
+                writer.close()
             
             logger.info(f"搜索结果Excel导出成功: {filepath}")
             return filepath
-            
+        
         except Exception as e:
             logger.error(f"搜索结果Excel导出失败: {e}")
             return None
@@ -229,7 +417,7 @@ class ExportService:
             files = []
             if os.path.exists(self.output_folder):
                 for filename in os.listdir(self.output_folder):
-                    if filename.endswith('.xlsx'):
+                    if filename.rsplit('.', 1)[-1] in EXPORT_FORMATS:
                         filepath = os.path.join(self.output_folder, filename)
                         stat = os.stat(filepath)
                         files.append({
@@ -243,7 +431,7 @@ class ExportService:
             # 按修改时间排序
             files.sort(key=lambda x: x['modified_time'], reverse=True)
             return files
-            
+        
         except Exception as e:
             logger.error(f"获取导出文件列表失败: {e}")
             return []
@@ -263,4 +451,4 @@ class ExportService:
 
 
 # 全局导出服务实例
-export_service = ExportService() 
\ No newline at end of file
+export_service = ExportService()
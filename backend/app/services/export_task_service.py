@@ -0,0 +1,193 @@
+"""
+导出任务服务
+将导出作为后台任务执行，进度记录在任务表并通过WebSocket推送
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional
+from datetime import datetime
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.task import Task, TaskStatus, TaskType
+from app.services.export_service import export_service
+from app.services.websocket_service import WebSocketService
+
+logger = logging.getLogger(__name__)
+
+# 支持的导出对象
+EXPORT_TARGETS = ('articles', 'likes')
+
+
+class ExportTaskService:
+    """导出任务服务类"""
+
+    def __init__(self, max_workers: Optional[int] = None, progress_interval: float = 1.0):
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or settings.EXPORT_WORKERS,
+            thread_name_prefix="export",
+        )
+        self.progress_interval = progress_interval
+        self.jobs: Dict[int, asyncio.Task] = {}
+
+    async def submit(self,
+                     db: AsyncSession,
+                     target: str,
+                     fmt: str = 'xlsx',
+                     nickname: Optional[str] = None,
+                     user_id: Optional[int] = None) -> Task:
+        """创建导出任务并在后台执行，立即返回任务记录"""
+        if target not in EXPORT_TARGETS:
+            raise ValueError(f"不支持的导出对象: {target}")
+
+        task = Task(
+            name=f"导出{'文章' if target == 'articles' else '收藏'}" + (f" - {nickname}" if nickname else ""),
+            task_type=TaskType.EXPORT_DATA,
+            status=TaskStatus.PENDING,
+            parameters=json.dumps({'target': target, 'format': fmt, 'nickname': nickname}, ensure_ascii=False),
+            user_id=user_id,
+        )
+        db.add(task)
+        await db.commit()
+        await db.refresh(task)
+
+        task_id = task.id
+        job = asyncio.create_task(self._run(task_id, target, fmt, nickname))
+        self.jobs[task_id] = job
+        job.add_done_callback(lambda _: self.jobs.pop(task_id, None))
+        logger.info(f"创建导出任务: {task_id} {target} {fmt}")
+        return task
+
+    async def _update_task(self, db: AsyncSession, task_id: int, **values):
+        """更新任务记录"""
+        await db.execute(update(Task).where(Task.id == task_id).values(**values))
+        await db.commit()
+
+    async def _send_progress(self, task_id: int, status: str, processed: int, total: int, **extra):
+        """推送导出进度"""
+        await WebSocketService.send_export_progress({
+            'task_id': task_id,
+            'status': status,
+            'processed_items': processed,
+            'total_items': total,
+            'progress': self._percent(processed, total),
+            **extra,
+        })
+
+    @staticmethod
+    def _percent(processed: int, total: int) -> int:
+        return min(100, int(processed * 100 / total)) if total else 0
+
+    async def _run(self, task_id: int, target: str, fmt: str, nickname: Optional[str]):
+        """执行导出任务"""
+        async with AsyncSessionLocal() as db:
+            try:
+                if target == 'articles':
+                    total = await export_service.count_articles(db, nickname)
+                else:
+                    total = await export_service.count_likes(db)
+                await self._update_task(
+                    db, task_id,
+                    status=TaskStatus.RUNNING,
+                    started_at=datetime.utcnow(),
+                    total_items=total,
+                )
+                await self._send_progress(task_id, TaskStatus.RUNNING.value, 0, total)
+
+                last_report = 0.0
+
+                async def on_progress(processed: int):
+                    nonlocal last_report
+                    now = time.monotonic()
+                    if now - last_report < self.progress_interval:
+                        return
+                    last_report = now
+                    await self._update_task(
+                        db, task_id,
+                        processed_items=processed,
+                        progress=self._percent(processed, total),
+                    )
+                    await self._send_progress(task_id, TaskStatus.RUNNING.value, processed, total)
+
+                # 导出查询占用服务端游标，进度更新使用单独的会话
+                async with AsyncSessionLocal() as export_db:
+                    if target == 'articles':
+                        filepath = await export_service.export_articles(
+                            export_db, nickname, fmt, on_progress, self.executor
+                        )
+                    else:
+                        filepath = await export_service.export_likes(
+                            export_db, fmt, on_progress, self.executor
+                        )
+
+                if not filepath:
+                    raise RuntimeError("没有数据可导出" if total == 0 else "导出失败")
+
+                filename = os.path.basename(filepath)
+                await self._update_task(
+                    db, task_id,
+                    status=TaskStatus.COMPLETED,
+                    progress=100,
+                    processed_items=total,
+                    completed_at=datetime.utcnow(),
+                    result=json.dumps({
+                        'filename': filename,
+                        'download_url': f"/api/v1/export/download/{filename}",
+                    }, ensure_ascii=False),
+                )
+                await self._send_progress(task_id, TaskStatus.COMPLETED.value, total, total, filename=filename)
+                logger.info(f"导出任务完成: {task_id} {filepath}")
+
+            except asyncio.CancelledError:
+                await self._update_task(
+                    db, task_id,
+                    status=TaskStatus.CANCELLED,
+                    completed_at=datetime.utcnow(),
+                )
+                raise
+            except Exception as e:
+                logger.error(f"导出任务失败: {task_id}: {e}")
+                await db.rollback()
+                await self._update_task(
+                    db, task_id,
+                    status=TaskStatus.FAILED,
+                    error_message=str(e),
+                    completed_at=datetime.utcnow(),
+                )
+                await self._send_progress(task_id, TaskStatus.FAILED.value, 0, 0, error=str(e))
+
+    async def get_task(self, db: AsyncSession, task_id: int) -> Optional[Dict[str, Any]]:
+        """获取导出任务状态"""
+        task = await db.get(Task, task_id)
+        if not task or task.task_type != TaskType.EXPORT_DATA:
+            return None
+        return {
+            'task_id': task.id,
+            'name': task.name,
+            'status': task.status,
+            'progress': task.progress,
+            'total_items': task.total_items,
+            'processed_items': task.processed_items,
+            'result': json.loads(task.result) if task.result else None,
+            'error_message': task.error_message,
+            'created_at': task.created_at,
+            'started_at': task.started_at,
+            'completed_at': task.completed_at,
+        }
+
+    async def shutdown(self):
+        """取消未完成的导出任务并关闭线程池"""
+        for job in list(self.jobs.values()):
+            job.cancel()
+        if self.jobs:
+            await asyncio.gather(*self.jobs.values(), return_exceptions=True)
+        self.executor.shutdown(wait=False)
+
+
+# 全局导出任务服务实例
+export_task_service = ExportTaskService()
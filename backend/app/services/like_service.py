@@ -5,13 +5,48 @@
 import logging
 from typing import Dict, List, Any, Optional
 from datetime import datetime
-from sqlalchemy.orm import Session
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import defer
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.article import Article
 from app.models.like import Like
-from app.core.database import get_db
+from app.models.wechat_account import WechatAccount
 
 logger = logging.getLogger(__name__)
 
+# 列表页返回的收藏字段，不含正文
+LIKE_LIST_COLUMNS = (
+    Like.id,
+    Like.nickname,
+    Like.title,
+    Like.author,
+    Like.content_url,
+    Like.source_url,
+    Like.p_date,
+    Like.like_time,
+    Like.read_num,
+    Like.like_num,
+    Like.comment_num,
+    Like.reward_num,
+    Like.digest,
+)
+
+# pg_trgm 从关键词中至少能抽出一个完整三元组的最短长度，更短的关键词无法使用三元组索引
+MIN_TRGM_LENGTH = 3
+
+
+def like_list_options(raiseload: bool = True):
+    """加载Like实体时延迟加载正文的选项
+    
+    raiseload 为真时访问未加载的正文直接报错，避免在异步会话中隐式触发查询。
+    """
+    return (defer(Like.content, raiseload=raiseload),)
+
+
+def escape_like(value: str) -> str:
+    """转义 LIKE 通配符"""
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
 
 class LikeService:
     """收藏服务类"""
@@ -19,82 +54,94 @@ class LikeService:
     def __init__(self):
         pass
     
-    def get_like_info(self, db: Session) -> Dict[str, Any]:
+    def _row_to_dict(self, row: Any) -> Dict[str, Any]:
+        """列表查询结果转换为字典"""
+        return dict(row._mapping)
+    
+    def _to_dict(self, like: Like) -> Dict[str, Any]:
+        """收藏记录转换为字典"""
+        return {
+            'id': like.id,
+            'nickname': like.nickname,
+            'title': like.title,
+            'author': like.author,
+            'content_url': like.content_url,
+            'source_url': like.source_url,
+            'p_date': like.p_date,
+            'like_time': like.like_time,
+            'read_num': like.read_num,
+            'like_num': like.like_num,
+            'comment_num': like.comment_num,
+            'reward_num': like.reward_num,
+            'digest': like.digest,
+            'content': like.content
+        }
+    
+    async def get_like_info(self, db: AsyncSession) -> Dict[str, Any]:
         """获取收藏统计信息"""
         try:
-            total_count = db.query(Like).count()
+            total_count = await db.scalar(select(func.count(Like.id)))
             return {
-                'total': total_count,
+                'total': total_count or 0,
                 'updated_at': datetime.now()
             }
         except Exception as e:
             logger.error(f"获取收藏信息失败: {e}")
             return {'total': 0, 'error': str(e)}
     
-    def get_like_list(self, db: Session, start: int = 0, end: int = 10) -> List[Dict[str, Any]]:
-        """获取收藏文章列表"""
+    async def get_like_list(self, db: AsyncSession, start: int = 0, end: int = 10) -> List[Dict[str, Any]]:
+        """获取收藏文章列表，不含正文，正文通过 get_like_by_id 获取"""
         try:
-            likes = db.query(Like).order_by(Like.like_time.desc()).offset(start).limit(end - start).all()
-            
-            result = []
-            for like in likes:
-                like_data = {
-                    'id': like.id,
-                    'nickname': like.nickname,
-                    'title': like.title,
-                    'author': like.author,
-                    'content_url': like.content_url,
-                    'source_url': like.source_url,
-                    'p_date': like.p_date,
-                    'like_time': like.like_time,
-                    'read_num': like.read_num,
-                    'like_num': like.like_num,
-                    'comment_num': like.comment_num,
-                    'reward_num': like.reward_num,
-                    'digest': like.digest,
-                    'content': like.content
-                }
-                result.append(like_data)
-            
-            return result
+            result = await db.execute(
+                select(*LIKE_LIST_COLUMNS).order_by(Like.like_time.desc()).offset(start).limit(end - start)
+            )
+            return [self._row_to_dict(row) for row in result]
         except Exception as e:
             logger.error(f"获取收藏列表失败: {e}")
             return []
     
-    def add_like(self, db: Session, article_info: Dict[str, Any]) -> bool:
+    async def _get_article(self, db: AsyncSession, nickname: str, content_url: str) -> Optional[Article]:
+        """根据公众号名称和链接获取文章"""
+        result = await db.execute(
+            select(Article)
+            .join(WechatAccount, Article.account_id == WechatAccount.id)
+            .where(WechatAccount.nickname == nickname, Article.url == content_url)
+        )
+        return result.scalars().first()
+    
+    async def _get_like(self, db: AsyncSession, nickname: str, content_url: str) -> Optional[Like]:
+        """根据公众号名称和链接获取收藏记录"""
+        result = await db.execute(
+            select(Like).where(Like.nickname == nickname, Like.content_url == content_url)
+        )
+        return result.scalars().first()
+    
+    async def add_like(self, db: AsyncSession, article_info: Dict[str, Any]) -> bool:
         """添加文章到收藏"""
         try:
             nickname = article_info.get('nickname')
             content_url = article_info.get('content_url')
             
             # 检查是否已经收藏
-            existing_like = db.query(Like).filter(
-                Like.nickname == nickname,
-                Like.content_url == content_url
-            ).first()
-            
+            existing_like = await self._get_like(db, nickname, content_url)
             if existing_like:
                 logger.warning(f"文章已收藏: {content_url}")
                 return False
             
             # 从文章表获取完整信息
-            article = db.query(Article).filter(
-                Article.nickname == nickname,
-                Article.content_url == content_url
-            ).first()
-            
+            article = await self._get_article(db, nickname, content_url)
             if not article:
                 logger.error(f"文章不存在: {content_url}")
                 return False
             
             # 创建收藏记录
             like = Like(
-                nickname=article.nickname,
+                nickname=nickname,
                 title=article.title,
                 author=article.author,
-                content_url=article.content_url,
-                source_url=article.source_url,
-                p_date=article.p_date,
+                content_url=article.url,
+                source_url=article_info.get('source_url'),
+                p_date=article.publish_time,
                 like_time=datetime.now(),
                 read_num=article.read_num,
                 like_num=article.like_num,
@@ -105,123 +152,96 @@ class LikeService:
             )
             
             db.add(like)
-            
-            # 更新原文章的收藏状态
-            article.like_folder = True
-            db.commit()
+            await db.commit()
             
             logger.info(f"添加收藏成功: {content_url}")
             return True
-            
+        
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             logger.error(f"添加收藏失败: {e}")
             return False
     
-    def delete_like(self, db: Session, article_info: Dict[str, Any]) -> bool:
+    async def delete_like(self, db: AsyncSession, article_info: Dict[str, Any]) -> bool:
         """从收藏中删除文章"""
         try:
             nickname = article_info.get('nickname')
             content_url = article_info.get('content_url')
             
             # 删除收藏记录
-            like = db.query(Like).filter(
-                Like.nickname == nickname,
-                Like.content_url == content_url
-            ).first()
-            
+            like = await self._get_like(db, nickname, content_url)
             if not like:
                 logger.warning(f"收藏记录不存在: {content_url}")
                 return False
             
-            db.delete(like)
-            
-            # 更新原文章的收藏状态
-            article = db.query(Article).filter(
-                Article.nickname == nickname,
-                Article.content_url == content_url
-            ).first()
-            
-            if article:
-                article.like_folder = False
-            
-            db.commit()
+            await db.delete(like)
+            await db.commit()
             
             logger.info(f"删除收藏成功: {content_url}")
             return True
-            
+        
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             logger.error(f"删除收藏失败: {e}")
             return False
     
-    def search_likes(self, db: Session, search_data: str, start: int = 0, end: int = 10) -> List[Dict[str, Any]]:
-        """搜索收藏文章"""
+    async def search_likes(self, db: AsyncSession, search_data: str, start: int = 0, end: int = 10) -> List[Dict[str, Any]]:
+        """搜索收藏文章，只返回列表字段
+        
+        ILIKE 由 pg_trgm 三元组GIN索引支持，结果按关键词与标题、摘要的相似度排序，
+        相似度相同时按收藏时间倒序。
+        
+        少于 MIN_TRGM_LENGTH 个字符的关键词抽不出三元组，索引无法过滤，只会退化为全表扫描：
+        这类关键词只匹配标题和摘要、不搜索正文，并按收藏时间倒序，
+        使查询可以沿 like_time 索引扫描，凑够一页即停止。
+        """
         try:
-            likes = db.query(Like).filter(
-                Like.title.contains(search_data) |
-                Like.content.contains(search_data) |
-                Like.digest.contains(search_data)
-            ).order_by(Like.like_time.desc()).offset(start).limit(end - start).all()
-            
-            result = []
-            for like in likes:
-                like_data = {
-                    'id': like.id,
-                    'nickname': like.nickname,
-                    'title': like.title,
-                    'author': like.author,
-                    'content_url': like.content_url,
-                    'source_url': like.source_url,
-                    'p_date': like.p_date,
-                    'like_time': like.like_time,
-                    'read_num': like.read_num,
-                    'like_num': like.like_num,
-                    'comment_num': like.comment_num,
-                    'reward_num': like.reward_num,
-                    'digest': like.digest,
-                    'content': like.content
-                }
-                result.append(like_data)
-            
-            return result
+            keyword = search_data.strip()
+            if not keyword:
+                return await self.get_like_list(db, start, end)
+            pattern = f"%{escape_like(keyword)}%"
+            if len(keyword) < MIN_TRGM_LENGTH:
+                result = await db.execute(
+                    select(*LIKE_LIST_COLUMNS).where(or_(
+                        Like.title.ilike(pattern, escape='\\'),
+                        Like.digest.ilike(pattern, escape='\\')
+                    )).order_by(Like.like_time.desc()).offset(start).limit(end - start)
+                )
+                return [self._row_to_dict(row) for row in result]
+            rank = (
+                2 * func.word_similarity(keyword, Like.title)
+                + func.word_similarity(keyword, func.coalesce(Like.digest, ''))
+            )
+            result = await db.execute(
+                select(*LIKE_LIST_COLUMNS).where(or_(
+                    Like.title.ilike(pattern, escape='\\'),
+                    Like.content.ilike(pattern, escape='\\'),
+                    Like.digest.ilike(pattern, escape='\\')
+                )).order_by(rank.desc(), Like.like_time.desc()).offset(start).limit(end - start)
+            )
+            return [self._row_to_dict(row) for row in result]
         except Exception as e:
             logger.error(f"搜索收藏失败: {e}")
             return []
     
-    def get_like_by_id(self, db: Session, like_id: int) -> Optional[Dict[str, Any]]:
+    async def get_like_by_id(self, db: AsyncSession, like_id: int) -> Optional[Dict[str, Any]]:
         """根据ID获取收藏详情"""
         try:
-            like = db.query(Like).filter(Like.id == like_id).first()
+            like = await db.get(Like, like_id)
             if like:
-                return {
-                    'id': like.id,
-                    'nickname': like.nickname,
-                    'title': like.title,
-                    'author': like.author,
-                    'content_url': like.content_url,
-                    'source_url': like.source_url,
-                    'p_date': like.p_date,
-                    'like_time': like.like_time,
-                    'read_num': like.read_num,
-                    'like_num': like.like_num,
-                    'comment_num': like.comment_num,
-                    'reward_num': like.reward_num,
-                    'digest': like.digest,
-                    'content': like.content
-                }
+                return self._to_dict(like)
             return None
         except Exception as e:
             logger.error(f"获取收藏详情失败: {e}")
             return None
     
-    def bulk_export_likes(self, db: Session) -> List[Dict[str, Any]]:
+    async def bulk_export_likes(self, db: AsyncSession) -> List[Dict[str, Any]]:
         """批量导出收藏数据"""
         try:
-            likes = db.query(Like).order_by(Like.like_time.desc()).all()
+            result = await db.execute(select(Like).order_by(Like.like_time.desc()))
             
-            result = []
-            for like in likes:
+            data = []
+            for like in result.scalars():
                 like_data = {
                     'nickname': like.nickname,
                     'title': like.title,
@@ -237,13 +257,13 @@ class LikeService:
                     'digest': like.digest,
                     'content': like.content
                 }
-                result.append(like_data)
+                data.append(like_data)
             
-            return result
+            return data
         except Exception as e:
             logger.error(f"导出收藏数据失败: {e}")
             return []
 
 
 # 全局收藏服务实例
-like_service = LikeService() 
\ No newline at end of file
+like_service = LikeService()
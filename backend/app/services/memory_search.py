@@ -0,0 +1,358 @@
+"""
+内存搜索后端
+纯Python倒排索引，按BM25打分，不依赖Elasticsearch，用于测试和小规模部署
+
+中文分词优先使用jieba（已安装时），否则按连续汉字切分为二元组，英文和数字按单词切分。
+索引时另外为每个汉字生成单字词项，单字查询也能命中；多字查询仍只用分词结果，避免单字稀释相关性。
+"""
+import asyncio
+import logging
+import math
+import re
+import time
+from collections import defaultdict
+from typing import Dict, List, Any, Optional, Iterable, AsyncIterable, Set, Tuple, Union
+from datetime import datetime
+from app.services.search_backend import (
+    SearchBackend, IndexItem, MAX_REPORTED_ERRORS, aiter_items,
+    cursor_hash, decode_cursor, encode_cursor
+)
+
+logger = logging.getLogger(__name__)
+
+# 可搜索字段及权重，与Elasticsearch后端的boost一致
+FIELD_BOOSTS = {'title': 2.0, 'digest': 1.0, 'content': 1.0}
+
+# BM25参数
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# 批量索引时每处理多少篇让出一次事件循环
+YIELD_EVERY = 1000
+
+WORD_PATTERN = re.compile(r'[a-z0-9]+|[一-鿿]+')
+
+_jieba = None
+
+
+def _load_jieba():
+    """按需加载jieba，未安装时返回None"""
+    global _jieba
+    if _jieba is None:
+        try:
+            import jieba
+            jieba.setLogLevel(logging.WARNING)
+            _jieba = jieba
+        except ImportError:
+            _jieba = False
+    return _jieba or None
+
+
+def _is_cjk(run: str) -> bool:
+    return run[0] >= '一'
+
+
+def tokenize(text: Optional[str], query: bool = False) -> List[str]:
+    """切分文本为词项，索引时（query为假）额外生成汉字单字词项"""
+    if not text:
+        return []
+    text = text.lower()
+    runs = WORD_PATTERN.findall(text)
+    jieba = _load_jieba()
+    if jieba:
+        tokens = [token for token in jieba.lcut_for_search(text) if WORD_PATTERN.fullmatch(token)]
+    else:
+        tokens = []
+        for run in runs:
+            if _is_cjk(run) and len(run) > 1:
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+            else:
+                tokens.append(run)
+    if not query:
+        tokens.extend(char for run in runs if _is_cjk(run) and len(run) > 1 for char in run)
+    return tokens
+
+
+def _sort_date(value: Any) -> float:
+    """发布时间转换为可排序的数值，缺失时排在最后"""
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value).timestamp()
+        except ValueError:
+            pass
+    return float('-inf')
+
+
+class FieldIndex:
+    """单个字段的倒排索引"""
+
+    def __init__(self):
+        self.postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self.lengths: Dict[str, int] = {}
+        self.total_length = 0
+
+    def add(self, doc_id: str, tokens: List[str]):
+        counts: Dict[str, int] = defaultdict(int)
+        for token in tokens:
+            counts[token] += 1
+        for token, tf in counts.items():
+            self.postings[token][doc_id] = tf
+        self.lengths[doc_id] = len(tokens)
+        self.total_length += len(tokens)
+
+    def remove(self, doc_id: str, tokens: Iterable[str]):
+        for token in set(tokens):
+            docs = self.postings.get(token)
+            if docs is not None:
+                docs.pop(doc_id, None)
+                if not docs:
+                    del self.postings[token]
+        self.total_length -= self.lengths.pop(doc_id, 0)
+
+    def score(self, tokens: List[str], candidates: Optional[Set[str]], boost: float, scores: Dict[str, float]):
+        """按BM25累加词项得分"""
+        doc_count = len(self.lengths)
+        if not doc_count:
+            return
+        avg_length = self.total_length / doc_count or 1.0
+        for token in tokens:
+            docs = self.postings.get(token)
+            if not docs:
+                continue
+            idf = math.log(1 + (doc_count - len(docs) + 0.5) / (len(docs) + 0.5))
+            for doc_id, tf in docs.items():
+                if candidates is not None and doc_id not in candidates:
+                    continue
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[doc_id] / avg_length)
+                scores[doc_id] += boost * idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+
+class MemorySearchBackend(SearchBackend):
+    """内存搜索后端"""
+
+    def __init__(self):
+        super().__init__()
+        self.index_name = 'memory'
+        self.docs: Dict[str, Dict[str, Any]] = {}
+        self.doc_tokens: Dict[str, Dict[str, List[str]]] = {}
+        self.fields = {field: FieldIndex() for field in FIELD_BOOSTS}
+        self.accounts: Dict[str, Set[str]] = defaultdict(set)
+
+    def _add(self, nickname: str, article_data: Dict[str, Any], indexed_at: Optional[datetime] = None) -> bool:
+        """写入一篇文章，已存在时先删除旧文档"""
+        doc_id = article_data.get('content_url')
+        if not doc_id:
+            return False
+        self._remove(doc_id)
+        doc = self._to_doc(nickname, article_data, indexed_at)
+        tokens = {field: tokenize(doc.get(field)) for field in FIELD_BOOSTS}
+        for field, index in self.fields.items():
+            index.add(doc_id, tokens[field])
+        self.docs[doc_id] = doc
+        self.doc_tokens[doc_id] = tokens
+        self.accounts[nickname].add(doc_id)
+        return True
+
+    def _remove(self, doc_id: str):
+        doc = self.docs.pop(doc_id, None)
+        if doc is None:
+            return
+        tokens = self.doc_tokens.pop(doc_id)
+        for field, index in self.fields.items():
+            index.remove(doc_id, tokens[field])
+        docs = self.accounts.get(doc['nickname'])
+        if docs is not None:
+            docs.discard(doc_id)
+            if not docs:
+                del self.accounts[doc['nickname']]
+
+    async def index_article(self, nickname: str, article_data: Dict[str, Any]) -> bool:
+        """索引文章数据"""
+        added = self._add(nickname, article_data)
+        if added:
+            await self.invalidate_cache([nickname])
+        return added
+
+    async def bulk_index(self,
+                         items: Union[Iterable[IndexItem], AsyncIterable[IndexItem]],
+                         **kwargs) -> Dict[str, Any]:
+        """批量索引，分块参数对内存后端无意义，忽略"""
+        indexed_at = datetime.now()
+        report = {'indexed': 0, 'failed': 0, 'errors': []}
+        count = 0
+        nicknames = set()
+        async for nickname, article in aiter_items(items):
+            if self._add(nickname, article, indexed_at):
+                nicknames.add(nickname)
+                report['indexed'] += 1
+            else:
+                report['failed'] += 1
+                if len(report['errors']) < MAX_REPORTED_ERRORS:
+                    report['errors'].append({'id': None, 'status': 400, 'error': '缺少文章链接'})
+            count += 1
+            if count % YIELD_EVERY == 0:
+                await asyncio.sleep(0)
+        if nicknames:
+            await self.invalidate_cache(nicknames)
+        logger.info(f"批量索引完成: 成功 {report['indexed']} 篇，失败 {report['failed']} 篇")
+        return report
+
+    def _highlight(self, text: Optional[str], tokens: List[str], fragment_size: int, fragments: int) -> List[str]:
+        """在原文中标记词项，返回高亮片段；fragments为0时返回整段"""
+        if not text or not tokens:
+            return []
+        lower = text.lower()
+        spans = []
+        for token in tokens:
+            start = lower.find(token)
+            while start != -1:
+                spans.append((start, start + len(token)))
+                start = lower.find(token, start + 1)
+        if not spans:
+            return []
+
+        spans.sort()
+        merged = [list(spans[0])]
+        for start, end in spans[1:]:
+            if start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+
+        def mark(begin: int, finish: int) -> str:
+            parts, cursor = [], begin
+            for start, end in merged:
+                if end <= begin or start >= finish:
+                    continue
+                start, end = max(start, begin), min(end, finish)
+                parts.append(text[cursor:start])
+                parts.append(f"<em>{text[start:end]}</em>")
+                cursor = end
+            parts.append(text[cursor:finish])
+            return ''.join(parts)
+
+        if fragments == 0:
+            return [mark(0, len(text))]
+
+        result, covered = [], -1
+        for start, _ in merged:
+            if start < covered:
+                continue
+            begin = max(0, start - fragment_size // 4)
+            finish = min(len(text), begin + fragment_size)
+            result.append(mark(begin, finish))
+            covered = finish
+            if len(result) >= fragments:
+                break
+        return result
+
+    def _apply_source(self, doc: Dict[str, Any], source: Any) -> Dict[str, Any]:
+        """按 _source 过滤参数裁剪文档"""
+        if source is True:
+            return dict(doc)
+        includes = source.get('includes')
+        excludes = set(source.get('excludes') or ())
+        keys = includes if includes else doc.keys()
+        return {key: doc[key] for key in keys if key in doc and key not in excludes}
+
+    async def search_articles(self,
+                              search_data: str,
+                              gzhs: List[str] = None,
+                              fields: List[str] = None,
+                              _from: int = 0,
+                              _size: int = 10,
+                              cursor: Optional[str] = None,
+                              use_cursor: bool = False,
+                              source_includes: Optional[List[str]] = None,
+                              source_excludes: Optional[List[str]] = None,
+                              summary: bool = False) -> Dict[str, Any]:
+        """搜索文章，游标分页时游标中保存偏移量"""
+        started = time.perf_counter()
+        if gzhs is None or gzhs == ['全部']:
+            gzhs = []
+        if not fields or '全部' in fields:
+            fields = list(FIELD_BOOSTS)
+        fields = [field for field in fields if field in FIELD_BOOSTS]
+
+        query_hash = None
+        if cursor or use_cursor:
+            query_hash = cursor_hash(search_data, gzhs, fields)
+            if cursor:
+                state = decode_cursor(cursor)
+                if 'offset' not in state or state.get('q') != query_hash:
+                    raise ValueError("游标与查询条件不匹配")
+                _from = state['offset']
+            else:
+                _from = 0
+
+        candidates = None
+        if gzhs:
+            candidates = set()
+            for nickname in gzhs:
+                candidates |= self.accounts.get(nickname, set())
+
+        tokens = list(dict.fromkeys(tokenize(search_data, query=True)))
+        scores: Dict[str, float] = defaultdict(float)
+        for field in fields:
+            self.fields[field].score(tokens, candidates, FIELD_BOOSTS[field], scores)
+
+        ranked: List[Tuple[str, float]] = sorted(
+            scores.items(),
+            key=lambda item: (-item[1], -_sort_date(self.docs[item[0]].get('p_date')))
+        )
+        page = ranked[_from:_from + _size]
+
+        source = self._source_filter(source_includes, source_excludes, summary)
+        results = []
+        for doc_id, score in page:
+            doc = self.docs[doc_id]
+            result = self._apply_source(doc, source)
+            result['score'] = score
+            highlights = {}
+            for field in ('title', 'digest'):
+                fragments = self._highlight(doc.get(field), tokens, 0, 0)
+                if fragments:
+                    highlights[field] = fragments
+            fragment_size = 150 if summary else 200
+            fragments = self._highlight(doc.get('content'), tokens, fragment_size, 3)
+            if not fragments and summary and doc.get('content'):
+                fragments = [doc['content'][:fragment_size]]
+            if fragments:
+                highlights['content'] = fragments
+            result['highlights'] = highlights
+            results.append(result)
+
+        response = {
+            'total': len(ranked),
+            'results': results,
+            'took': int((time.perf_counter() - started) * 1000)
+        }
+        if query_hash is not None:
+            next_offset = _from + len(page)
+            response['next_cursor'] = encode_cursor({
+                'offset': next_offset,
+                'q': query_hash
+            }) if len(page) == _size and next_offset < len(ranked) else None
+        return response
+
+    async def get_index_info(self) -> List[Dict[str, Any]]:
+        """获取各公众号的索引文档数量"""
+        return sorted(
+            (
+                {'nickname': nickname, 'doc_count': len(docs), 'index_name': self.index_name}
+                for nickname, docs in self.accounts.items()
+            ),
+            key=lambda info: -info['doc_count']
+        )
+
+    async def delete_index(self, nickname: str) -> bool:
+        """删除公众号的全部索引文档"""
+        doc_ids = list(self.accounts.get(nickname, ()))
+        for doc_id in doc_ids:
+            self._remove(doc_id)
+        if doc_ids:
+            await self.invalidate_cache([nickname])
+            logger.info(f"删除公众号 {nickname} 的索引文档 {len(doc_ids)} 篇")
+        return bool(doc_ids)
@@ -0,0 +1,150 @@
+"""
+进度聚合服务
+合并高频进度更新，按时间窗口推送累计计数、吞吐量和预计剩余时间
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, Any, Optional, Callable, Awaitable
+from app.core.config import settings
+from app.services.websocket_service import TERMINAL_STATUSES, WebSocketService
+
+logger = logging.getLogger(__name__)
+
+ProgressSender = Callable[[Dict[str, Any]], Awaitable[None]]
+
+# 超过该时间（秒）没有更新的进度状态被清理
+IDLE_TIMEOUT = 600
+
+
+class ProgressState:
+    """单个任务的累计进度"""
+
+    def __init__(self, fields: Dict[str, Any]):
+        self.fields: Dict[str, Any] = dict(fields)
+        self.counters: Dict[str, int] = {}
+        self.total: Optional[int] = None
+        self.status = 'running'
+        self.started_at = time.monotonic()
+        self.updated_at = self.started_at
+        self.last_flush = 0.0
+        self.flush_task: Optional[asyncio.Task] = None
+        # 定时推送正在发送中
+        self.sending = False
+
+
+class ProgressAggregator:
+    """进度聚合器
+
+    update 只累加计数，不直接推送；每个任务在一个时间窗口内最多推送一次，
+    终止状态通过 finish 立即推送。
+    """
+
+    def __init__(self,
+                 sender: ProgressSender = WebSocketService.send_progress,
+                 window: Optional[float] = None,
+                 done_key: str = 'processed'):
+        self.sender = sender
+        self.window = settings.PROGRESS_WINDOW_MS / 1000 if window is None else window
+        self.done_key = done_key
+        self.states: Dict[str, ProgressState] = {}
+
+    def start(self, key: str, **fields):
+        """开始新任务，清空之前的计数"""
+        previous = self.states.pop(key, None)
+        if previous and previous.flush_task:
+            previous.flush_task.cancel()
+        self.states[key] = ProgressState(fields)
+
+    def update(self,
+               key: str,
+               counters: Optional[Dict[str, int]] = None,
+               total: Optional[int] = None,
+               **fields):
+        """累加计数并安排推送"""
+        state = self.states.get(key)
+        if state is None:
+            state = self.states[key] = ProgressState(fields)
+        else:
+            state.fields.update(fields)
+        for name, value in (counters or {}).items():
+            state.counters[name] = state.counters.get(name, 0) + value
+        if total is not None:
+            state.total = total
+        state.updated_at = time.monotonic()
+
+        if state.flush_task is None:
+            delay = max(0.0, state.last_flush + self.window - state.updated_at)
+            state.flush_task = asyncio.create_task(self._flush_later(key, state, delay))
+
+    async def finish(self, key: str, status: str = 'completed', **fields):
+        """推送终止状态并清理，保证终止状态在该任务的所有进度之后发出"""
+        if status not in TERMINAL_STATUSES:
+            raise ValueError(f"无效的终止状态: {status}")
+        state = self.states.pop(key, None)
+        if state is None:
+            state = ProgressState(fields)
+        else:
+            state.fields.update(fields)
+            task = state.flush_task
+            if task is not None:
+                if state.sending:
+                    # 等待正在发送的进度完成，避免它晚于终止状态到达
+                    await asyncio.gather(task, return_exceptions=True)
+                else:
+                    task.cancel()
+        state.status = status
+        await self._send(state)
+
+    def snapshot(self, state: ProgressState) -> Dict[str, Any]:
+        """构建推送内容"""
+        elapsed = time.monotonic() - state.started_at
+        done = state.counters.get(self.done_key, 0)
+        throughput = done / elapsed if elapsed > 0 else 0.0
+        eta = None
+        if state.total is not None and throughput > 0:
+            eta = max(0, state.total - done) / throughput
+        data = dict(state.fields)
+        data.update(state.counters)
+        data.update({
+            'status': state.status,
+            'total': state.total,
+            'elapsed': round(elapsed, 2),
+            'throughput': round(throughput, 2),
+            'eta': round(eta, 1) if eta is not None else None,
+        })
+        return data
+
+    async def _flush_later(self, key: str, state: ProgressState, delay: float):
+        try:
+            if delay:
+                await asyncio.sleep(delay)
+            if self.states.get(key) is state:
+                state.sending = True
+                await self._send(state)
+        finally:
+            state.sending = False
+            state.flush_task = None
+        # 发送期间有新的更新时继续安排下一次推送
+        if self.states.get(key) is state and state.updated_at > state.last_flush:
+            state.flush_task = asyncio.create_task(
+                self._flush_later(key, state, max(0.0, state.last_flush + self.window - time.monotonic()))
+            )
+        self._expire()
+
+    async def _send(self, state: ProgressState):
+        state.last_flush = time.monotonic()
+        try:
+            await self.sender(self.snapshot(state))
+        except Exception as e:
+            logger.error(f"推送进度失败: {e}")
+
+    def _expire(self):
+        """清理长时间没有更新的进度"""
+        deadline = time.monotonic() - IDLE_TIMEOUT
+        for key in [key for key, state in self.states.items() if state.updated_at < deadline]:
+            del self.states[key]
+
+
+# 全局进度聚合器实例
+progress_aggregator = ProgressAggregator()
@@ -0,0 +1,321 @@
+"""
+代理池服务
+从数据库加载可用代理，按成功率和响应时间加权选择出口代理；
+请求统计在内存中累计后批量写回，连续失败的代理进入隔离期并在后台重新验证
+"""
+import asyncio
+import logging
+import random
+import time
+from datetime import datetime
+from typing import Dict, List, Any, Optional
+import aiohttp
+from sqlalchemy import bindparam, select, update
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.proxy import Proxy
+
+logger = logging.getLogger(__name__)
+
+# aiohttp 原生支持的代理协议
+SUPPORTED_PROTOCOLS = frozenset({'http', 'https'})
+
+# 视为代理故障的HTTP状态码
+PROXY_ERROR_STATUSES = frozenset({407, 502, 503, 504})
+
+# 响应时间指数平均的平滑系数
+RESPONSE_TIME_ALPHA = 0.2
+
+# 没有响应时间数据时假定的响应时间（秒）
+DEFAULT_RESPONSE_TIME = 1.0
+
+
+class ProxyEntry:
+    """代理及其运行时统计"""
+
+    def __init__(self,
+                 url: str,
+                 proxy_id: Optional[int] = None,
+                 response_time: Optional[float] = None,
+                 total_requests: int = 0,
+                 success_requests: int = 0):
+        self.id = proxy_id
+        self.url = url
+        self.response_time = response_time
+        self.total_requests = total_requests or 0
+        self.success_requests = success_requests or 0
+        self.in_flight = 0
+        self.failures = 0
+        self.verify_failures = 0
+        self.quarantined_until: Optional[float] = None
+        self.last_used_at: Optional[datetime] = None
+        # 尚未写回数据库的增量
+        self.pending_total = 0
+        self.pending_success = 0
+
+    @property
+    def success_rate(self) -> float:
+        """平滑后的成功率，新代理按 1/2 起步"""
+        return (self.success_requests + 1) / (self.total_requests + 2)
+
+    @property
+    def weight(self) -> float:
+        """选择权重：成功率越高、响应越快、并发越少权重越大"""
+        response_time = self.response_time or DEFAULT_RESPONSE_TIME
+        return self.success_rate ** 2 / max(response_time, 0.05) / (1 + self.in_flight)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'id': self.id,
+            'url': self.url.split('@')[-1],
+            'success_rate': round(self.success_rate, 3),
+            'response_time': round(self.response_time, 3) if self.response_time is not None else None,
+            'total_requests': self.total_requests,
+            'in_flight': self.in_flight,
+            'quarantined': self.quarantined_until is not None,
+        }
+
+
+class ProxyPool:
+    """出口代理池"""
+
+    def __init__(self):
+        self.enabled = settings.PROXY_ENABLED
+        self.entries: Dict[str, ProxyEntry] = {}
+        self.quarantined: Dict[str, ProxyEntry] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._last_reload = 0.0
+
+    def _static_proxy(self) -> Optional[ProxyEntry]:
+        """配置文件中的固定代理，不写入数据库"""
+        if not settings.PROXY_URL:
+            return None
+        url = settings.PROXY_URL
+        if settings.PROXY_USERNAME and settings.PROXY_PASSWORD and '@' not in url:
+            scheme, _, address = url.rpartition('://')
+            url = f"{scheme or 'http'}://{settings.PROXY_USERNAME}:{settings.PROXY_PASSWORD}@{address}"
+        return ProxyEntry(url)
+
+    async def load(self):
+        """从数据库加载可用代理，保留已有代理的运行时统计"""
+        try:
+            async with AsyncSessionLocal() as session:
+                result = await session.execute(select(Proxy).where(Proxy.is_active.is_(True)))
+                proxies = result.scalars().all()
+        except Exception as e:
+            logger.error(f"加载代理失败: {e}")
+            return
+
+        loaded: Dict[str, ProxyEntry] = {}
+        for proxy in proxies:
+            if proxy.protocol not in SUPPORTED_PROTOCOLS:
+                logger.warning(f"跳过不支持的代理协议 {proxy.protocol}: {proxy.host}:{proxy.port}")
+                continue
+            url = proxy.url
+            entry = self.entries.get(url) or self.quarantined.get(url)
+            if entry is None:
+                entry = ProxyEntry(url, proxy.id, proxy.response_time,
+                                   proxy.total_requests, proxy.success_requests)
+            loaded[url] = entry
+        static = self._static_proxy()
+        if static is not None and static.url not in loaded:
+            loaded[static.url] = self.entries.get(static.url) or self.quarantined.get(static.url) or static
+
+        self.quarantined = {url: entry for url, entry in loaded.items() if entry.quarantined_until is not None}
+        self.entries = {url: entry for url, entry in loaded.items() if entry.quarantined_until is None}
+        self._last_reload = time.monotonic()
+        logger.info(f"代理池已加载: 可用 {len(self.entries)} 个，隔离 {len(self.quarantined)} 个")
+
+    async def start(self):
+        """加载代理并启动后台维护任务"""
+        if not self.enabled:
+            return
+        await self.load()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def acquire(self) -> Optional[ProxyEntry]:
+        """按权重选择代理，代理池为空时返回None表示直连"""
+        if not self.enabled or not self.entries:
+            return None
+        entries = list(self.entries.values())
+        entry = random.choices(entries, weights=[e.weight for e in entries])[0]
+        entry.in_flight += 1
+        entry.last_used_at = datetime.utcnow()
+        return entry
+
+    def release(self, entry: ProxyEntry):
+        """请求未完成时释放代理，不计入统计"""
+        entry.in_flight = max(0, entry.in_flight - 1)
+
+    def report(self, entry: ProxyEntry, success: bool, elapsed: Optional[float] = None):
+        """反馈请求结果，连续失败达到阈值时隔离代理"""
+        self.release(entry)
+        entry.total_requests += 1
+        entry.pending_total += 1
+        if success:
+            entry.success_requests += 1
+            entry.pending_success += 1
+            entry.failures = 0
+            if elapsed is not None:
+                if entry.response_time is None:
+                    entry.response_time = elapsed
+                else:
+                    entry.response_time += RESPONSE_TIME_ALPHA * (elapsed - entry.response_time)
+            return
+
+        entry.failures += 1
+        if entry.failures >= settings.PROXY_MAX_FAILURES and entry.url in self.entries:
+            self._quarantine(entry)
+
+    def _quarantine(self, entry: ProxyEntry):
+        # 隔离时间随验证失败次数指数增长
+        delay = settings.PROXY_QUARANTINE_SECONDS * (2 ** min(entry.verify_failures, 6))
+        entry.quarantined_until = time.monotonic() + delay
+        self.entries.pop(entry.url, None)
+        self.quarantined[entry.url] = entry
+        logger.warning(f"代理连续失败 {entry.failures} 次，隔离 {delay:.0f} 秒: {entry.stats()['url']}")
+
+    async def _verify(self, session: aiohttp.ClientSession, entry: ProxyEntry) -> bool:
+        """通过代理请求验证地址，检查是否恢复可用"""
+        started = time.monotonic()
+        try:
+            async with session.get(settings.PROXY_VERIFY_URL, proxy=entry.url) as response:
+                ok = response.status < 400
+        except Exception:
+            ok = False
+        if ok:
+            entry.response_time = time.monotonic() - started
+        return ok
+
+    async def verify_quarantined(self):
+        """重新验证隔离期已过的代理"""
+        now = time.monotonic()
+        due = [entry for entry in self.quarantined.values() if entry.quarantined_until <= now]
+        if not due:
+            return
+
+        timeout = aiohttp.ClientTimeout(total=settings.PROXY_VERIFY_TIMEOUT)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            results = await asyncio.gather(*(self._verify(session, entry) for entry in due))
+
+        verified, deactivated = [], []
+        for entry, ok in zip(due, results):
+            if ok:
+                entry.failures = 0
+                entry.verify_failures = 0
+                entry.quarantined_until = None
+                self.quarantined.pop(entry.url, None)
+                self.entries[entry.url] = entry
+                verified.append(entry)
+                logger.info(f"代理验证通过，恢复使用: {entry.stats()['url']}")
+            else:
+                entry.verify_failures += 1
+                if entry.verify_failures >= settings.PROXY_MAX_VERIFY_FAILURES and entry.id is not None:
+                    self.quarantined.pop(entry.url, None)
+                    deactivated.append(entry)
+                    logger.warning(f"代理多次验证失败，停用: {entry.stats()['url']}")
+                else:
+                    self._quarantine(entry)
+
+        await self._save_verification(verified, deactivated)
+
+    async def _save_verification(self, verified: List[ProxyEntry], deactivated: List[ProxyEntry]):
+        """写回验证结果"""
+        verified = [entry for entry in verified if entry.id is not None]
+        if not verified and not deactivated:
+            return
+        now = datetime.utcnow()
+        try:
+            async with AsyncSessionLocal() as session:
+                if verified:
+                    await session.execute(
+                        update(Proxy)
+                        .where(Proxy.id.in_([entry.id for entry in verified]))
+                        .values(is_verified=True, last_verified_at=now)
+                    )
+                if deactivated:
+                    await session.execute(
+                        update(Proxy)
+                        .where(Proxy.id.in_([entry.id for entry in deactivated]))
+                        .values(is_active=False, is_verified=False, last_verified_at=now)
+                    )
+                await session.commit()
+        except Exception as e:
+            logger.error(f"保存代理验证结果失败: {e}")
+
+    async def flush_stats(self):
+        """批量写回请求统计增量"""
+        rows = []
+        for entry in list(self.entries.values()) + list(self.quarantined.values()):
+            if entry.id is None or not entry.pending_total:
+                continue
+            rows.append({
+                'proxy_id': entry.id,
+                'd_total': entry.pending_total,
+                'd_success': entry.pending_success,
+                'rt': entry.response_time,
+                'used_at': entry.last_used_at,
+            })
+            entry.pending_total = 0
+            entry.pending_success = 0
+        if not rows:
+            return
+
+        table = Proxy.__table__
+        total = table.c.total_requests + bindparam('d_total')
+        success = table.c.success_requests + bindparam('d_success')
+        statement = (
+            table.update()
+            .where(table.c.id == bindparam('proxy_id'))
+            .values(
+                total_requests=total,
+                success_requests=success,
+                success_rate=success * 1.0 / total,
+                response_time=bindparam('rt'),
+                last_used_at=bindparam('used_at'),
+                updated_at=datetime.utcnow(),
+            )
+        )
+        try:
+            async with AsyncSessionLocal() as session:
+                await session.execute(statement, rows)
+                await session.commit()
+        except Exception as e:
+            logger.error(f"写回代理统计失败: {e}")
+
+    async def _run(self):
+        """后台维护：写回统计、验证隔离代理、定期重新加载"""
+        while True:
+            try:
+                await asyncio.sleep(settings.PROXY_FLUSH_INTERVAL)
+                await self.flush_stats()
+                await self.verify_quarantined()
+                if time.monotonic() - self._last_reload >= settings.PROXY_RELOAD_INTERVAL:
+                    await self.load()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"代理池维护失败: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取代理池状态"""
+        return {
+            'enabled': self.enabled,
+            'available': len(self.entries),
+            'quarantined': len(self.quarantined),
+            'proxies': [entry.stats() for entry in list(self.entries.values()) + list(self.quarantined.values())],
+        }
+
+    async def close(self):
+        """停止后台任务并写回剩余统计"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.enabled:
+            await self.flush_stats()
+
+
+# 全局代理池实例
+proxy_pool = ProxyPool()
@@ -4,8 +4,9 @@
 """
 import asyncio
 import logging
-from typing import Optional
-from mitmproxy import ctx
+import re
+from typing import Any, Awaitable, Callable, Dict, Optional
+from mitmproxy.net.encoding import decode
 from mitmproxy.options import Options
 from mitmproxy.proxy.config import ProxyConfig
 from mitmproxy.proxy.server import ProxyServer
@@ -13,6 +14,11 @@ from mitmproxy.tools.dump import DumpMaster
 
 logger = logging.getLogger(__name__)
 
+CaptureHandler = Callable[..., Awaitable[Any]]
+
+# 文章页中的公众号名称
+NICKNAME_PATTERN = re.compile(r'var nickname = (?:htmlDecode\()?"([^"]+)"')
+
 
 class ProxyService:
     """代理服务器服务类"""
@@ -22,7 +28,7 @@ class ProxyService:
         self.master: Optional[DumpMaster] = None
         self.is_running = False
     
-    async def start_proxy(self):
+    async def start_proxy(self, capture_handler: Optional[CaptureHandler] = None):
         """启动代理服务器"""
         try:
             opts = Options(listen_host='0.0.0.0', listen_port=self.port)
@@ -32,7 +38,7 @@ class ProxyService:
             self.master.server = ProxyServer(config)
             
             # 添加事件监听器
-            self.master.addons.add(WeChatAddon())
+            self.master.addons.add(WeChatAddon(capture_handler))
             
             logger.info(f"代理服务器启动在端口 {self.port}")
             self.is_running = True
@@ -57,33 +63,162 @@ class ProxyService:
 
 
 class WeChatAddon:
-    """微信爬虫代理插件"""
+    """微信爬虫代理插件
+
+    在响应钩子中识别历史消息翻页、文章页和阅读数据三类请求，
+    提取请求头、Cookie和URL参数，连同未解码的请求体和文章页放入异步队列；
+    解压、解码和匹配公众号名称都由后台协程在线程池中完成后再写入参数存储，
+    钩子本身不做任何IO和解码，不会阻塞mitmproxy的事件循环。
+    """
+    
+    def __init__(self, capture_handler: Optional[CaptureHandler] = None, queue_size: int = 1000):
+        self.capture_handler = capture_handler
+        self.queue_size = queue_size
+        self.queue: Optional[asyncio.Queue] = None
+        self._consumer: Optional[asyncio.Task] = None
+        self.captured = 0
+        self.dropped = 0
     
-    def __init__(self):
-        self.request_data = []
+    def running(self):
+        """代理启动后创建参数队列和消费协程"""
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self._consumer = asyncio.create_task(self._consume())
+    
+    async def done(self):
+        """代理关闭时停止消费协程"""
+        if self._consumer:
+            self._consumer.cancel()
+            try:
+                await self._consumer
+            except asyncio.CancelledError:
+                pass
+            self._consumer = None
     
     def request(self, flow):
         """处理请求"""
         # 过滤微信相关请求
         if 'mp.weixin.qq.com' in flow.request.pretty_host:
-            ctx.log.info(f"捕获微信请求: {flow.request.url}")
-            # 这里可以添加请求拦截和修改逻辑
+            logger.debug(f"捕获微信请求: {flow.request.url}")
     
     def response(self, flow):
         """处理响应"""
         # 过滤微信相关响应
-        if 'mp.weixin.qq.com' in flow.request.pretty_host:
-            ctx.log.info(f"捕获微信响应: {flow.request.url}")
-            # 这里可以添加响应拦截和修改逻辑
+        if 'mp.weixin.qq.com' not in flow.request.pretty_host:
+            return
+        
+        key = self._classify(flow)
+        if not key:
+            return
+        
+        capture = self._extract(flow, key)
+        if capture:
+            self._enqueue(capture)
+    
+    def _classify(self, flow) -> Optional[str]:
+        """识别请求类型"""
+        path = flow.request.path.split('?', 1)[0]
+        if path == '/mp/profile_ext' and flow.request.query.get('action') == 'getmsg':
+            return 'load_more'
+        if path == '/mp/getappmsgext':
+            return 'getappmsgext'
+        if path == '/s' or path.startswith('/s/'):
+            return 'content'
+        return None
+    
+    def _extract(self, flow, key: str) -> Optional[Dict[str, Any]]:
+        """提取请求参数"""
+        request = flow.request
+        cookies = dict(request.cookies)
+        params = dict(request.query)
+        wxuin = cookies.get('wxuin') or params.get('uin')
+        if not wxuin:
+            return None
+        
+        data = {
+            'url': request.url,
+            'requestOptions': {
+                'method': request.method,
+                'headers': dict(request.headers),
+                'cookies': cookies,
+                'params': params,
+            },
+        }
+        
+        # 原始报文留给消费协程解码，钩子中只取引用
+        body = None
+        if request.method == 'POST':
+            body = (request.raw_content, request.headers.get('content-encoding'))
+        page = None
+        if key == 'content' and flow.response is not None:
+            page = (flow.response.raw_content, flow.response.headers.get('content-encoding'))
+        
+        return {
+            'wxuin': wxuin,
+            'key': key,
+            'data': data,
+            'biz': params.get('__biz'),
+            'nickname': None,
+            'body': body,
+            'page': page,
+        }
+    
+    @staticmethod
+    def _decode_text(raw: Optional[bytes], encoding: Optional[str]) -> str:
+        """按 Content-Encoding 解压并解码为文本"""
+        if not raw:
+            return ''
+        if encoding:
+            try:
+                raw = decode(raw, encoding)
+            except Exception as e:
+                logger.warning(f"解压报文失败 {encoding}: {e}")
+                return ''
+        return raw.decode('utf-8', errors='replace')
+    
+    def _decode(self, capture: Dict[str, Any]) -> Dict[str, Any]:
+        """解码请求体并从文章页匹配公众号名称，在线程池中执行"""
+        body = capture.pop('body')
+        if body is not None:
+            capture['data']['requestOptions']['body'] = self._decode_text(*body)
+        page = capture.pop('page')
+        if page is not None:
+            match = NICKNAME_PATTERN.search(self._decode_text(*page))
+            if match:
+                capture['nickname'] = match.group(1)
+        return capture
+    
+    def _enqueue(self, capture: Dict[str, Any]):
+        """非阻塞入队，队列满时丢弃"""
+        if self.queue is None:
+            return
+        try:
+            self.queue.put_nowait(capture)
+            self.captured += 1
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning(f"参数队列已满，丢弃 {capture['key']} 请求参数")
+    
+    async def _consume(self):
+        """后台写入参数存储"""
+        while True:
+            capture = await self.queue.get()
+            try:
+                capture = await asyncio.to_thread(self._decode, capture)
+                if self.capture_handler:
+                    await self.capture_handler(**capture)
+            except Exception as e:
+                logger.error(f"保存抓包参数失败: {e}")
+            finally:
+                self.queue.task_done()
 
 
 # 全局代理服务实例
 proxy_service = ProxyService()
 
 
-async def start_proxy_server():
+async def start_proxy_server(capture_handler: Optional[CaptureHandler] = None):
     """启动代理服务器的异步函数"""
-    await proxy_service.start_proxy()
+    await proxy_service.start_proxy(capture_handler)
 
 
 def stop_proxy_server():
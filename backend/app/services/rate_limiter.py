@@ -0,0 +1,118 @@
+"""
+爬虫限速服务
+按 __biz 和 wxuin 维护令牌桶，遇到微信限流时自动降速并缓慢恢复
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, Optional
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """自适应令牌桶"""
+
+    def __init__(self, rate: float, capacity: float, min_rate: float):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.throttled_at = 0.0
+
+    def _refill(self, now: float):
+        """按当前速率补充令牌"""
+        elapsed = now - self.updated_at
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated_at = now
+
+    def reserve(self, now: float) -> float:
+        """预占一个令牌，返回需要等待的秒数"""
+        self._refill(now)
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+    def throttle(self, now: float, factor: float):
+        """遇到限流时按比例降速并清空令牌"""
+        self._refill(now)
+        self.rate = max(self.min_rate, self.rate * factor)
+        self.tokens = min(self.tokens, 0.0)
+        self.throttled_at = now
+
+    def recover(self, now: float, step: float, cooldown: float):
+        """冷却期过后线性恢复速率"""
+        if self.rate >= self.max_rate or now - self.throttled_at < cooldown:
+            return
+        self._refill(now)
+        self.rate = min(self.max_rate, self.rate + step)
+
+
+class RateLimiter:
+    """按公众号和微信账号限速"""
+
+    def __init__(self,
+                 rate: Optional[float] = None,
+                 burst: Optional[float] = None,
+                 min_rate: Optional[float] = None,
+                 decrease_factor: Optional[float] = None,
+                 recovery_step: Optional[float] = None,
+                 cooldown: Optional[float] = None):
+        delay = settings.CRAWLER_DELAY
+        self.rate = rate or (1.0 / delay if delay > 0 else float(settings.CRAWLER_RATE_BURST))
+        self.burst = burst or settings.CRAWLER_RATE_BURST
+        self.min_rate = min_rate or settings.CRAWLER_MIN_RATE
+        self.decrease_factor = decrease_factor or settings.CRAWLER_RATE_DECREASE
+        self.recovery_step = recovery_step or settings.CRAWLER_RATE_RECOVERY
+        self.cooldown = settings.CRAWLER_THROTTLE_COOLDOWN if cooldown is None else cooldown
+        self.buckets: Dict[str, TokenBucket] = {}
+
+    def _bucket(self, name: str) -> TokenBucket:
+        """获取或创建令牌桶"""
+        bucket = self.buckets.get(name)
+        if bucket is None:
+            bucket = TokenBucket(self.rate, self.burst, self.min_rate)
+            self.buckets[name] = bucket
+        return bucket
+
+    def _bucket_names(self, biz: Optional[str], wxuin: Optional[str]):
+        """请求涉及的令牌桶名称"""
+        names = []
+        if biz:
+            names.append(f"biz:{biz}")
+        if wxuin:
+            names.append(f"wxuin:{wxuin}")
+        return names
+
+    async def acquire(self, biz: Optional[str] = None, wxuin: Optional[str] = None):
+        """等待直到公众号和微信账号的令牌桶都允许发送请求"""
+        now = time.monotonic()
+        wait = 0.0
+        for name in self._bucket_names(biz, wxuin):
+            wait = max(wait, self._bucket(name).reserve(now))
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def report(self, biz: Optional[str] = None, wxuin: Optional[str] = None, throttled: bool = False):
+        """反馈请求结果，限流时降速，成功时缓慢恢复"""
+        now = time.monotonic()
+        for name in self._bucket_names(biz, wxuin):
+            bucket = self._bucket(name)
+            if throttled:
+                bucket.throttle(now, self.decrease_factor)
+                logger.warning(f"检测到微信限流，{name} 降速至 {bucket.rate:.3f} 次/秒")
+            else:
+                bucket.recover(now, self.recovery_step, self.cooldown)
+
+    def get_rates(self) -> Dict[str, float]:
+        """获取各令牌桶当前速率"""
+        return {name: bucket.rate for name, bucket in self.buckets.items()}
+
+
+# 全局限速器实例
+rate_limiter = RateLimiter()
@@ -0,0 +1,267 @@
+"""
+搜索后端基类
+定义搜索服务的统一接口，Elasticsearch和内存倒排索引两种实现共用
+"""
+import base64
+import hashlib
+import json
+import logging
+import uuid
+from abc import ABC, abstractmethod
+from typing import Dict, List, Any, Optional, Iterable, AsyncIterable, AsyncIterator, Tuple, Union, Callable, Awaitable
+from datetime import datetime
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.models.article import Article
+from app.models.wechat_account import WechatAccount
+from app.services.event_bus import event_bus
+from app.services.search_cache import SearchCache, make_key
+
+logger = logging.getLogger(__name__)
+
+# 摘要模式返回的字段，正文只通过高亮片段返回
+SUMMARY_FIELDS = ['title', 'digest', 'nickname', 'author', 'p_date', 'content_url']
+
+# 批量索引报告中保留的失败明细条数
+MAX_REPORTED_ERRORS = 100
+
+# 搜索缓存失效事件，经事件总线通知所有API进程
+SEARCH_CACHE_EVENT = 'search_cache_invalidate'
+
+# 待索引的 (公众号名称, 文章数据)
+IndexItem = Tuple[str, Dict[str, Any]]
+
+# 后台任务的进度回调 (已处理, 总数)
+ProgressCallback = Callable[[int, int], Awaitable[Any]]
+
+
+def encode_cursor(state: Dict[str, Any]) -> str:
+    """游标状态编码为不透明字符串"""
+    raw = json.dumps(state, separators=(',', ':'), default=str).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    """解析游标字符串"""
+    try:
+        state = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        if not isinstance(state, dict):
+            raise ValueError
+        return state
+    except Exception:
+        raise ValueError("无效的游标")
+
+
+def cursor_hash(search_data: str, gzhs: List[str], fields: List[str]) -> str:
+    """查询条件摘要，防止游标与其他查询混用"""
+    key = make_key(search_data, gzhs, fields)
+    return hashlib.sha1(repr(key).encode('utf-8')).hexdigest()[:16]
+
+
+async def aiter_items(items: Union[Iterable[IndexItem], AsyncIterable[IndexItem]]) -> AsyncIterator[IndexItem]:
+    """统一遍历同步和异步可迭代对象"""
+    if hasattr(items, '__aiter__'):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+
+class SearchBackend(ABC):
+    """搜索后端基类"""
+
+    # 是否支持在搜索引擎中执行聚合统计
+    supports_aggregations = False
+
+    def __init__(self):
+        self.index_name = settings.ELASTICSEARCH_INDEX
+        self.cache = SearchCache()
+        self.instance_id = uuid.uuid4().hex
+
+    async def invalidate_cache(self, nicknames: Optional[Iterable[str]] = None):
+        """使本进程的搜索缓存失效并通知其他进程，nicknames为None时清空缓存
+
+        必须在写入对搜索可见（refresh）之后调用，否则刷新窗口内的查询会把旧结果重新缓存。
+        """
+        nicknames = None if nicknames is None else sorted(set(nicknames))
+        self._apply_invalidation(nicknames)
+        await event_bus.publish(SEARCH_CACHE_EVENT, {'nicknames': nicknames, 'origin': self.instance_id})
+
+    async def on_cache_event(self, data: Dict[str, Any]):
+        """处理其他进程发出的缓存失效事件"""
+        if data.get('origin') != self.instance_id:
+            self._apply_invalidation(data.get('nicknames'))
+
+    def _apply_invalidation(self, nicknames: Optional[List[str]]):
+        if nicknames is None:
+            self.cache.clear()
+        else:
+            self.cache.invalidate(nicknames)
+
+    def _to_doc(self,
+                nickname: str,
+                article_data: Dict[str, Any],
+                indexed_at: Optional[datetime] = None) -> Dict[str, Any]:
+        """文章数据转换为索引文档"""
+        return {
+            'title': article_data.get('title', ''),
+            'digest': article_data.get('digest', ''),
+            'content': article_data.get('content', ''),
+            'author': article_data.get('author', ''),
+            'nickname': nickname,
+            'biz': article_data.get('biz'),
+            'p_date': article_data.get('p_date'),
+            'content_url': article_data.get('content_url', ''),
+            'read_num': article_data.get('read_num', 0),
+            'like_num': article_data.get('like_num', 0),
+            'comment_num': article_data.get('comment_num', 0),
+            'reward_num': article_data.get('reward_num', 0),
+            'position': article_data.get('position', article_data.get('mov', 0)),
+            'indexed_at': indexed_at or datetime.now()
+        }
+
+    async def ensure_index(self) -> bool:
+        """创建文章索引"""
+        return True
+
+    async def create_index(self, nickname: str) -> bool:
+        """为公众号准备索引，所有公众号共用同一个索引"""
+        return await self.ensure_index()
+
+    @abstractmethod
+    async def index_article(self, nickname: str, article_data: Dict[str, Any]) -> bool:
+        """索引文章数据"""
+
+    @abstractmethod
+    async def bulk_index(self,
+                         items: Union[Iterable[IndexItem], AsyncIterable[IndexItem]],
+                         **kwargs) -> Dict[str, Any]:
+        """批量索引 (公众号名称, 文章数据)，返回成功、失败数量和失败明细"""
+
+    async def bulk_index_articles(self,
+                                  nickname: str,
+                                  articles: Union[Iterable[Dict[str, Any]], AsyncIterable[Dict[str, Any]]],
+                                  **kwargs) -> Dict[str, Any]:
+        """批量索引单个公众号的文章"""
+        async def items():
+            async for article in aiter_items(articles):
+                yield nickname, article
+
+        return await self.bulk_index(items(), **kwargs)
+
+    async def reindex_articles(self,
+                               db: AsyncSession,
+                               nickname: Optional[str] = None,
+                               on_progress: Optional[ProgressCallback] = None,
+                               **kwargs) -> Dict[str, Any]:
+        """从数据库流式读取文章并重建索引，on_progress 接收 (已读取, 总数)"""
+        query = (
+            select(
+                WechatAccount.nickname,
+                Article.title,
+                Article.author,
+                Article.digest,
+                Article.content,
+                Article.url,
+                Article.biz,
+                Article.publish_time,
+                Article.read_num,
+                Article.like_num,
+                Article.comment_num,
+                Article.reward_num,
+                Article.position,
+            )
+            .join(WechatAccount, Article.account_id == WechatAccount.id)
+            .where(Article.is_deleted.is_(False))
+        )
+        if nickname:
+            query = query.where(WechatAccount.nickname == nickname)
+        total = 0
+        if on_progress is not None:
+            total = await db.scalar(select(func.count()).select_from(query.subquery())) or 0
+            await on_progress(0, total)
+
+        async def items():
+            processed = 0
+            result = await db.stream(query.execution_options(yield_per=settings.EXPORT_BATCH_SIZE))
+            async for row in result:
+                processed += 1
+                if on_progress is not None:
+                    await on_progress(processed, total)
+                yield row.nickname, {
+                    'title': row.title,
+                    'author': row.author,
+                    'digest': row.digest,
+                    'content': row.content,
+                    'content_url': row.url,
+                    'biz': row.biz,
+                    'p_date': row.publish_time,
+                    'read_num': row.read_num,
+                    'like_num': row.like_num,
+                    'comment_num': row.comment_num,
+                    'reward_num': row.reward_num,
+                    'position': row.position,
+                }
+
+        if not await self.ensure_index():
+            return {'indexed': 0, 'failed': 0, 'errors': [], 'error': '创建索引失败'}
+        return await self.bulk_index(items(), **kwargs)
+
+    def _source_filter(self,
+                       source_includes: Optional[List[str]],
+                       source_excludes: Optional[List[str]],
+                       summary: bool) -> Any:
+        """构建 _source 过滤参数"""
+        if summary:
+            return {"includes": SUMMARY_FIELDS}
+        if not source_includes and not source_excludes:
+            return True
+        source = {}
+        if source_includes:
+            source["includes"] = source_includes
+        if source_excludes:
+            source["excludes"] = source_excludes
+        return source
+
+    @abstractmethod
+    async def search_articles(self,
+                              search_data: str,
+                              gzhs: List[str] = None,
+                              fields: List[str] = None,
+                              _from: int = 0,
+                              _size: int = 10,
+                              cursor: Optional[str] = None,
+                              use_cursor: bool = False,
+                              source_includes: Optional[List[str]] = None,
+                              source_excludes: Optional[List[str]] = None,
+                              summary: bool = False) -> Dict[str, Any]:
+        """搜索文章"""
+
+    async def aggregate(self,
+                        query: Dict[str, Any],
+                        gzhs: Optional[List[str]],
+                        aggs: Dict[str, Any]) -> Dict[str, Any]:
+        """执行聚合查询，返回命中总数 total、耗时 took 和聚合结果 aggregations
+
+        只有 supports_aggregations 为真的后端需要实现，其余后端由调用方改用PostgreSQL聚合。
+        """
+        raise NotImplementedError("当前搜索后端不支持聚合")
+
+    @abstractmethod
+    async def get_index_info(self) -> List[Dict[str, Any]]:
+        """获取各公众号的索引文档数量"""
+
+    @abstractmethod
+    async def delete_index(self, nickname: str) -> bool:
+        """删除公众号的全部索引文档"""
+
+    async def migrate_legacy_indices(self,
+                                     delete_source: bool = False,
+                                     on_progress: Optional[ProgressCallback] = None) -> List[Dict[str, Any]]:
+        """迁移旧版索引，只有Elasticsearch后端需要；on_progress 接收 (已迁移索引数, 索引总数)"""
+        return []
+
+    async def close(self):
+        """释放资源"""
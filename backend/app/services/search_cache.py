@@ -0,0 +1,115 @@
+"""
+搜索结果缓存
+进程内LRU+TTL缓存，按公众号标记缓存项，索引写入时按公众号失效
+"""
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional, Iterable, Tuple, Set
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 搜索全部公众号的缓存项使用的标记，任何公众号写入都会使其失效
+ALL_ACCOUNTS = '*'
+
+CacheKey = Tuple[Any, ...]
+
+
+def make_key(search_data: str,
+             gzhs: Optional[List[str]],
+             fields: Optional[List[str]],
+             *args) -> CacheKey:
+    """规范化查询参数作为缓存键"""
+    text = ' '.join((search_data or '').split())
+    accounts = tuple(sorted(set(gzhs))) if gzhs and gzhs != ['全部'] else ()
+    columns = tuple(sorted(set(fields))) if fields and '全部' not in fields else ()
+    return (text, accounts, columns) + args
+
+
+class SearchCache:
+    """搜索结果缓存类"""
+
+    def __init__(self, max_size: Optional[int] = None, ttl: Optional[float] = None):
+        self.max_size = settings.SEARCH_CACHE_SIZE if max_size is None else max_size
+        self.ttl = settings.SEARCH_CACHE_TTL if ttl is None else ttl
+        self.entries: "OrderedDict[CacheKey, Tuple[float, Tuple[str, ...], Dict[str, Any]]]" = OrderedDict()
+        self.tags: Dict[str, Set[CacheKey]] = {}
+        # 每次失效递增，查询开始前记录版本，期间发生写入则不缓存结果
+        self.version = 0
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0 and self.ttl > 0
+
+    def get(self, key: CacheKey) -> Optional[Dict[str, Any]]:
+        """读取缓存，过期返回None"""
+        entry = self.entries.get(key)
+        if entry is None:
+            self.stats['misses'] += 1
+            return None
+        expires_at, _, value = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self.stats['expirations'] += 1
+            self.stats['misses'] += 1
+            return None
+        self.entries.move_to_end(key)
+        self.stats['hits'] += 1
+        return value
+
+    def put(self, key: CacheKey, value: Dict[str, Any], accounts: Iterable[str], version: int):
+        """写入缓存，version与当前版本不一致时丢弃"""
+        if not self.enabled or version != self.version:
+            return
+        if key in self.entries:
+            self._remove(key)
+        tags = tuple(accounts) or (ALL_ACCOUNTS,)
+        self.entries[key] = (time.monotonic() + self.ttl, tags, value)
+        for tag in tags:
+            self.tags.setdefault(tag, set()).add(key)
+        while len(self.entries) > self.max_size:
+            oldest = next(iter(self.entries))
+            self._remove(oldest)
+            self.stats['evictions'] += 1
+
+    def invalidate(self, nicknames: Iterable[str]):
+        """使涉及指定公众号的缓存失效"""
+        self.version += 1
+        keys: Set[CacheKey] = set(self.tags.get(ALL_ACCOUNTS, ()))
+        for nickname in nicknames:
+            keys.update(self.tags.get(nickname, ()))
+        for key in keys:
+            self._remove(key)
+        self.stats['invalidations'] += len(keys)
+
+    def clear(self):
+        """清空缓存"""
+        self.version += 1
+        self.stats['invalidations'] += len(self.entries)
+        self.entries.clear()
+        self.tags.clear()
+        logger.info("清空搜索缓存")
+
+    def _remove(self, key: CacheKey):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[1]:
+            keys = self.tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.tags[tag]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存命中统计"""
+        lookups = self.stats['hits'] + self.stats['misses']
+        return {
+            **self.stats,
+            'size': len(self.entries),
+            'max_size': self.max_size,
+            'ttl': self.ttl,
+            'hit_rate': round(self.stats['hits'] / lookups, 4) if lookups else 0.0
+        }
@@ -1,251 +1,593 @@
 """
 搜索服务
 集成Elasticsearch提供全文搜索功能
+
+所有公众号的文章写入同一个索引，以公众号名称作为路由键，
+单个公众号的文档集中在同一分片上，按公众号搜索时只访问对应分片。
 """
+import asyncio
 import logging
-from typing import Dict, List, Any, Optional
-from elasticsearch import Elasticsearch, NotFoundError
+from typing import Dict, List, Any, Optional, Iterable, AsyncIterable, Union
+from elasticsearch import AsyncElasticsearch, NotFoundError
 from elasticsearch.exceptions import RequestError
+from elasticsearch.helpers import async_streaming_bulk
 from datetime import datetime
+from app.core.config import settings
+from app.services.search_backend import (
+    SearchBackend, IndexItem, ProgressCallback, MAX_REPORTED_ERRORS, aiter_items,
+    cursor_hash, decode_cursor, encode_cursor
+)
+from app.services.search_cache import make_key
 
 logger = logging.getLogger(__name__)
 
+# 文章索引映射
+ARTICLE_MAPPINGS = {
+    "properties": {
+        "title": {
+            "type": "text",
+            "analyzer": "ik_max_word",
+            "search_analyzer": "ik_smart"
+        },
+        "digest": {
+            "type": "text",
+            "analyzer": "ik_max_word",
+            "search_analyzer": "ik_smart"
+        },
+        "content": {
+            "type": "text",
+            "analyzer": "ik_max_word",
+            "search_analyzer": "ik_smart",
+            # 保存词项位置和偏移，长正文使用fvh高亮时无需重新分析
+            "term_vector": "with_positions_offsets"
+        },
+        "author": {
+            "type": "keyword"
+        },
+        "nickname": {
+            "type": "keyword"
+        },
+        "biz": {
+            "type": "keyword"
+        },
+        "p_date": {
+            "type": "date"
+        },
+        "content_url": {
+            "type": "keyword"
+        },
+        "read_num": {
+            "type": "integer"
+        },
+        "like_num": {
+            "type": "integer"
+        },
+        "comment_num": {
+            "type": "integer"
+        },
+        "reward_num": {
+            "type": "integer"
+        },
+        "position": {
+            "type": "integer"
+        },
+        "indexed_at": {
+            "type": "date"
+        }
+    }
+}
+
+# 公众号聚合的最大桶数
+MAX_ACCOUNT_BUCKETS = 10000
 
-class SearchService:
-    """搜索服务类"""
+class SearchService(SearchBackend):
+    """Elasticsearch搜索服务类"""
+    
+    supports_aggregations = True
+    
+    def __init__(self, es_url: Optional[str] = None):
+        super().__init__()
+        # 客户端内部维护到各节点的连接池，并发请求共享连接
+        self.es = AsyncElasticsearch(
+            es_url or settings.ELASTICSEARCH_URL,
+            connections_per_node=settings.ELASTICSEARCH_POOL_SIZE,
+            request_timeout=settings.ELASTICSEARCH_TIMEOUT
+        )
+        # 旧版按公众号建立的索引前缀，仅用于迁移
+        self.legacy_prefix = "gzh_"
+        # 正文字段是否带有term_vector，首次搜索时检查映射
+        self._content_has_term_vector: Optional[bool] = None
     
-    def __init__(self, es_host: str = "localhost", es_port: int = 9200):
-        self.es = Elasticsearch([{'host': es_host, 'port': es_port, 'scheme': 'http'}])
-        self.index_prefix = "gzh_"
+    def _routing(self, gzhs: Optional[List[str]]) -> Optional[str]:
+        """按公众号名称生成查询路由值
+        
+        查询时路由值按逗号拆分，名称中含逗号时无法表示，此时不指定路由、查询全部分片，
+        结果仍由 nickname 过滤条件限定。写入文档的路由不拆分，仍直接使用公众号名称。
+        """
+        if not gzhs or any(',' in nickname for nickname in gzhs):
+            return None
+        return ','.join(gzhs)
     
-    def create_index(self, nickname: str) -> bool:
-        """为公众号创建索引"""
+    async def ensure_index(self) -> bool:
+        """创建共享文章索引"""
         try:
-            index_name = f"{self.index_prefix}{nickname}"
-            if not self.es.indices.exists(index=index_name):
-                # 创建索引映射
-                mappings = {
-                    "properties": {
-                        "title": {
-                            "type": "text",
-                            "analyzer": "ik_max_word",
-                            "search_analyzer": "ik_smart"
-                        },
-                        "digest": {
-                            "type": "text",
-                            "analyzer": "ik_max_word",
-                            "search_analyzer": "ik_smart"
-                        },
-                        "content": {
-                            "type": "text",
-                            "analyzer": "ik_max_word",
-                            "search_analyzer": "ik_smart"
-                        },
-                        "author": {
-                            "type": "keyword"
-                        },
-                        "nickname": {
-                            "type": "keyword"
-                        },
-                        "p_date": {
-                            "type": "date"
-                        },
-                        "content_url": {
-                            "type": "keyword"
-                        },
-                        "read_num": {
-                            "type": "integer"
-                        },
-                        "like_num": {
-                            "type": "integer"
-                        },
-                        "comment_num": {
-                            "type": "integer"
-                        },
-                        "reward_num": {
-                            "type": "integer"
-                        }
+            if not await self.es.indices.exists(index=self.index_name):
+                await self.es.indices.create(
+                    index=self.index_name,
+                    mappings=ARTICLE_MAPPINGS,
+                    settings={
+                        "number_of_shards": settings.ELASTICSEARCH_SHARDS,
+                        "number_of_replicas": settings.ELASTICSEARCH_REPLICAS
                     }
-                }
-                self.es.indices.create(index=index_name, mappings=mappings)
-                logger.info(f"创建索引: {index_name}")
-                return True
+                )
+                logger.info(f"创建索引: {self.index_name}")
+                self._content_has_term_vector = True
             return True
+        except RequestError as e:
+            # 并发创建时索引可能已存在
+            if e.error == 'resource_already_exists_exception':
+                return True
+            logger.error(f"创建索引失败: {e}")
+            return False
         except Exception as e:
             logger.error(f"创建索引失败: {e}")
             return False
     
-    def index_article(self, nickname: str, article_data: Dict[str, Any]) -> bool:
+    async def index_article(self, nickname: str, article_data: Dict[str, Any]) -> bool:
         """索引文章数据"""
         try:
-            index_name = f"{self.index_prefix}{nickname}"
             doc_id = article_data.get('content_url', '')
-            doc = {
-                'title': article_data.get('title', ''),
-                'digest': article_data.get('digest', ''),
-                'content': article_data.get('content', ''),
-                'author': article_data.get('author', ''),
-                'nickname': nickname,
-                'p_date': article_data.get('p_date'),
-                'content_url': article_data.get('content_url', ''),
-                'read_num': article_data.get('read_num', 0),
-                'like_num': article_data.get('like_num', 0),
-                'comment_num': article_data.get('comment_num', 0),
-                'reward_num': article_data.get('reward_num', 0),
-                'indexed_at': datetime.now()
-            }
-            self.es.index(index=index_name, id=doc_id, document=doc)
+            await self.es.index(
+                index=self.index_name,
+                id=doc_id,
+                routing=nickname,
+                document=self._to_doc(nickname, article_data),
+                refresh="wait_for"
+            )
+            await self.invalidate_cache([nickname])
             return True
         except Exception as e:
             logger.error(f"索引文章失败: {e}")
             return False
     
-    def search_articles(self, 
-                       search_data: str, 
-                       gzhs: List[str] = None, 
-                       fields: List[str] = None,
-                       _from: int = 0, 
-                       _size: int = 10) -> Dict[str, Any]:
-        """搜索文章"""
-        try:
-            if gzhs is None:
-                gzhs = []
-            if fields is None:
-                fields = []
-            if gzhs and gzhs != ['全部']:
-                indices = [f"{self.index_prefix}{gzh}" for gzh in gzhs]
-            else:
-                indices = f"{self.index_prefix}*"
-            if not fields or '全部' in fields:
-                fields = ['title', 'digest', 'content']
-            should_clauses = []
-            for field in fields:
-                should_clauses.append({
-                    "match": {
-                        field: {
-                            "query": search_data,
-                            "boost": 2.0 if field == 'title' else 1.0
-                        }
+    async def _content_highlighter(self) -> str:
+        """正文高亮器类型，旧索引没有term_vector时退回unified"""
+        if self._content_has_term_vector is None:
+            try:
+                mapping = await self.es.indices.get_mapping(index=self.index_name)
+                properties = next(iter(mapping.values()))['mappings'].get('properties', {})
+                self._content_has_term_vector = properties.get('content', {}).get('term_vector') == 'with_positions_offsets'
+                if not self._content_has_term_vector:
+                    logger.warning(f"索引 {self.index_name} 的正文未保存term_vector，重建索引后可使用fvh高亮")
+            except NotFoundError:
+                return 'unified'
+            except Exception as e:
+                logger.error(f"获取索引映射失败: {e}")
+                return 'unified'
+        return 'fvh' if self._content_has_term_vector else 'unified'
+    
+    def _build_search(self,
+                      search_data: str,
+                      gzhs: List[str],
+                      fields: List[str],
+                      source: Any = True,
+                      summary: bool = False,
+                      highlighter: str = 'unified') -> Dict[str, Any]:
+        """构建查询、高亮和排序参数"""
+        if not fields or '全部' in fields:
+            fields = ['title', 'digest', 'content']
+        should_clauses = []
+        for field in fields:
+            should_clauses.append({
+                "match": {
+                    field: {
+                        "query": search_data,
+                        "boost": 2.0 if field == 'title' else 1.0
                     }
-                })
-            query = {
-                "bool": {
-                    "should": should_clauses,
-                    "minimum_should_match": 1
                 }
+            })
+        query = {
+            "bool": {
+                "should": should_clauses,
+                "minimum_should_match": 1
             }
-            response = self.es.search(
-                index=indices,
-                query=query,
-                highlight={
-                    "fields": {
-                        "title": {},
-                        "digest": {},
-                        "content": {"fragment_size": 200}
+        }
+        if gzhs:
+            # 路由只决定访问哪些分片，同一分片上还有其他公众号的文档，需要再按名称过滤
+            query["bool"]["filter"] = [{"terms": {"nickname": gzhs}}]
+        return {
+            "query": query,
+            "source": source,
+            "highlight": {
+                "fields": {
+                    "title": {"number_of_fragments": 0},
+                    "digest": {"number_of_fragments": 0},
+                    "content": {
+                        "type": highlighter,
+                        "fragment_size": 150 if summary else 200,
+                        "number_of_fragments": 3,
+                        "no_match_size": 150 if summary else 0
                     }
-                },
-                sort=[
-                    {"_score": {"order": "desc"}},
-                    {"p_date": {"order": "desc"}}
-                ],
+                }
+            },
+            "sort": [
+                {"_score": {"order": "desc"}},
+                {"p_date": {"order": "desc", "missing": "_last"}}
+            ]
+        }
+    
+    def _format_hits(self, response: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """搜索结果转换为文章列表"""
+        results = []
+        for hit in response['hits']['hits']:
+            result = hit['_source']
+            result['score'] = hit['_score']
+            result['highlights'] = hit.get('highlight', {})
+            results.append(result)
+        return results
+    
+    async def search_articles(self,
+                              search_data: str,
+                              gzhs: List[str] = None,
+                              fields: List[str] = None,
+                              _from: int = 0,
+                              _size: int = 10,
+                              cursor: Optional[str] = None,
+                              use_cursor: bool = False,
+                              source_includes: Optional[List[str]] = None,
+                              source_excludes: Optional[List[str]] = None,
+                              summary: bool = False) -> Dict[str, Any]:
+        """搜索文章，相同查询优先从缓存返回
+        
+        use_cursor 或 cursor 不为空时使用游标分页，返回 next_cursor 用于获取下一页。
+        summary 为真时只返回标题、摘要等字段和正文高亮片段，不返回正文。
+        """
+        if gzhs is None or gzhs == ['全部']:
+            gzhs = []
+        if fields is None:
+            fields = []
+        source = self._source_filter(source_includes, source_excludes, summary)
+        if cursor or use_cursor:
+            return await self._search_with_cursor(search_data, gzhs, fields, _size, cursor, source, summary)
+        
+        key = make_key(
+            search_data, gzhs, fields, _from, _size,
+            tuple(source_includes or ()), tuple(source_excludes or ()), summary
+        )
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        version = self.cache.version
+        try:
+            response = await self.es.search(
+                index=self.index_name,
+                routing=self._routing(gzhs),
                 from_=_from,
-                size=_size
+                size=_size,
+                **self._build_search(
+                    search_data, gzhs, fields, source, summary,
+                    await self._content_highlighter()
+                )
             )
-            results = []
-            for hit in response['hits']['hits']:
-                result = hit['_source']
-                result['score'] = hit['_score']
-                result['highlights'] = hit.get('highlight', {})
-                results.append(result)
-            return {
+            result = {
                 'total': response['hits']['total']['value'],
-                'results': results,
+                'results': self._format_hits(response),
                 'took': response['took']
             }
+            self.cache.put(key, result, gzhs, version)
+            return result
+        except NotFoundError:
+            return {'total': 0, 'results': [], 'took': 0}
         except Exception as e:
             logger.error(f"搜索失败: {e}")
             return {'total': 0, 'results': [], 'error': str(e)}
     
-    def get_index_info(self) -> List[Dict[str, Any]]:
-        """获取所有索引信息"""
+    async def _search_with_cursor(self,
+                                  search_data: str,
+                                  gzhs: List[str],
+                                  fields: List[str],
+                                  size: int,
+                                  cursor: Optional[str],
+                                  source: Any = True,
+                                  summary: bool = False) -> Dict[str, Any]:
+        """基于 point-in-time 和 search_after 的游标分页
+        
+        第一页打开PIT，之后每页从游标中取出PIT和上一页最后一条的排序值继续查询，
+        任意页的开销与第一页相同。排序末尾追加 _shard_doc 保证排序值唯一。
+        """
+        query_hash = cursor_hash(search_data, gzhs, fields)
+        if cursor:
+            state = decode_cursor(cursor)
+            if 'pit' not in state or state.get('q') != query_hash:
+                raise ValueError("游标与查询条件不匹配")
+            pit_id, search_after = state['pit'], state['after']
+        else:
+            try:
+                opened = await self.es.open_point_in_time(
+                    index=self.index_name,
+                    keep_alive=settings.SEARCH_PIT_KEEP_ALIVE,
+                    routing=self._routing(gzhs)
+                )
+            except NotFoundError:
+                return {'total': 0, 'results': [], 'took': 0, 'next_cursor': None}
+            pit_id, search_after = opened['id'], None
+        
         try:
-            indices = self.es.indices.get(index=f"{self.index_prefix}*")
-            index_info = []
-            
-            for index_name, index_data in indices.items():
-                nickname = index_name.replace(self.index_prefix, '')
-                doc_count = index_data['mappings'].get('_doc', {}).get('properties', {})
-                
-                # 获取文档数量
-                try:
-                    count_response = self.es.count(index=index_name)
-                    doc_count = count_response['count']
-                except:
-                    doc_count = 0
-                
-                index_info.append({
-                    'nickname': nickname,
-                    'doc_count': doc_count,
-                    'index_name': index_name
-                })
-            
-            return index_info
+            body = self._build_search(
+                search_data, gzhs, fields, source, summary,
+                await self._content_highlighter()
+            )
+            body['sort'].append({"_shard_doc": "asc"})
+            response = await self.es.search(
+                pit={"id": pit_id, "keep_alive": settings.SEARCH_PIT_KEEP_ALIVE},
+                search_after=search_after,
+                size=size,
+                # 只在第一页精确统计总数
+                track_total_hits=search_after is None,
+                **body
+            )
+        except NotFoundError:
+            raise ValueError("游标已过期，请重新搜索")
+        except Exception as e:
+            logger.error(f"搜索失败: {e}")
+            return {'total': 0, 'results': [], 'error': str(e), 'next_cursor': None}
+        
+        hits = response['hits']['hits']
+        pit_id = response.get('pit_id', pit_id)
+        total = state['total'] if cursor else response['hits']['total']['value']
+        next_cursor = None
+        if len(hits) == size:
+            next_cursor = encode_cursor({
+                'pit': pit_id,
+                'after': hits[-1]['sort'],
+                'q': query_hash,
+                'total': total
+            })
+        else:
+            await self._close_pit(pit_id)
+        
+        return {
+            'total': total,
+            'results': self._format_hits(response),
+            'took': response['took'],
+            'next_cursor': next_cursor
+        }
+    
+    async def _close_pit(self, pit_id: str):
+        """关闭point-in-time"""
+        try:
+            await self.es.close_point_in_time(id=pit_id)
+        except Exception as e:
+            logger.warning(f"关闭PIT失败: {e}")
+    
+    async def aggregate(self,
+                        query: Dict[str, Any],
+                        gzhs: Optional[List[str]],
+                        aggs: Dict[str, Any]) -> Dict[str, Any]:
+        """在共享索引中执行聚合查询，按公众号路由"""
+        response = await self.es.search(
+            index=self.index_name,
+            routing=self._routing(gzhs),
+            query=query,
+            aggs=aggs,
+            size=0,
+            track_total_hits=True
+        )
+        return {
+            'total': response['hits']['total']['value'],
+            'took': response['took'],
+            'aggregations': response.get('aggregations', {}),
+        }
+    
+    async def get_index_info(self) -> List[Dict[str, Any]]:
+        """获取各公众号的索引文档数量"""
+        try:
+            response = await self.es.search(
+                index=self.index_name,
+                size=0,
+                aggs={
+                    "accounts": {
+                        "terms": {"field": "nickname", "size": MAX_ACCOUNT_BUCKETS}
+                    }
+                }
+            )
+            return [
+                {
+                    'nickname': bucket['key'],
+                    'doc_count': bucket['doc_count'],
+                    'index_name': self.index_name
+                }
+                for bucket in response['aggregations']['accounts']['buckets']
+            ]
+        except NotFoundError:
+            return []
         except Exception as e:
             logger.error(f"获取索引信息失败: {e}")
             return []
     
-    def delete_index(self, nickname: str) -> bool:
-        """删除索引"""
+    async def delete_index(self, nickname: str) -> bool:
+        """删除公众号的全部索引文档"""
         try:
-            index_name = f"{self.index_prefix}{nickname}"
-            if self.es.indices.exists(index=index_name):
-                self.es.indices.delete(index=index_name)
-                logger.info(f"删除索引: {index_name}")
-                return True
+            response = await self.es.delete_by_query(
+                index=self.index_name,
+                routing=self._routing([nickname]),
+                query={"term": {"nickname": nickname}},
+                conflicts="proceed",
+                refresh=True
+            )
+            deleted = response.get('deleted', 0)
+            await self.invalidate_cache([nickname])
+            if deleted:
+                logger.info(f"删除公众号 {nickname} 的索引文档 {deleted} 篇")
+            return deleted > 0
+        except NotFoundError:
             return False
         except Exception as e:
             logger.error(f"删除索引失败: {e}")
             return False
     
-    def bulk_index_articles(self, nickname: str, articles: List[Dict[str, Any]]) -> bool:
-        """批量索引文章"""
+    async def bulk_index(self,
+                         items: Union[Iterable[IndexItem], AsyncIterable[IndexItem]],
+                         chunk_size: Optional[int] = None,
+                         max_chunk_bytes: Optional[int] = None,
+                         workers: Optional[int] = None,
+                         **kwargs) -> Dict[str, Any]:
+        """流式批量索引
+        
+        items 可以是生成器或异步生成器，逐条产出 (公众号名称, 文章数据)。
+        生产者把文档放入有界队列，多个工作协程各自用 async_streaming_bulk
+        按 chunk_size / max_chunk_bytes 切块提交，队列满时生产者等待，内存占用与总量无关。
+        429 由 async_streaming_bulk 按指数退避重试，最终失败的文档记入报告。
+        """
+        chunk_size = chunk_size or settings.ELASTICSEARCH_BULK_CHUNK_SIZE
+        max_chunk_bytes = max_chunk_bytes or settings.ELASTICSEARCH_BULK_MAX_BYTES
+        workers = workers or settings.ELASTICSEARCH_BULK_WORKERS
+        indexed_at = datetime.now()
+        report = {'indexed': 0, 'failed': 0, 'errors': []}
+        queue: asyncio.Queue = asyncio.Queue(maxsize=chunk_size * workers)
+        nicknames = set()
+        
+        async def produce():
+            async for nickname, article in aiter_items(items):
+                nicknames.add(nickname)
+                await queue.put({
+                    "_index": self.index_name,
+                    "_id": article.get('content_url', ''),
+                    "_routing": nickname,
+                    "_source": self._to_doc(nickname, article, indexed_at)
+                })
+            # 只在正常结束时发送结束标记；生产者出错或被取消时不能再等待队列，
+            # 工作协程可能已经退出，没有人消费队列
+            for _ in range(workers):
+                await queue.put(None)
+        
+        async def actions():
+            while True:
+                action = await queue.get()
+                if action is None:
+                    return
+                yield action
+        
+        async def consume():
+            async for ok, item in async_streaming_bulk(
+                self.es,
+                actions(),
+                chunk_size=chunk_size,
+                max_chunk_bytes=max_chunk_bytes,
+                max_retries=settings.ELASTICSEARCH_BULK_MAX_RETRIES,
+                initial_backoff=settings.ELASTICSEARCH_BULK_INITIAL_BACKOFF,
+                max_backoff=settings.ELASTICSEARCH_BULK_MAX_BACKOFF,
+                raise_on_error=False,
+                raise_on_exception=False
+            ):
+                if ok:
+                    report['indexed'] += 1
+                    continue
+                report['failed'] += 1
+                if len(report['errors']) < MAX_REPORTED_ERRORS:
+                    info = next(iter(item.values()), {})
+                    report['errors'].append({
+                        'id': info.get('_id'),
+                        'status': info.get('status'),
+                        'error': info.get('error') or info.get('exception')
+                    })
+        
+        producer = asyncio.create_task(produce())
+        tasks = [producer] + [asyncio.create_task(consume()) for _ in range(workers)]
         try:
-            index_name = f"{self.index_prefix}{nickname}"
-            actions = []
-            
-            for article in articles:
-                doc_id = article.get('content_url', '')
-                action = {
-                    "_index": index_name,
-                    "_id": doc_id,
-                    "_source": {
-                        'title': article.get('title', ''),
-                        'digest': article.get('digest', ''),
-                        'content': article.get('content', ''),
-                        'author': article.get('author', ''),
-                        'nickname': nickname,
-                        'p_date': article.get('p_date'),
-                        'content_url': article.get('content_url', ''),
-                        'read_num': article.get('read_num', 0),
-                        'like_num': article.get('like_num', 0),
-                        'comment_num': article.get('comment_num', 0),
-                        'reward_num': article.get('reward_num', 0),
-                        'indexed_at': datetime.now()
-                    }
-                }
-                actions.append(action)
-            
-            if actions:
-                from elasticsearch.helpers import bulk
-                bulk(self.es, actions)
-                logger.info(f"批量索引 {len(actions)} 篇文章到 {index_name}")
-                return True
-            
-            return False
+            await asyncio.gather(*tasks)
         except Exception as e:
-            logger.error(f"批量索引失败: {e}")
-            return False
+            logger.error(f"批量索引中断: {e}")
+            report['error'] = str(e)
+        finally:
+            # 任一协程失败时先取消生产者，避免它阻塞在已满的队列上
+            producer.cancel()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if nicknames:
+                # 刷新后再失效缓存，避免刷新窗口内的查询把旧结果重新缓存
+                try:
+                    await self.es.indices.refresh(index=self.index_name)
+                except Exception as e:
+                    logger.error(f"刷新索引失败: {e}")
+                await self.invalidate_cache(nicknames)
+        
+        logger.info(f"批量索引完成: 成功 {report['indexed']} 篇，失败 {report['failed']} 篇")
+        return report
+    
+    async def list_legacy_indices(self) -> List[str]:
+        """列出旧版按公众号建立的索引"""
+        try:
+            indices = await self.es.indices.get(index=f"{self.legacy_prefix}*")
+            return sorted(indices.keys())
+        except NotFoundError:
+            return []
+        except Exception as e:
+            logger.error(f"获取旧版索引失败: {e}")
+            return []
+    
+    async def migrate_legacy_indices(self,
+                                     delete_source: bool = False,
+                                     on_progress: Optional[ProgressCallback] = None) -> List[Dict[str, Any]]:
+        """将旧版 gzh_* 索引重建到共享索引中
+        
+        每个旧索引对应一个公众号，通过 _reindex 写入共享索引并以公众号名称作为路由，
+        文档ID沿用原来的文章链接，重复执行不会产生重复文档。
+        """
+        if not await self.ensure_index():
+            return []
+        
+        report = []
+        legacy_indices = await self.list_legacy_indices()
+        if on_progress is not None:
+            await on_progress(0, len(legacy_indices))
+        for index_name in legacy_indices:
+            nickname = index_name[len(self.legacy_prefix):]
+            item = {'index_name': index_name, 'nickname': nickname, 'migrated': 0, 'deleted': False}
+            try:
+                response = await self.es.reindex(
+                    source={"index": index_name},
+                    dest={"index": self.index_name, "routing": f"={nickname}"},
+                    script={
+                        "source": "ctx._source.nickname = params.nickname",
+                        "params": {"nickname": nickname}
+                    },
+                    conflicts="proceed",
+                    wait_for_completion=True,
+                    refresh=True
+                )
+                item['migrated'] = response.get('created', 0) + response.get('updated', 0)
+                await self.invalidate_cache([nickname])
+                failures = response.get('failures') or []
+                if failures:
+                    item['error'] = f"{len(failures)} 篇文档迁移失败"
+                elif delete_source:
+                    await self.es.indices.delete(index=index_name)
+                    item['deleted'] = True
+                logger.info(f"迁移索引 {index_name}: {item['migrated']} 篇")
+            except Exception as e:
+                item['error'] = str(e)
+                logger.error(f"迁移索引失败 {index_name}: {e}")
+            report.append(item)
+            if on_progress is not None:
+                await on_progress(len(report), len(legacy_indices))
+        
+        return report
+    
+    async def close(self):
+        """关闭Elasticsearch连接"""
+        await self.es.close()
+
+
+def create_search_service() -> SearchBackend:
+    """根据配置创建搜索后端"""
+    if settings.SEARCH_BACKEND == 'memory':
+        from app.services.memory_search import MemorySearchBackend
+        logger.info("使用内存搜索后端")
+        return MemorySearchBackend()
+    return SearchService()
 
 
 # 全局搜索服务实例
-search_service = SearchService() 
\ No newline at end of file
+search_service = create_search_service()
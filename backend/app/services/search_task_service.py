@@ -0,0 +1,196 @@
+"""
+搜索索引任务服务
+将重建索引和迁移旧版索引作为后台任务执行，进度记录在任务表并通过WebSocket推送
+"""
+import asyncio
+import json
+import logging
+import time
+from typing import Dict, Any, Optional
+from datetime import datetime
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import AsyncSessionLocal
+from app.models.task import Task, TaskStatus, TaskType
+from app.services.search_service import search_service
+from app.services.websocket_service import WebSocketService
+
+logger = logging.getLogger(__name__)
+
+# 支持的索引任务
+SEARCH_ACTIONS = {
+    'reindex': '重建搜索索引',
+    'migrate': '迁移旧版索引',
+}
+
+# 进度推送中的任务类型
+PROGRESS_TYPE = 'search_index'
+
+
+class SearchTaskService:
+    """搜索索引任务服务类"""
+
+    def __init__(self, progress_interval: float = 1.0):
+        self.progress_interval = progress_interval
+        self.jobs: Dict[int, asyncio.Task] = {}
+
+    async def submit(self,
+                     db: AsyncSession,
+                     action: str,
+                     nickname: Optional[str] = None,
+                     delete_source: bool = False,
+                     user_id: Optional[int] = None) -> Task:
+        """创建索引任务并在后台执行，立即返回任务记录"""
+        if action not in SEARCH_ACTIONS:
+            raise ValueError(f"不支持的索引任务: {action}")
+
+        task = Task(
+            name=SEARCH_ACTIONS[action] + (f" - {nickname}" if nickname else ""),
+            task_type=TaskType.SEARCH_INDEX,
+            status=TaskStatus.PENDING,
+            parameters=json.dumps({
+                'action': action,
+                'nickname': nickname,
+                'delete_source': delete_source,
+            }, ensure_ascii=False),
+            user_id=user_id,
+        )
+        db.add(task)
+        await db.commit()
+        await db.refresh(task)
+
+        task_id = task.id
+        job = asyncio.create_task(self._run(task_id, action, nickname, delete_source))
+        self.jobs[task_id] = job
+        job.add_done_callback(lambda _: self.jobs.pop(task_id, None))
+        logger.info(f"创建索引任务: {task_id} {action}")
+        return task
+
+    async def _update_task(self, db: AsyncSession, task_id: int, **values):
+        """更新任务记录"""
+        await db.execute(update(Task).where(Task.id == task_id).values(**values))
+        await db.commit()
+
+    async def _send_progress(self, task_id: int, action: str, status: str, processed: int, total: int, **extra):
+        """推送索引任务进度"""
+        await WebSocketService.send_progress({
+            'type': PROGRESS_TYPE,
+            'task_id': task_id,
+            'action': action,
+            'status': status,
+            'processed_items': processed,
+            'total_items': total,
+            'progress': self._percent(processed, total),
+            **extra,
+        })
+
+    @staticmethod
+    def _percent(processed: int, total: int) -> int:
+        return min(100, int(processed * 100 / total)) if total else 0
+
+    async def _run(self, task_id: int, action: str, nickname: Optional[str], delete_source: bool):
+        """执行索引任务"""
+        async with AsyncSessionLocal() as db:
+            try:
+                await self._update_task(
+                    db, task_id,
+                    status=TaskStatus.RUNNING,
+                    started_at=datetime.utcnow(),
+                )
+                await self._send_progress(task_id, action, TaskStatus.RUNNING.value, 0, 0)
+
+                last_report = 0.0
+                counts = {'processed': 0, 'total': 0}
+
+                async def on_progress(processed: int, total: int):
+                    nonlocal last_report
+                    counts['processed'], counts['total'] = processed, total
+                    now = time.monotonic()
+                    if processed and processed < total and now - last_report < self.progress_interval:
+                        return
+                    last_report = now
+                    await self._update_task(
+                        db, task_id,
+                        total_items=total,
+                        processed_items=processed,
+                        progress=self._percent(processed, total),
+                    )
+                    await self._send_progress(task_id, action, TaskStatus.RUNNING.value, processed, total)
+
+                # 重建索引流式读取文章占用服务端游标，进度更新使用单独的会话
+                if action == 'reindex':
+                    async with AsyncSessionLocal() as reindex_db:
+                        result = await search_service.reindex_articles(
+                            reindex_db, nickname, on_progress=on_progress
+                        )
+                    if result.get('error'):
+                        raise RuntimeError(result['error'])
+                    message = f"重建索引 {result['indexed']} 篇文章，失败 {result['failed']} 篇"
+                else:
+                    indices = await search_service.migrate_legacy_indices(
+                        delete_source=delete_source, on_progress=on_progress
+                    )
+                    result = {'indices': indices}
+                    message = f"迁移 {len(indices)} 个旧索引"
+
+                processed, total = counts['processed'], counts['total']
+                await self._update_task(
+                    db, task_id,
+                    status=TaskStatus.COMPLETED,
+                    progress=100,
+                    total_items=total,
+                    processed_items=processed,
+                    completed_at=datetime.utcnow(),
+                    result=json.dumps({'message': message, **result}, ensure_ascii=False, default=str),
+                )
+                await self._send_progress(task_id, action, TaskStatus.COMPLETED.value, processed, total,
+                                          message=message)
+                logger.info(f"索引任务完成: {task_id} {message}")
+
+            except asyncio.CancelledError:
+                await self._update_task(
+                    db, task_id,
+                    status=TaskStatus.CANCELLED,
+                    completed_at=datetime.utcnow(),
+                )
+                raise
+            except Exception as e:
+                logger.error(f"索引任务失败: {task_id}: {e}")
+                await db.rollback()
+                await self._update_task(
+                    db, task_id,
+                    status=TaskStatus.FAILED,
+                    error_message=str(e),
+                    completed_at=datetime.utcnow(),
+                )
+                await self._send_progress(task_id, action, TaskStatus.FAILED.value, 0, 0, error=str(e))
+
+    async def get_task(self, db: AsyncSession, task_id: int) -> Optional[Dict[str, Any]]:
+        """获取索引任务状态"""
+        task = await db.get(Task, task_id)
+        if not task or task.task_type != TaskType.SEARCH_INDEX:
+            return None
+        return {
+            'task_id': task.id,
+            'name': task.name,
+            'status': task.status,
+            'progress': task.progress,
+            'total_items': task.total_items,
+            'processed_items': task.processed_items,
+            'result': json.loads(task.result) if task.result else None,
+            'error_message': task.error_message,
+            'created_at': task.created_at,
+            'started_at': task.started_at,
+            'completed_at': task.completed_at,
+        }
+
+    async def shutdown(self):
+        """取消未完成的索引任务"""
+        for job in list(self.jobs.values()):
+            job.cancel()
+        if self.jobs:
+            await asyncio.gather(*self.jobs.values(), return_exceptions=True)
+
+
+# 全局搜索索引任务服务实例
+search_task_service = SearchTaskService()
@@ -3,72 +3,302 @@ WebSocket服务
 用于实时通信和状态更新
 """
 import asyncio
+import itertools
 import json
 import logging
-from typing import Dict, List, Any
+import time
+from collections import OrderedDict, defaultdict
+from typing import Dict, List, Any, Optional, Hashable, Iterable, Set, Tuple
 from fastapi import WebSocket, WebSocketDisconnect
 from datetime import datetime
+from app.core.config import settings
+from app.services.event_bus import event_bus
 
 logger = logging.getLogger(__name__)
 
+# 断开滞后连接时 close 握手的等待时间（秒）
+CLOSE_TIMEOUT = 1.0
+
+# 终止状态，带这些状态的消息队列满时也不会被丢弃
+TERMINAL_STATUSES = frozenset({'completed', 'failed', 'cancelled'})
+
+# 订阅主题 (事件类型, 范围)，范围为任务ID或公众号名称，None表示该事件的全部消息
+Topic = Tuple[str, Optional[str]]
+
+
+class ClientConnection:
+    """单个WebSocket连接及其发送队列
+    
+    待发送消息按键保存：带合并键的消息覆盖队列中同键的旧消息（位置不变），
+    不带键的消息使用自增序号。队列满时只丢弃最旧的可合并消息（带键且非终止状态），
+    没有可丢弃的消息时断开连接，通知和终止状态不会被静默丢弃。由独立的写任务按序发送。
+    """
+    
+    _sequence = itertools.count()
+    
+    def __init__(self, websocket: WebSocket, client_id: str = None, max_size: int = None):
+        self.websocket = websocket
+        self.client_id = client_id
+        self.max_size = max_size or settings.WEBSOCKET_SEND_QUEUE_SIZE
+        # 键 -> (消息, 是否可丢弃)
+        self.pending: "OrderedDict[Hashable, Tuple[str, bool]]" = OrderedDict()
+        self.ready = asyncio.Event()
+        self.connected_at = datetime.now()
+        self.last_activity = datetime.now()
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        # 队列开始持续满载的时间，未满时为None
+        self.full_since: Optional[float] = None
+        self.writer: Optional[asyncio.Task] = None
+        self.topics: Set[Topic] = set()
+        # 新连接默认订阅全部事件，首次显式订阅时替换为显式订阅
+        self.default_topics = True
+    
+    def enqueue(self, message: str, key: Hashable = None, droppable: Optional[bool] = None) -> bool:
+        """消息入队，返回False表示连接已滞后需要断开
+        
+        droppable 默认为带合并键的消息可丢弃。
+        """
+        if droppable is None:
+            droppable = key is not None
+        if key is not None and key in self.pending:
+            self.pending[key] = (message, droppable)
+            self.coalesced += 1
+            return True
+        
+        if len(self.pending) >= self.max_size:
+            now = time.monotonic()
+            if self.full_since is None:
+                self.full_since = now
+            elif now - self.full_since > settings.WEBSOCKET_STALL_TIMEOUT:
+                return False
+            victim = next((k for k, (_, can_drop) in self.pending.items() if can_drop), None)
+            if victim is None:
+                return False
+            del self.pending[victim]
+            self.dropped += 1
+        else:
+            self.full_since = None
+        
+        self.pending[key if key is not None else ('_', next(self._sequence))] = (message, droppable)
+        self.ready.set()
+        return True
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'client_id': self.client_id,
+            'connected_at': self.connected_at,
+            'last_activity': self.last_activity,
+            'queued': len(self.pending),
+            'sent': self.sent,
+            'dropped': self.dropped,
+            'coalesced': self.coalesced,
+            'topics': [{'event': event, 'scope': scope} for event, scope in sorted(self.topics, key=str)],
+        }
+
 
 class ConnectionManager:
-    """WebSocket连接管理器"""
+    """WebSocket连接管理器
+    
+    广播只把序列化好的消息放入各连接的发送队列，不等待发送完成，
+    慢连接只影响自己的队列，不会拖慢其他连接。
+    事件按订阅主题投递，主题到连接的索引保证只查找感兴趣的连接。
+    """
     
     def __init__(self):
-        self.active_connections: List[WebSocket] = []
-        self.connection_data: Dict[WebSocket, Dict[str, Any]] = {}
+        self.clients: Dict[WebSocket, ClientConnection] = {}
+        self.subscriptions: Dict[Topic, Set[WebSocket]] = defaultdict(set)
+        self.evicted = 0
+        # 进行中的断开任务，保留引用避免被垃圾回收
+        self.evictions: Set[asyncio.Task] = set()
+    
+    @property
+    def active_connections(self) -> List[WebSocket]:
+        return list(self.clients)
     
     async def connect(self, websocket: WebSocket, client_id: str = None):
         """建立WebSocket连接"""
         await websocket.accept()
-        self.active_connections.append(websocket)
-        self.connection_data[websocket] = {
-            'client_id': client_id,
-            'connected_at': datetime.now(),
-            'last_activity': datetime.now()
-        }
+        client = ClientConnection(websocket, client_id)
+        client.writer = asyncio.create_task(self._writer(client))
+        self.clients[websocket] = client
+        # 兼容未发送 subscribe 的旧客户端：默认接收全部事件
+        for event in WebSocketEvents.ALL:
+            topic = (event, None)
+            client.topics.add(topic)
+            self.subscriptions[topic].add(websocket)
         logger.info(f"WebSocket连接建立: {client_id}")
     
     def disconnect(self, websocket: WebSocket):
         """断开WebSocket连接"""
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
-            client_id = self.connection_data.get(websocket, {}).get('client_id')
-            del self.connection_data[websocket]
-            logger.info(f"WebSocket连接断开: {client_id}")
+        client = self.clients.pop(websocket, None)
+        if client is None:
+            return
+        for topic in client.topics:
+            self._unindex(topic, websocket)
+        if client.writer and client.writer is not asyncio.current_task():
+            client.writer.cancel()
+        logger.info(f"WebSocket连接断开: {client.client_id}")
     
-    async def send_personal_message(self, message: str, websocket: WebSocket):
-        """发送个人消息"""
+    async def _writer(self, client: ClientConnection):
+        """按序发送连接队列中的消息"""
         try:
-            await websocket.send_text(message)
-            self.connection_data[websocket]['last_activity'] = datetime.now()
+            while True:
+                await client.ready.wait()
+                while client.pending:
+                    _, (message, _) = client.pending.popitem(last=False)
+                    await asyncio.wait_for(
+                        client.websocket.send_text(message),
+                        timeout=settings.WEBSOCKET_SEND_TIMEOUT
+                    )
+                    client.sent += 1
+                    client.last_activity = datetime.now()
+                client.full_since = None
+                client.ready.clear()
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            logger.warning(f"WebSocket发送超时，断开连接: {client.client_id}")
+            await self._evict(client)
         except Exception as e:
-            logger.error(f"发送个人消息失败: {e}")
-            self.disconnect(websocket)
-    
-    async def broadcast(self, message: str):
-        """广播消息给所有连接"""
-        disconnected = []
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message)
-                self.connection_data[connection]['last_activity'] = datetime.now()
-            except Exception as e:
-                logger.error(f"广播消息失败: {e}")
-                disconnected.append(connection)
-        
-        # 清理断开的连接
-        for connection in disconnected:
-            self.disconnect(connection)
+            logger.error(f"发送WebSocket消息失败: {e}")
+            self.disconnect(client.websocket)
+    
+    async def _evict(self, client: ClientConnection):
+        """断开滞后的连接"""
+        if client.websocket not in self.clients:
+            return
+        self.evicted += 1
+        self.disconnect(client.websocket)
+        try:
+            await asyncio.wait_for(client.websocket.close(code=1008), timeout=CLOSE_TIMEOUT)
+        except Exception:
+            pass
+    
+    def _unindex(self, topic: Topic, websocket: WebSocket):
+        connections = self.subscriptions.get(topic)
+        if connections is not None:
+            connections.discard(websocket)
+            if not connections:
+                del self.subscriptions[topic]
+    
+    def subscribe(self, websocket: WebSocket, event: str, scope: Optional[str] = None) -> bool:
+        """订阅事件，scope为空时接收该事件的全部消息"""
+        client = self.clients.get(websocket)
+        if client is None or event not in WebSocketEvents.ALL:
+            return False
+        if client.default_topics:
+            self._clear_topics(client)
+        topic = (event, str(scope) if scope is not None else None)
+        if topic not in client.topics and len(client.topics) >= settings.WEBSOCKET_MAX_SUBSCRIPTIONS:
+            return False
+        client.topics.add(topic)
+        self.subscriptions[topic].add(websocket)
+        return True
+    
+    def unsubscribe(self, websocket: WebSocket, event: Optional[str] = None, scope: Optional[str] = None):
+        """取消订阅，event为空时取消全部订阅"""
+        client = self.clients.get(websocket)
+        if client is None:
+            return
+        client.default_topics = False
+        if event is None:
+            self._clear_topics(client)
+            return
+        topic = (event, str(scope) if scope is not None else None)
+        client.topics.discard(topic)
+        self._unindex(topic, websocket)
     
-    async def send_json(self, data: Dict[str, Any], websocket: WebSocket = None):
-        """发送JSON数据"""
+    def _clear_topics(self, client: ClientConnection):
+        """取消连接的全部订阅"""
+        for topic in client.topics:
+            self._unindex(topic, client.websocket)
+        client.topics.clear()
+        client.default_topics = False
+    
+    def _recipients(self, event: str, scopes: Iterable[Any]) -> Set[WebSocket]:
+        """查找订阅了事件全部消息或其中任一范围的连接"""
+        recipients = set(self.subscriptions.get((event, None), ()))
+        for scope in scopes:
+            if scope is not None:
+                recipients |= self.subscriptions.get((event, str(scope)), set())
+        return recipients
+    
+    async def publish(self,
+                      event: str,
+                      data: Dict[str, Any],
+                      scopes: Iterable[Any] = (),
+                      key: Hashable = None) -> int:
+        """向订阅者发布事件，返回投递的连接数"""
+        recipients = self._recipients(event, scopes)
+        if not recipients:
+            return 0
+        message = json.dumps({
+            'type': event,
+            'data': data,
+            'timestamp': datetime.now().isoformat()
+        }, ensure_ascii=False, default=str)
+        droppable = key is not None and data.get('status') not in TERMINAL_STATUSES
+        for websocket in recipients:
+            client = self.clients.get(websocket)
+            if client is not None:
+                self._enqueue(client, message, key, droppable)
+        return len(recipients)
+    
+    def _enqueue(self, client: ClientConnection, message: str, key: Hashable = None, droppable: Optional[bool] = None):
+        if not client.enqueue(message, key, droppable):
+            logger.warning(f"WebSocket发送队列已满且没有可丢弃的消息，断开连接: {client.client_id}")
+            task = asyncio.create_task(self._evict(client))
+            self.evictions.add(task)
+            task.add_done_callback(self._eviction_done)
+    
+    def _eviction_done(self, task: asyncio.Task):
+        self.evictions.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"断开WebSocket连接失败: {task.exception()}")
+    
+    async def send_personal_message(self, message: str, websocket: WebSocket, key: Hashable = None):
+        """发送个人消息"""
+        client = self.clients.get(websocket)
+        if client is not None:
+            self._enqueue(client, message, key)
+    
+    async def broadcast(self, message: str, key: Hashable = None):
+        """广播消息给所有连接，key相同的未发送消息只保留最新一条"""
+        for client in list(self.clients.values()):
+            self._enqueue(client, message, key)
+    
+    async def send_json(self, data: Dict[str, Any], websocket: WebSocket = None, key: Hashable = None):
+        """发送JSON数据，每条消息只序列化一次"""
         message = json.dumps(data, ensure_ascii=False, default=str)
         if websocket:
-            await self.send_personal_message(message, websocket)
+            await self.send_personal_message(message, websocket, key)
         else:
-            await self.broadcast(message)
+            await self.broadcast(message, key)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取连接和发送队列统计"""
+        clients = [client.stats() for client in self.clients.values()]
+        return {
+            'connections': len(clients),
+            'queued': sum(c['queued'] for c in clients),
+            'dropped': sum(c['dropped'] for c in clients),
+            'coalesced': sum(c['coalesced'] for c in clients),
+            'evicted': self.evicted,
+            'topics': len(self.subscriptions),
+            'clients': clients,
+        }
+    
+    async def close(self):
+        """停止所有写任务和断开任务"""
+        tasks = [client.writer for client in self.clients.values() if client.writer]
+        tasks += self.evictions
+        self.clients.clear()
+        self.subscriptions.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
 
 
 # 全局连接管理器实例
@@ -76,7 +306,10 @@ manager = ConnectionManager()
 
 
 class WebSocketService:
-    """WebSocket服务类"""
+    """WebSocket服务类
+    
+    send_* 经事件总线发布事件，由每个API进程转发给本地订阅的连接。
+    """
     
     @staticmethod
     async def handle_websocket(websocket: WebSocket, client_id: str = None):
@@ -91,7 +324,7 @@ class WebSocketService:
                     await WebSocketService.process_message(websocket, message)
                 except json.JSONDecodeError:
                     logger.warning(f"无效的JSON消息: {data}")
-                
+        
         except WebSocketDisconnect:
             manager.disconnect(websocket)
         except Exception as e:
@@ -107,54 +340,79 @@ class WebSocketService:
             # 心跳检测
             await manager.send_json({'type': 'pong', 'timestamp': datetime.now().isoformat()}, websocket)
         
-        elif message_type == 'subscribe':
-            # 订阅特定事件
+        elif message_type in ('subscribe', 'unsubscribe'):
+            # 订阅或取消订阅事件，可按任务ID或公众号名称限定范围
             event = message.get('event')
-            if event:
-                await manager.send_json({
-                    'type': 'subscribed',
-                    'event': event,
-                    'timestamp': datetime.now().isoformat()
-                }, websocket)
+            scope = message.get('task_id', message.get('nickname'))
+            if message_type == 'subscribe':
+                if not event or not manager.subscribe(websocket, event, scope):
+                    await manager.send_json({
+                        'type': 'error',
+                        'message': f"无法订阅事件: {event}",
+                        'timestamp': datetime.now().isoformat()
+                    }, websocket)
+                    return
+            else:
+                manager.unsubscribe(websocket, event, scope)
+            await manager.send_json({
+                'type': 'subscribed' if message_type == 'subscribe' else 'unsubscribed',
+                'event': event,
+                'scope': scope,
+                'timestamp': datetime.now().isoformat()
+            }, websocket)
         
         elif message_type == 'crawler_status':
             # 爬虫状态更新
-            await manager.broadcast(json.dumps({
-                'type': 'crawler_status',
-                'data': message.get('data', {}),
-                'timestamp': datetime.now().isoformat()
-            }))
+            data = message.get('data', {})
+            await event_bus.publish(WebSocketEvents.CRAWLER_STATUS, data, scopes=(data.get('nickname'),))
     
     @staticmethod
     async def send_crawler_status(status_data: Dict[str, Any]):
         """发送爬虫状态更新"""
-        await manager.send_json({
-            'type': 'crawler_status',
-            'data': status_data,
-            'timestamp': datetime.now().isoformat()
-        })
+        nickname = status_data.get('nickname')
+        await event_bus.publish(
+            WebSocketEvents.CRAWLER_STATUS,
+            status_data,
+            scopes=(nickname,),
+            key=(WebSocketEvents.CRAWLER_STATUS, nickname)
+        )
     
     @staticmethod
     async def send_notification(title: str, message: str, notification_type: str = 'info'):
         """发送通知消息"""
-        await manager.send_json({
-            'type': 'notification',
-            'data': {
-                'title': title,
-                'message': message,
-                'type': notification_type
-            },
-            'timestamp': datetime.now().isoformat()
+        await event_bus.publish(WebSocketEvents.NOTIFICATION, {
+            'title': title,
+            'message': message,
+            'type': notification_type
         })
     
+    @staticmethod
+    async def send_request_data(request_data: Dict[str, Any]):
+        """发送抓包参数就绪通知"""
+        await event_bus.publish(WebSocketEvents.REQUEST_DATA, request_data, scopes=(request_data.get('nickname'),))
+    
+    @staticmethod
+    async def send_export_progress(progress_data: Dict[str, Any]):
+        """发送导出进度更新"""
+        task_id = progress_data.get('task_id')
+        await event_bus.publish(
+            WebSocketEvents.EXPORT_PROGRESS,
+            progress_data,
+            scopes=(task_id,),
+            key=(WebSocketEvents.EXPORT_PROGRESS, task_id)
+        )
+    
     @staticmethod
     async def send_progress(progress_data: Dict[str, Any]):
-        """发送进度更新"""
-        await manager.send_json({
-            'type': 'progress',
-            'data': progress_data,
-            'timestamp': datetime.now().isoformat()
-        })
+        """发送进度更新，订阅任务ID或公众号名称的连接都会收到"""
+        task_id = progress_data.get('task_id')
+        nickname = progress_data.get('nickname')
+        await event_bus.publish(
+            WebSocketEvents.PROGRESS,
+            progress_data,
+            scopes=(task_id, nickname),
+            key=(WebSocketEvents.PROGRESS, progress_data.get('type'), task_id if task_id is not None else nickname)
+        )
 
 
 # WebSocket事件类型
@@ -165,4 +423,7 @@ class WebSocketEvents:
     PROGRESS = 'progress'
     REQUEST_DATA = 'request_data'
     SEARCH_RESULT = 'search_result'
-    EXPORT_PROGRESS = 'export_progress' 
\ No newline at end of file
+    EXPORT_PROGRESS = 'export_progress'
+    
+    # 可订阅的事件类型
+    ALL = frozenset({CRAWLER_STATUS, NOTIFICATION, PROGRESS, REQUEST_DATA, SEARCH_RESULT, EXPORT_PROGRESS})
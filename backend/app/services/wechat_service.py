@@ -6,12 +6,19 @@ import json
 import re
 import logging
 import asyncio
+import time
+from contextlib import asynccontextmanager
 from typing import Dict, List, Any, Optional
 from datetime import datetime
 from sqlalchemy.orm import Session
+from app.core.config import settings
 from app.models.article import Article
 from app.models.proxy import Proxy
+from app.services.credential_store import create_credential_store
+from app.services.proxy_pool import PROXY_ERROR_STATUSES, proxy_pool
 from app.services.proxy_service import proxy_service
+from app.services.rate_limiter import rate_limiter
+from app.services.progress_aggregator import progress_aggregator
 from app.services.websocket_service import WebSocketService
 import aiohttp
 import hashlib
@@ -23,14 +30,77 @@ class WeChatService:
     """微信公众号服务类"""
     
     def __init__(self):
-        self.request_data = {}
+        self.store = create_credential_store()
         self.current_wxuin = None
         self.current_nickname = None
+        self._session: Optional[aiohttp.ClientSession] = None
+    
+    async def start_session(self) -> aiohttp.ClientSession:
+        """创建共享的HTTP连接池会话"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=settings.CRAWLER_POOL_SIZE,
+                limit_per_host=settings.CRAWLER_POOL_SIZE_PER_HOST,
+                keepalive_timeout=settings.CRAWLER_KEEPALIVE_TIMEOUT,
+                ttl_dns_cache=settings.CRAWLER_DNS_CACHE_TTL,
+                use_dns_cache=True,
+                enable_cleanup_closed=True,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=settings.CRAWLER_TIMEOUT),
+            )
+            logger.info("爬虫HTTP连接池已创建")
+        return self._session
+    
+    async def get_session(self) -> aiohttp.ClientSession:
+        """获取共享的HTTP会话，未创建时自动创建"""
+        if self._session is None or self._session.closed:
+            return await self.start_session()
+        return self._session
+    
+    async def close_session(self):
+        """关闭共享的HTTP连接池会话"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logger.info("爬虫HTTP连接池已关闭")
+        self._session = None
+    
+    async def close(self):
+        """释放HTTP连接池和请求参数存储"""
+        await self.close_session()
+        await self.store.close()
+    
+    @asynccontextmanager
+    async def _get(self, url: str, headers: Dict[str, str]):
+        """通过共享连接池发送GET请求，启用代理池时按权重选择出口代理并反馈结果"""
+        session = await self.get_session()
+        proxy = proxy_pool.acquire()
+        if proxy is None:
+            async with session.get(url, headers=headers) as response:
+                yield response
+            return
+        
+        started = time.monotonic()
+        reported = False
+        try:
+            async with session.get(url, headers=headers, proxy=proxy.url) as response:
+                proxy_pool.report(proxy, response.status not in PROXY_ERROR_STATUSES, time.monotonic() - started)
+                reported = True
+                yield response
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            if not reported:
+                proxy_pool.report(proxy, False)
+                reported = True
+            raise
+        finally:
+            if not reported:
+                proxy_pool.release(proxy)
     
     async def start_proxy_server(self):
         """启动代理服务器"""
         try:
-            await proxy_service.start_proxy()
+            await proxy_service.start_proxy(capture_handler=self.save_request_data)
             logger.info("代理服务器启动成功")
             return True
         except Exception as e:
@@ -53,107 +123,116 @@ class WeChatService:
             logger.error(f"获取代理信息失败: {e}")
             return {'ip': 'unknown', 'port': 8080, 'status': 'error'}
     
-    def save_request_data(self, wxuin: str, key: str, data: Dict[str, Any]):
+    async def save_request_data(self, wxuin: str, key: str, data: Dict[str, Any],
+                                biz: Optional[str] = None, nickname: Optional[str] = None):
         """保存请求参数"""
         try:
-            key_name = f"{wxuin}.{key}.req"
-            self.request_data[key_name] = {
-                'data': data,
-                'timestamp': datetime.now().timestamp(),
+            if biz is None and data.get('url'):
+                biz = self._extract_biz_from_url(data['url']) or None
+            await self.store.save(wxuin, key, data, biz=biz, nickname=nickname)
+            self.current_wxuin = wxuin
+            if nickname:
+                self.current_nickname = nickname
+            logger.info(f"保存请求参数: {wxuin}.{key} biz={biz}")
+            await WebSocketService.send_request_data({
                 'wxuin': wxuin,
-                'key': key
-            }
-            logger.info(f"保存请求参数: {key_name}")
+                'type': key,
+                'biz': biz,
+                'nickname': nickname
+            })
             return True
         except Exception as e:
             logger.error(f"保存请求参数失败: {e}")
             return False
     
-    def get_request_data(self, wxuin: str, key: str) -> Optional[Dict[str, Any]]:
+    async def get_request_data(self, wxuin: str, key: str) -> Optional[Dict[str, Any]]:
         """获取请求参数"""
-        key_name = f"{wxuin}.{key}.req"
-        return self.request_data.get(key_name)
+        return await self.store.get(wxuin, key)
     
-    def get_all_request_data(self) -> List[Dict[str, Any]]:
+    async def get_all_request_data(self) -> List[Dict[str, Any]]:
         """获取所有请求参数"""
         result = []
-        for key_name, data in self.request_data.items():
+        for record in await self.store.list_all():
             result.append({
-                'key': key_name,
-                'wxuin': data['wxuin'],
-                'type': data['key'],
-                'timestamp': data['timestamp'],
-                'data': data['data']
+                'key': f"{record['wxuin']}.{record['key']}.req",
+                'wxuin': record['wxuin'],
+                'type': record['key'],
+                'biz': record.get('biz'),
+                'nickname': record.get('nickname'),
+                'timestamp': record['timestamp'],
+                'data': record['data']
             })
         return result
     
-    def delete_request_data(self, wxuin: str = None, key: str = None):
+    async def delete_request_data(self, wxuin: str = None, key: str = None):
         """删除请求参数"""
+        await self.store.delete(wxuin, key)
         if wxuin and key:
-            # 删除特定参数
-            key_name = f"{wxuin}.{key}.req"
-            if key_name in self.request_data:
-                del self.request_data[key_name]
-                logger.info(f"删除请求参数: {key_name}")
+            logger.info(f"删除请求参数: {wxuin}.{key}")
         elif wxuin:
-            # 删除特定微信的所有参数
-            keys_to_delete = [k for k in self.request_data.keys() if k.startswith(f"{wxuin}.")]
-            for key in keys_to_delete:
-                del self.request_data[key]
             logger.info(f"删除微信 {wxuin} 的所有参数")
         else:
-            # 删除所有参数
-            self.request_data.clear()
             logger.info("删除所有请求参数")
     
+    async def bind_nickname(self, nickname: str, biz: str):
+        """绑定公众号名称与 __biz，用于按名称查找请求参数"""
+        await self.store.bind_nickname(nickname, biz)
+    
     async def crawl_article_list(self, nickname: str, offset: int = 0) -> Optional[Dict[str, Any]]:
         """爬取文章列表"""
         try:
             # 获取请求参数
-            wx_req_data = self._get_wx_req_data_by_nickname(nickname)
+            wx_req_data = await self._get_wx_req_data_by_nickname(nickname)
             if not wx_req_data or 'load_more' not in wx_req_data:
                 logger.error(f"未找到公众号 {nickname} 的请求参数")
                 return None
             
             # 构建请求
             req_data = wx_req_data['load_more']['data']
+            wxuin = wx_req_data['load_more'].get('wxuin')
             url = req_data['url']
             headers = req_data['requestOptions']['headers']
+            biz = self._extract_biz_from_url(url)
             
             # 修改offset参数
             url = re.sub(r'offset=\d+', f'offset={offset}', url)
             
             # 发送请求
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, headers=headers, timeout=30) as response:
-                    if response.status == 200:
-                        data = await response.json()
+            await rate_limiter.acquire(biz, wxuin)
+            async with self._get(url, headers) as response:
+                if response.status == 200:
+                    data = await response.json()
+                    
+                    # 检查响应状态
+                    if data.get('errmsg') == 'ok':
+                        rate_limiter.report(biz, wxuin)
                         
-                        # 检查响应状态
-                        if data.get('errmsg') == 'ok':
-                            # 解析文章列表
-                            articles = self._parse_article_list(data, nickname)
-                            
-                            # 发送进度更新
-                            await WebSocketService.send_progress({
-                                'type': 'article_list',
-                                'nickname': nickname,
-                                'count': len(articles),
-                                'offset': offset
-                            })
-                            
-                            return {
-                                'articles': articles,
-                                'can_continue': data.get('can_msg_continue', False),
-                                'next_offset': data.get('next_offset', 0)
-                            }
-                        else:
-                            logger.error(f"获取文章列表失败: {data}")
-                            return None
+                        # 解析文章列表
+                        articles = self._parse_article_list(data, nickname)
+                        
+                        # 累计进度，由聚合器按时间窗口推送
+                        progress_aggregator.update(
+                            nickname,
+                            {'pages': 1, 'articles': len(articles)},
+                            type='crawl',
+                            nickname=nickname,
+                            offset=offset
+                        )
+                        
+                        return {
+                            'articles': articles,
+                            'can_continue': data.get('can_msg_continue', False),
+                            'next_offset': data.get('next_offset', 0)
+                        }
                     else:
-                        logger.error(f"请求失败: {response.status}")
+                        rate_limiter.report(biz, wxuin, throttled=True)
+                        logger.error(f"获取文章列表失败: {data}")
                         return None
-                        
+                else:
+                    rate_limiter.report(biz, wxuin, throttled=self._is_throttled_status(response.status))
+                    logger.error(f"请求失败: {response.status}")
+                    return None
+                    
         except Exception as e:
             logger.error(f"爬取文章列表失败: {e}")
             return None
@@ -162,29 +241,33 @@ class WeChatService:
         """爬取文章内容"""
         try:
             # 获取请求参数
-            wx_req_data = self._get_wx_req_data_by_nickname(nickname)
+            wx_req_data = await self._get_wx_req_data_by_nickname(nickname)
             if not wx_req_data or 'content' not in wx_req_data:
                 logger.error(f"未找到公众号 {nickname} 的内容请求参数")
                 return None
             
             # 构建请求
             req_data = wx_req_data['content']['data']
+            wxuin = wx_req_data['content'].get('wxuin')
             headers = req_data['requestOptions']['headers']
+            biz = self._extract_biz_from_url(article_url)
             
             # 发送请求
-            async with aiohttp.ClientSession() as session:
-                async with session.get(article_url, headers=headers, timeout=30) as response:
-                    if response.status == 200:
-                        content = await response.text()
-                        
-                        # 解析文章内容
-                        article_data = self._parse_article_content(content, article_url)
-                        
-                        return article_data
-                    else:
-                        logger.error(f"获取文章内容失败: {response.status}")
-                        return None
-                        
+            await rate_limiter.acquire(biz, wxuin)
+            async with self._get(article_url, headers) as response:
+                if response.status == 200:
+                    rate_limiter.report(biz, wxuin)
+                    content = await response.text()
+                    
+                    # 解析文章内容
+                    article_data = self._parse_article_content(content, article_url)
+                    
+                    return article_data
+                else:
+                    rate_limiter.report(biz, wxuin, throttled=self._is_throttled_status(response.status))
+                    logger.error(f"获取文章内容失败: {response.status}")
+                    return None
+                    
         except Exception as e:
             logger.error(f"爬取文章内容失败: {e}")
             return None
@@ -193,44 +276,57 @@ class WeChatService:
         """爬取阅读数据"""
         try:
             # 获取请求参数
-            wx_req_data = self._get_wx_req_data_by_nickname(nickname)
+            wx_req_data = await self._get_wx_req_data_by_nickname(nickname)
             if not wx_req_data or 'getappmsgext' not in wx_req_data:
                 logger.error(f"未找到公众号 {nickname} 的阅读数据请求参数")
                 return None
             
             # 构建请求
             req_data = wx_req_data['getappmsgext']['data']
+            wxuin = wx_req_data['getappmsgext'].get('wxuin')
             url = req_data['url']
             headers = req_data['requestOptions']['headers']
+            biz = self._extract_biz_from_url(article_url)
             
             # 修改URL参数
-            url = re.sub(r'__biz=[^&]+', f'__biz={self._extract_biz_from_url(article_url)}', url)
+            url = re.sub(r'__biz=[^&]+', f'__biz={biz}', url)
             
             # 发送请求
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, headers=headers, timeout=30) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        
-                        return {
-                            'read_num': data.get('appmsgstat', {}).get('read_num', 0),
-                            'like_num': data.get('appmsgstat', {}).get('like_num', 0),
-                            'reward_num': data.get('reward_total_count', 0),
-                            'comment_num': data.get('comment_count', 0)
-                        }
-                    else:
-                        logger.error(f"获取阅读数据失败: {response.status}")
+            await rate_limiter.acquire(biz, wxuin)
+            async with self._get(url, headers) as response:
+                if response.status == 200:
+                    data = await response.json()
+                    
+                    # appmsgstat 为空说明请求被限流
+                    appmsgstat = data.get('appmsgstat')
+                    if not appmsgstat:
+                        rate_limiter.report(biz, wxuin, throttled=True)
+                        logger.error(f"获取阅读数据被限流: {data.get('base_resp', data)}")
                         return None
-                        
+                    
+                    rate_limiter.report(biz, wxuin)
+                    return {
+                        'read_num': appmsgstat.get('read_num', 0),
+                        'like_num': appmsgstat.get('like_num', 0),
+                        'reward_num': data.get('reward_total_count', 0),
+                        'comment_num': data.get('comment_count', 0)
+                    }
+                else:
+                    rate_limiter.report(biz, wxuin, throttled=self._is_throttled_status(response.status))
+                    logger.error(f"获取阅读数据失败: {response.status}")
+                    return None
+                    
         except Exception as e:
             logger.error(f"爬取阅读数据失败: {e}")
             return None
     
-    def _get_wx_req_data_by_nickname(self, nickname: str) -> Optional[Dict[str, Any]]:
+    def _is_throttled_status(self, status: int) -> bool:
+        """判断HTTP状态码是否表示限流"""
+        return status == 429 or status >= 500
+    
+    async def _get_wx_req_data_by_nickname(self, nickname: str) -> Optional[Dict[str, Any]]:
         """根据公众号名称获取微信请求参数"""
-        # 这里需要根据实际存储方式实现
-        # 暂时返回空，需要根据数据库或缓存中的实际数据实现
-        return None
+        return await self.store.get_by_nickname(nickname) or None
     
     def _parse_article_list(self, data: Dict[str, Any], nickname: str) -> List[Dict[str, Any]]:
         """解析文章列表"""
@@ -271,18 +367,20 @@ class WeChatService:
             if not title:
                 return None
             
+            content_url = msg_info.get('content_url', '')
             article = {
                 'title': title,
                 'author': msg_info.get('author', ''),
-                'content_url': msg_info.get('content_url', ''),
+                'content_url': content_url,
                 'source_url': msg_info.get('source_url', ''),
                 'digest': msg_info.get('digest', ''),
                 'cover': msg_info.get('cover', ''),
                 'nickname': nickname,
                 'mov': mov,
                 'p_date': datetime.fromtimestamp(p_date) if p_date else None,
-                'id': self._generate_article_id(msg_info.get('content_url', ''))
+                'id': self._generate_article_id(content_url)
             }
+            article.update(self._extract_article_key(content_url))
             
             return article
             
@@ -305,6 +403,19 @@ class WeChatService:
         match = re.search(r'__biz=([^&]+)', url)
         return match.group(1) if match else ''
     
+    def _extract_article_key(self, url: str) -> Dict[str, Any]:
+        """从文章URL中提取 __biz、mid、idx、sn，mid+idx 唯一标识一篇文章"""
+        params = {}
+        for name in ('__biz', 'mid', 'idx', 'sn'):
+            match = re.search(rf'[?&](?:amp;)?{name}=([^&#]+)', url)
+            params[name] = match.group(1) if match else None
+        return {
+            'biz': params['__biz'],
+            'mid': params['mid'],
+            'idx': int(params['idx']) if params['idx'] and params['idx'].isdigit() else 0,
+            'sn': params['sn'],
+        }
+    
     def _generate_article_id(self, url: str) -> str:
         """生成文章ID"""
         return hashlib.md5(url.encode()).hexdigest()
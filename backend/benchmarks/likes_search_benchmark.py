@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+收藏搜索性能测试
+在临时表中生成大量收藏数据，比较顺序扫描和pg_trgm索引下搜索的延迟；
+1-2个字符的关键词抽不出三元组，无法使用索引，单独统计
+
+用法（在backend目录下运行，需要可用的PostgreSQL）:
+    python benchmarks/likes_search_benchmark.py --rows 100000 --queries 50
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.core.config import settings
+
+TABLE = "likes_benchmark"
+
+# 生成数据使用的词表，查询词取自其中
+VOCABULARY = [
+    '人工智能', '深度学习', '机器学习', '大模型', '数据分析', '云计算', '区块链', '半导体',
+    '新能源', '电动汽车', '光伏发电', '储能电站', '互联网', '跨境电商', '直播带货', '在线教育',
+    '医疗健康', '养老服务', '房地产', '金融科技', '公募基金', '宏观经济', '消费升级', '制造业',
+]
+
+# 与 LikeService.search_likes 相同的查询
+SEARCH_SQL = f"""
+SELECT id, title, like_time
+FROM {TABLE}
+WHERE title ILIKE :pattern OR content ILIKE :pattern OR digest ILIKE :pattern
+ORDER BY 2 * word_similarity(:keyword, title) + word_similarity(:keyword, coalesce(digest, '')) DESC,
+         like_time DESC
+LIMIT 20
+"""
+
+# 与 LikeService.search_likes 相同的短关键词查询，只匹配标题和摘要
+SHORT_SQL = f"""
+SELECT id, title, like_time
+FROM {TABLE}
+WHERE title ILIKE :pattern OR digest ILIKE :pattern
+ORDER BY like_time DESC
+LIMIT 20
+"""
+
+# 改造前的查询
+LEGACY_SQL = f"""
+SELECT id, title, like_time
+FROM {TABLE}
+WHERE title LIKE :pattern OR content LIKE :pattern OR digest LIKE :pattern
+ORDER BY like_time DESC
+LIMIT 20
+"""
+
+
+async def prepare(conn, rows: int):
+    """创建临时表并用 generate_series 批量生成数据"""
+    words = "ARRAY[" + ",".join(f"'{w}'" for w in VOCABULARY) + "]"
+    pick = f"({words})[1 + floor(random() * {len(VOCABULARY)})::int]"
+    await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    await conn.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+    await conn.execute(text(f"""
+        CREATE TABLE {TABLE} (
+            id SERIAL PRIMARY KEY,
+            title VARCHAR(500) NOT NULL,
+            digest TEXT,
+            content TEXT,
+            like_time TIMESTAMP
+        )
+    """))
+    await conn.execute(text(f"""
+        INSERT INTO {TABLE} (title, digest, content, like_time)
+        SELECT
+            {pick} || '的' || {pick} || '观察 ' || g,
+            {pick} || '与' || {pick} || '的最新进展',
+            (SELECT string_agg({pick} || '相关内容', '，') FROM generate_series(1, 100) WHERE g > 0),
+            now() - (g || ' minutes')::interval
+        FROM generate_series(1, :rows) AS g
+    """), {'rows': rows})
+
+
+async def create_indexes(conn):
+    for column in ('title', 'digest', 'content'):
+        await conn.execute(text(
+            f"CREATE INDEX {TABLE}_{column}_trgm ON {TABLE} USING gin ({column} gin_trgm_ops)"
+        ))
+    await conn.execute(text(f"CREATE INDEX {TABLE}_like_time ON {TABLE} (like_time)"))
+    await conn.execute(text(f"ANALYZE {TABLE}"))
+
+
+async def measure(conn, sql: str, keywords):
+    latencies = []
+    for keyword in keywords:
+        started = time.perf_counter()
+        await conn.execute(text(sql), {'keyword': keyword, 'pattern': f"%{keyword}%"})
+        latencies.append((time.perf_counter() - started) * 1000)
+    ordered = sorted(latencies)
+    return statistics.median(latencies), ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="收藏搜索性能测试")
+    parser.add_argument("--rows", type=int, default=100000, help="收藏数量")
+    parser.add_argument("--queries", type=int, default=50, help="查询次数")
+    parser.add_argument("--keep", action="store_true", help="保留测试表")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    keywords = [rng.choice(VOCABULARY) for _ in range(args.queries)]
+    # 1-2个字符的关键词，取词表中词语的前缀
+    short_keywords = [rng.choice(VOCABULARY)[:rng.choice((1, 2))] for _ in range(args.queries)]
+    engine = create_async_engine(settings.DATABASE_URL)
+    try:
+        async with engine.begin() as conn:
+            started = time.perf_counter()
+            await prepare(conn, args.rows)
+            await conn.execute(text(f"ANALYZE {TABLE}"))
+            print(f"生成 {args.rows} 条收藏，用时 {time.perf_counter() - started:.1f}s")
+
+            legacy = await measure(conn, LEGACY_SQL, keywords)
+            seq = await measure(conn, SEARCH_SQL, keywords)
+            short_legacy = await measure(conn, LEGACY_SQL, short_keywords)
+
+            started = time.perf_counter()
+            await create_indexes(conn)
+            print(f"创建三元组索引，用时 {time.perf_counter() - started:.1f}s")
+            indexed = await measure(conn, SEARCH_SQL, keywords)
+            short_full = await measure(conn, SEARCH_SQL, short_keywords)
+            short = await measure(conn, SHORT_SQL, short_keywords)
+
+            print(f"{'query':<28}{'p50 ms':>10}{'p95 ms':>10}")
+            print(f"{'LIKE 顺序扫描 (改造前)':<28}{legacy[0]:>10.1f}{legacy[1]:>10.1f}")
+            print(f"{'ILIKE+排序 顺序扫描':<28}{seq[0]:>10.1f}{seq[1]:>10.1f}")
+            print(f"{'ILIKE+排序 三元组索引':<28}{indexed[0]:>10.1f}{indexed[1]:>10.1f}")
+            print()
+            print(f"{'1-2字符关键词':<28}{'p50 ms':>10}{'p95 ms':>10}")
+            print(f"{'LIKE 顺序扫描 (改造前)':<28}{short_legacy[0]:>10.1f}{short_legacy[1]:>10.1f}")
+            print(f"{'ILIKE+排序 全部字段':<28}{short_full[0]:>10.1f}{short_full[1]:>10.1f}")
+            print(f"{'标题摘要+时间排序':<28}{short[0]:>10.1f}{short[1]:>10.1f}")
+
+            if not args.keep:
+                await conn.execute(text(f"DROP TABLE {TABLE}"))
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
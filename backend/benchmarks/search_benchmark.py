@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+搜索后端性能对比
+在同一份语料上比较内存后端和Elasticsearch后端的索引吞吐与查询延迟
+
+用法（在backend目录下运行）:
+    python benchmarks/search_benchmark.py --docs 20000 --queries 500
+    python benchmarks/search_benchmark.py --backends memory
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.memory_search import MemorySearchBackend
+from app.services.search_service import SearchService
+
+# 生成语料使用的词表
+VOCABULARY = [
+    '人工智能', '深度学习', '机器学习', '大模型', '数据分析', '云计算', '区块链', '芯片',
+    '新能源', '电动汽车', '光伏', '储能', '半导体', '互联网', '电商', '直播',
+    '教育', '医疗', '健康', '养老', '房地产', '金融', '基金', '股票',
+    '宏观经济', '消费', '出口', '制造业', '供应链', '创业', '投资', '融资',
+    '政策', '监管', '改革', '市场', '用户', '增长', '产品', '技术',
+]
+FILLERS = ['的', '了', '在', '是', '和', '与', '对', '将', '也', '都', '而', '及']
+
+
+def sentence(rng: random.Random, words: int) -> str:
+    return ''.join(rng.choice(VOCABULARY) + rng.choice(FILLERS) for _ in range(words)) + '。'
+
+
+def build_corpus(count: int, accounts: int, seed: int):
+    """生成 (公众号名称, 文章数据) 语料"""
+    rng = random.Random(seed)
+    start = datetime(2020, 1, 1)
+    corpus = []
+    for i in range(count):
+        corpus.append((f"公众号{i % accounts}", {
+            'title': sentence(rng, 3)[:-1],
+            'digest': sentence(rng, 8),
+            'content': ''.join(sentence(rng, 12) for _ in range(rng.randint(10, 40))),
+            'author': f"作者{rng.randint(1, 50)}",
+            'content_url': f"https://mp.weixin.qq.com/s/bench-{i}",
+            'p_date': start + timedelta(hours=i),
+            'read_num': rng.randint(0, 100000),
+            'like_num': rng.randint(0, 5000),
+        }))
+    return corpus
+
+
+def build_queries(count: int, accounts: int, seed: int):
+    """生成查询，约三分之一限定公众号"""
+    rng = random.Random(seed + 1)
+    queries = []
+    for _ in range(count):
+        text = ' '.join(rng.sample(VOCABULARY, rng.randint(1, 2)))
+        gzhs = [f"公众号{rng.randrange(accounts)}"] if rng.random() < 0.33 else None
+        queries.append((text, gzhs))
+    return queries
+
+
+def percentile(values, p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+async def run_backend(name: str, backend, corpus, queries, concurrency: int):
+    """索引语料并执行查询，返回指标"""
+    await backend.ensure_index()
+
+    started = time.perf_counter()
+    report = await backend.bulk_index(iter(corpus))
+    if isinstance(backend, SearchService):
+        await backend.es.indices.refresh(index=backend.index_name)
+    index_seconds = time.perf_counter() - started
+
+    # 关闭结果缓存，只测量后端本身
+    backend.cache.max_size = 0
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def query(text, gzhs):
+        async with semaphore:
+            begin = time.perf_counter()
+            await backend.search_articles(text, gzhs=gzhs, _size=20, summary=True)
+            latencies.append((time.perf_counter() - begin) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(query(text, gzhs) for text, gzhs in queries))
+    query_seconds = time.perf_counter() - started
+
+    return {
+        'backend': name,
+        'indexed': report['indexed'],
+        'failed': report['failed'],
+        'index_docs_per_sec': report['indexed'] / index_seconds if index_seconds else 0,
+        'qps': len(queries) / query_seconds if query_seconds else 0,
+        'p50_ms': statistics.median(latencies),
+        'p95_ms': percentile(latencies, 95),
+        'p99_ms': percentile(latencies, 99),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="比较搜索后端的索引吞吐与查询延迟")
+    parser.add_argument("--docs", type=int, default=20000, help="文章数量")
+    parser.add_argument("--accounts", type=int, default=50, help="公众号数量")
+    parser.add_argument("--queries", type=int, default=500, help="查询次数")
+    parser.add_argument("--concurrency", type=int, default=10, help="并发查询数")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--backends", default="memory,elasticsearch", help="逗号分隔: memory,elasticsearch")
+    parser.add_argument("--es-index", default="wechat_articles_benchmark", help="Elasticsearch基准测试使用的索引")
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.docs, args.accounts, args.seed)
+    queries = build_queries(args.queries, args.accounts, args.seed)
+    print(f"语料 {len(corpus)} 篇，查询 {len(queries)} 次，并发 {args.concurrency}")
+
+    results = []
+    for name in args.backends.split(','):
+        name = name.strip()
+        if name == 'memory':
+            backend = MemorySearchBackend()
+        elif name == 'elasticsearch':
+            backend = SearchService()
+            backend.index_name = args.es_index
+        else:
+            print(f"未知后端: {name}")
+            continue
+        try:
+            results.append(await run_backend(name, backend, corpus, queries, args.concurrency))
+        except Exception as e:
+            print(f"❌ {name} 测试失败: {e}")
+        finally:
+            if isinstance(backend, SearchService):
+                try:
+                    await backend.es.indices.delete(index=args.es_index)
+                except Exception:
+                    pass
+            await backend.close()
+
+    header = f"{'backend':<14}{'indexed':>9}{'docs/s':>11}{'qps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        print(f"{r['backend']:<14}{r['indexed']:>9}{r['index_docs_per_sec']:>11.0f}{r['qps']:>9.0f}"
+              f"{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}{r['p99_ms']:>9.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
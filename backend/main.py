@@ -16,6 +16,14 @@ from loguru import logger
 from app.core.config import settings
 from app.core.database import engine
 from app.api.v1.api import api_router
+from app.services.event_bus import event_bus
+from app.services.export_task_service import export_task_service
+from app.services.proxy_pool import proxy_pool
+from app.services.search_backend import SEARCH_CACHE_EVENT
+from app.services.search_service import search_service
+from app.services.search_task_service import search_task_service
+from app.services.wechat_service import wechat_service
+from app.services.websocket_service import manager as websocket_manager
 
 
 @asynccontextmanager
@@ -28,10 +36,34 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
     await engine.connect()
     logger.info("✅ Database connected")
     
+    # 初始化爬虫HTTP连接池
+    await wechat_service.start_session()
+    logger.info("✅ Crawler HTTP pool ready")
+    
+    # 加载出口代理池
+    await proxy_pool.start()
+    if proxy_pool.enabled:
+        logger.info(f"✅ Proxy pool ready: {len(proxy_pool.entries)} proxies")
+    
+    # 订阅WebSocket事件，转发给本进程的连接；其他进程写入索引时失效本进程的搜索缓存
+    event_bus.add_listener(SEARCH_CACHE_EVENT, search_service.on_cache_event)
+    await event_bus.start(websocket_manager.publish)
+    logger.info("✅ WebSocket event bus ready")
+    
     yield
     
     # 关闭时执行
     logger.info("🛑 Shutting down Silence Spider...")
+    await export_task_service.shutdown()
+    await search_task_service.shutdown()
+    await event_bus.close()
+    await websocket_manager.close()
+    logger.info("✅ WebSocket writers stopped")
+    await proxy_pool.close()
+    await wechat_service.close()
+    logger.info("✅ Crawler HTTP pool and credential store closed")
+    await search_service.close()
+    logger.info("✅ Elasticsearch client closed")
     await engine.dispose()
     logger.info("✅ Database disconnected")
 
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+搜索索引迁移脚本
+将旧版按公众号建立的 gzh_* 索引重建到共享文章索引中
+
+用法（在backend目录下运行）:
+    python scripts/migrate_search_index.py [--delete-source]
+"""
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.search_service import search_service
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="迁移旧版公众号索引到共享索引")
+    parser.add_argument("--delete-source", action="store_true", help="迁移成功后删除旧索引")
+    args = parser.parse_args()
+
+    print(f"🚚 迁移旧索引到 {search_service.index_name}")
+    try:
+        report = await search_service.migrate_legacy_indices(delete_source=args.delete_source)
+    finally:
+        await search_service.close()
+    if not report:
+        print("没有需要迁移的旧索引")
+        return
+
+    failed = 0
+    for item in report:
+        if item.get('error'):
+            failed += 1
+            print(f"❌ {item['index_name']}: {item['error']}")
+        else:
+            suffix = "（已删除旧索引）" if item['deleted'] else ""
+            print(f"✅ {item['index_name']} -> {item['migrated']} 篇{suffix}")
+
+    print(f"完成: {len(report) - failed} 个成功, {failed} 个失败")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -81,6 +81,24 @@ CREATE TABLE IF NOT EXISTS tasks (
     user_id INTEGER REFERENCES users(id)
 );
 
+-- 创建收藏表
+CREATE TABLE IF NOT EXISTS likes (
+    id SERIAL PRIMARY KEY,
+    nickname VARCHAR(255) NOT NULL,
+    title VARCHAR(500) NOT NULL,
+    author VARCHAR(255),
+    content_url VARCHAR(1000) UNIQUE NOT NULL,
+    source_url VARCHAR(1000),
+    p_date TIMESTAMP,
+    like_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    read_num INTEGER DEFAULT 0,
+    like_num INTEGER DEFAULT 0,
+    comment_num INTEGER DEFAULT 0,
+    reward_num INTEGER DEFAULT 0,
+    digest TEXT,
+    content TEXT
+);
+
 -- 创建代理表
 CREATE TABLE IF NOT EXISTS proxies (
     id SERIAL PRIMARY KEY,
@@ -111,11 +129,18 @@ CREATE INDEX IF NOT EXISTS idx_wechat_accounts_biz ON wechat_accounts(biz);
 CREATE INDEX IF NOT EXISTS idx_articles_url ON articles(url);
 CREATE INDEX IF NOT EXISTS idx_articles_biz ON articles(biz);
 CREATE INDEX IF NOT EXISTS idx_articles_mid ON articles(mid);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_articles_biz_mid_idx ON articles(biz, mid, idx);
 CREATE INDEX IF NOT EXISTS idx_articles_account_id ON articles(account_id);
 CREATE INDEX IF NOT EXISTS idx_tasks_user_id ON tasks(user_id);
 CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status);
 CREATE INDEX IF NOT EXISTS idx_proxies_host_port ON proxies(host, port);
 
+-- 创建收藏搜索三元组索引
+CREATE INDEX IF NOT EXISTS idx_likes_title_trgm ON likes USING gin(title gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_likes_digest_trgm ON likes USING gin(digest gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_likes_content_trgm ON likes USING gin(content gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_likes_like_time ON likes(like_time);
+
 -- 创建全文搜索索引
 CREATE INDEX IF NOT EXISTS idx_articles_title_gin ON articles USING gin(to_tsvector('chinese', title));
 CREATE INDEX IF NOT EXISTS idx_articles_content_gin ON articles USING gin(to_tsvector('chinese', content));
@@ -0,0 +1,15 @@
+-- 收藏搜索三元组索引
+-- 为 likes 的标题、摘要、正文建立 pg_trgm GIN 索引，LikeService.search_likes 的 ILIKE 查询走索引
+--
+-- 已有数据库执行:
+--   psql "$DATABASE_URL" -f docker/postgres/migrations/001_likes_trgm_indexes.sql
+-- CONCURRENTLY 建索引期间不锁写入，不能放在事务中执行
+
+CREATE EXTENSION IF NOT EXISTS "pg_trgm";
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_likes_title_trgm ON likes USING gin (title gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_likes_digest_trgm ON likes USING gin (digest gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_likes_content_trgm ON likes USING gin (content gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_likes_like_time ON likes (like_time);
+
+ANALYZE likes;
@@ -0,0 +1,21 @@
+-- 文章唯一键
+-- 文章以 (biz, mid, idx) 唯一标识，ArticleWriter 按该键执行 INSERT ... ON CONFLICT，
+-- 链接写入前规范化为只含 __biz/mid/idx/sn 的形式
+--
+-- 已有数据库执行:
+--   psql "$DATABASE_URL" -f docker/postgres/migrations/002_articles_biz_mid_idx.sql
+-- CONCURRENTLY 建索引期间不锁写入，不能放在事务中执行
+
+-- 同一文章因链接参数不同被重复写入时，保留最近更新的一条
+DELETE FROM articles a
+USING articles b
+WHERE a.biz = b.biz
+  AND a.mid = b.mid
+  AND a.idx IS NOT DISTINCT FROM b.idx
+  AND (a.updated_at, a.id) < (b.updated_at, b.id);
+
+UPDATE articles SET idx = 0 WHERE idx IS NULL;
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS uq_articles_biz_mid_idx ON articles (biz, mid, idx);
+
+ANALYZE articles;